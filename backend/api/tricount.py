@@ -6,9 +6,21 @@ from flask import Flask, jsonify
 from flask_cors import CORS
 from werkzeug.exceptions import HTTPException
 
-from backend.extensions import bcrypt, jwt
+from backend.cli import backup_cli, recurring_cli, seed_cli, tricounts_cli
+from backend.extensions import (
+    bcrypt,
+    idempotency,
+    jwt,
+    login_throttle,
+    metrics,
+    profiler,
+    recurring_scheduler,
+    tricount_store,
+)
 from backend.routes.auth import auth_bp
+from backend.routes.backup import backup_bp
 from backend.routes.tricounts import tricount_bp
+from backend.utils import auth_storage, tricount_storage
 
 load_dotenv()
 
@@ -17,13 +29,118 @@ app.config["JWT_SECRET_KEY"] = os.environ.get("JWT_SECRET_KEY")
 if not app.config["JWT_SECRET_KEY"]:
     raise RuntimeError("JWT_SECRET_KEY is not set")
 app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(hours=1)
+app.config["LOGIN_THROTTLE_ENABLED"] = (
+    os.environ.get("LOGIN_THROTTLE_ENABLED", "1") == "1"
+)
+app.config["LOGIN_THROTTLE_TRUST_PROXY"] = (
+    os.environ.get("LOGIN_THROTTLE_TRUST_PROXY", "0") == "1"
+)
+app.config["TRICOUNT_MULTIPROCESS"] = (
+    os.environ.get("TRICOUNT_MULTIPROCESS", "0") == "1"
+)
+app.config["TRICOUNT_FLUSH_INTERVAL"] = (
+    int(os.environ.get("TRICOUNT_FLUSH_INTERVAL_MS", "0")) / 1000
+)
+app.config["TRICOUNT_FLUSH_MAX_CHANGES"] = int(
+    os.environ.get("TRICOUNT_FLUSH_MAX_CHANGES", "100")
+)
+app.config["TRICOUNT_DURABLE"] = os.environ.get("TRICOUNT_DURABLE", "1") == "1"
+app.config["TRICOUNT_CACHE_SIZE"] = int(
+    os.environ.get("TRICOUNT_CACHE_SIZE", "1000")
+)
+app.config["TRICOUNT_CACHE_BYTES"] = int(
+    os.environ.get("TRICOUNT_CACHE_BYTES", "0")
+)
+app.config["TRICOUNT_SNAPSHOT"] = (
+    os.environ.get("TRICOUNT_SNAPSHOT", "0") == "1"
+)
+app.config["STORAGE_FORMAT"] = os.environ.get("STORAGE_FORMAT", "json")
+if app.config["STORAGE_FORMAT"] not in tricount_storage.FORMATS:
+    raise RuntimeError(
+        f"STORAGE_FORMAT must be one of {', '.join(tricount_storage.FORMATS)}"
+    )
+app.config["RECURRING_INTERVAL"] = float(
+    os.environ.get("RECURRING_INTERVAL_S", "0")
+)
+app.config["IDEMPOTENCY_ENABLED"] = (
+    os.environ.get("IDEMPOTENCY_ENABLED", "1") == "1"
+)
+app.config["IDEMPOTENCY_TTL"] = float(
+    os.environ.get("IDEMPOTENCY_TTL_S", "86400")
+)
+app.config["IDEMPOTENCY_LEASE"] = float(
+    os.environ.get("IDEMPOTENCY_LEASE_S", "120")
+)
+app.config["IDEMPOTENCY_MAX_ENTRIES"] = int(
+    os.environ.get("IDEMPOTENCY_MAX_ENTRIES", "10000")
+)
+app.config["IDEMPOTENCY_MAX_BYTES"] = int(
+    os.environ.get("IDEMPOTENCY_MAX_BYTES", str(64 << 20))
+)
+app.config["IDEMPOTENCY_SHARED"] = (
+    os.environ.get(
+        "IDEMPOTENCY_SHARED", os.environ.get("TRICOUNT_MULTIPROCESS", "0")
+    )
+    == "1"
+)
+app.config["BACKUP_DIR"] = os.environ.get("BACKUP_DIR", "data/backups")
+app.config["BACKUP_TOKEN"] = os.environ.get("BACKUP_TOKEN")
+app.config["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "1") == "1"
+app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+app.config["PROFILING_ENABLED"] = (
+    os.environ.get("PROFILING_ENABLED", "0") == "1"
+)
+app.config["PROFILING_DIR"] = os.environ.get("PROFILING_DIR", "data/profiles")
+app.config["PROFILING_TOKEN"] = os.environ.get("PROFILING_TOKEN")
+
+tricount_storage.FORMAT = app.config["STORAGE_FORMAT"]
+auth_storage.FORMAT = app.config["STORAGE_FORMAT"]
 
 CORS(app)
 jwt.init_app(app)
 bcrypt.init_app(app)
+login_throttle.init_app(app)
+idempotency.init_app(app)
+tricount_store.init_app(app)
+metrics.init_app(app)
+profiler.init_app(app)
+recurring_scheduler.init_app(app)
+metrics.add_gauge(
+    "tricount_login_throttle",
+    "Login throttle counters (attempts, rejections, bcrypt work saved).",
+    lambda: {
+        (("counter", name),): value
+        for name, value in login_throttle.stats().items()
+    },
+)
+metrics.add_gauge(
+    "tricount_idempotency_cache",
+    "Responses kept for Idempotency-Key replays and their size.",
+    lambda: {
+        (("stat", name),): value for name, value in idempotency.stats().items()
+    },
+)
+metrics.add_gauge(
+    "tricount_store_tricounts",
+    "Number of tricounts held by this worker.",
+    lambda: {(): len(tricount_store)},
+)
+metrics.add_gauge(
+    "tricount_store_cache",
+    "Tricounts loaded in memory by this worker and their estimated size.",
+    lambda: {
+        (("stat", name),): value
+        for name, value in tricount_store.cache_stats().items()
+    },
+)
 
 app.register_blueprint(auth_bp, url_prefix="/api/auth")
 app.register_blueprint(tricount_bp, url_prefix="/api/tricounts")
+app.register_blueprint(backup_bp, url_prefix="/api/backups")
+app.cli.add_command(recurring_cli)
+app.cli.add_command(tricounts_cli)
+app.cli.add_command(seed_cli)
+app.cli.add_command(backup_cli)
 
 
 @app.errorhandler(HTTPException)
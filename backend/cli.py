@@ -0,0 +1,264 @@
+import math
+import random
+from pathlib import Path
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from backend.extensions import tricount_store
+from backend.models.currency import Currency
+from backend.models.tricount import Tricount
+from backend.services.archive import SETTLED_EPS, archive_settled
+from backend.services.importer import (
+    import_expense_rows,
+    import_format,
+    read_expense_rows,
+)
+from backend.services.recurring import run_recurring
+from backend.utils import tricount_storage
+from backend.utils.auth_storage import load_users, save_users, users_lock
+from backend.utils.backup import backup_name, create_backup, verify_backup
+from backend.utils.dataset import generate_tricount_dict, generate_users
+from backend.utils.utils import tricount_from_dict
+
+recurring_cli = AppGroup("recurring", help="Recurring expenses.")
+tricounts_cli = AppGroup("tricounts", help="Tricount maintenance.")
+seed_cli = AppGroup("seed", help="Generate or load datasets in bulk.")
+backup_cli = AppGroup("backup", help="Consistent backups of the data.")
+
+
+@recurring_cli.command("run")
+@click.option(
+    "--date",
+    "today",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    help="Enter the occurrences due by this day (default: today).",
+)
+def run_recurring_command(today):
+    """Enter the due occurrences of every recurring expense."""
+    touched, added = run_recurring(
+        tricount_store, today.date() if today else None
+    )
+    click.echo(f"{added} dépense(s) ajoutée(s) dans {touched} 3Compte(s)")
+
+
+@tricounts_cli.command("archive")
+@click.argument("tricount_ids", nargs=-1)
+@click.option(
+    "--eps",
+    type=float,
+    default=SETTLED_EPS,
+    show_default=True,
+    help="Largest balance still considered settled.",
+)
+@click.option(
+    "--idle-days",
+    type=int,
+    default=30,
+    show_default=True,
+    help="Only archive when the latest expense is at least this old.",
+)
+def archive_command(tricount_ids, eps, idle_days):
+    """Archive the given tricounts, or every settled one."""
+    if tricount_ids:
+        with tricount_store.batch():
+            archived = sum(map(tricount_store.archive, tricount_ids))
+    else:
+        archived = archive_settled(tricount_store, eps, idle_days)
+    click.echo(f"{archived} 3Compte(s) archivé(s)")
+
+
+@tricounts_cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--tricount", "tricount_id", help="Import into this tricount.")
+@click.option("--name", help="Create a new tricount with this name.")
+@click.option("--owner", help="Owner email of the new tricount.")
+@click.option(
+    "--currency",
+    type=click.Choice([currency.value for currency in Currency]),
+    default=Currency.EUR.value,
+    show_default=True,
+    help="Currency of the new tricount.",
+)
+def import_command(path, tricount_id, name, owner, currency):
+    """Import the expenses of a CSV or xlsx file laid out like the export."""
+    file_format = import_format(path)
+    if file_format is None:
+        raise click.BadParameter("expected a .csv or .xlsx file")
+    if bool(tricount_id) == bool(name and owner):
+        raise click.UsageError("pass either --tricount, or --name and --owner")
+
+    with open(path, "rb") as f:
+        try:
+            rows, errors = read_expense_rows(f, file_format)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+    if tricount_id:
+        with tricount_store.write(tricount_id) as tricount:
+            if tricount is None:
+                raise click.ClickException("3Compte non trouvé")
+            report = import_expense_rows(
+                tricount, rows, errors, tricount.owner_email
+            )
+            if report["added"]:
+                tricount_store.commit(tricount)
+    else:
+        tricount = Tricount(
+            name=name, owner_email=owner, currency=Currency(currency)
+        )
+        report = import_expense_rows(tricount, rows, errors, owner)
+        tricount_store.add(tricount)
+
+    for error in report["errors"]:
+        click.echo(f"Ligne {error['row']} : {error['error']}", err=True)
+    click.echo(
+        f"{report['added']} dépense(s) importée(s) dans {tricount.id}, "
+        f"{len(report['users_created'])} utilisateur(s) créé(s), "
+        f"{report['errors_count']} ligne(s) rejetée(s)"
+    )
+
+
+@seed_cli.command("users")
+@click.option("--count", type=int, default=1000, show_default=True)
+@click.option(
+    "--password",
+    default="pass{i}",
+    show_default=True,
+    help="Password of user i, '{i}' being replaced by its number.",
+)
+@click.option("--domain", default="seed.test", show_default=True)
+@click.option("--rounds", type=int, help="bcrypt cost (BCRYPT_LOG_ROUNDS).")
+@click.option("--workers", type=int, help="Hashing processes (one per CPU).")
+def seed_users_command(count, password, domain, rounds, workers):
+    """Create users user<i>@<domain>, numbered after the existing ones."""
+    users = load_users()
+    start = sum(user.email.endswith(f"@{domain}") for user in users)
+    emails = {user.email for user in users}
+    generated = generate_users(
+        count,
+        password=password,
+        domain=domain,
+        start=start,
+        rounds=rounds or current_app.config.get("BCRYPT_LOG_ROUNDS", 12),
+        workers=workers,
+    )
+    with users_lock():
+        users = load_users()
+        emails = {user.email for user in users}
+        created = [user for user in generated if user.email not in emails]
+        save_users(users + created)
+    click.echo(f"{len(created)} utilisateur(s) créé(s)")
+
+
+@seed_cli.command("tricounts")
+@click.option("--groups", type=int, default=100, show_default=True)
+@click.option(
+    "--members",
+    type=int,
+    default=8,
+    show_default=True,
+    help="Largest number of members of a group.",
+)
+@click.option(
+    "--expenses",
+    type=int,
+    default=200,
+    show_default=True,
+    help="Median number of expenses of a group.",
+)
+@click.option("--weighted-ratio", type=float, default=0.2, show_default=True)
+@click.option("--seed", type=int, default=42, show_default=True)
+def seed_tricounts_command(groups, members, expenses, weighted_ratio, seed):
+    """Create groups of existing users with generated expenses, saved
+    once."""
+    rng = random.Random(seed)
+    emails = [user.email for user in load_users()]
+    with tricount_store.batch():
+        for i in range(groups):
+            # Most groups are small, a few have many more expenses
+            size = rng.randint(2, max(2, members))
+            tricount = tricount_from_dict(
+                data=generate_tricount_dict(
+                    rng,
+                    users=size,
+                    expenses=max(
+                        1, round(rng.lognormvariate(math.log(expenses), 0.8))
+                    ),
+                    weighted_ratio=weighted_ratio,
+                    name=f"Groupe {i}",
+                    emails=(
+                        rng.sample(emails, size)
+                        if len(emails) >= size
+                        else None
+                    ),
+                )
+            )
+            tricount_store.add(tricount)
+    click.echo(f"{groups} 3Compte(s) créé(s)")
+
+
+@seed_cli.command("load")
+@click.argument(
+    "directory", type=click.Path(exists=True, file_okay=False, path_type=Path)
+)
+def seed_load_command(directory):
+    """Add the users.json and tricounts.json of DIRECTORY (in any storage
+    format) to the current data, skipping those already present."""
+    with users_lock():
+        users = load_users()
+        emails = {user.email for user in users}
+        added_users = [
+            user
+            for user in load_users(directory / "users.json")
+            if user.email not in emails
+        ]
+        if added_users:
+            save_users(users + added_users)
+
+    added = 0
+    try:
+        with tricount_store.batch():
+            for data, _ in tricount_storage.scan_tricounts(
+                path=directory / "tricounts.json"
+            ):
+                if tricount_store.header(data["id"]) is None:
+                    tricount_store.add(tricount_from_dict(data=data))
+                    added += 1
+    except ValueError as e:
+        raise click.ClickException(f"tricounts.json illisible : {e}")
+    click.echo(
+        f"{len(added_users)} utilisateur(s) et {added} 3Compte(s) chargé(s)"
+    )
+
+
+@backup_cli.command("create")
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Backup file (default: a new file in BACKUP_DIR).",
+)
+def create_backup_command(output):
+    """Write a point-in-time backup of the tricounts and users."""
+    if output is None:
+        output = Path(current_app.config["BACKUP_DIR"]) / backup_name()
+    manifest = create_backup(tricount_store, output)
+    click.echo(
+        f"{output} : {manifest['tricounts']} 3Compte(s), "
+        f"{manifest['users']} utilisateur(s)"
+    )
+
+
+@backup_cli.command("verify")
+@click.argument(
+    "path", type=click.Path(exists=True, dir_okay=False, path_type=Path)
+)
+def verify_backup_command(path):
+    """Check the checksums and the consistency of a backup."""
+    problems = verify_backup(path)
+    for problem in problems:
+        click.echo(problem, err=True)
+    if problems:
+        raise click.ClickException(f"{path} est corrompue")
+    click.echo(f"{path} est intacte")
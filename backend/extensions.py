@@ -1,5 +1,17 @@
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
 
+from backend.utils.idempotency import IdempotencyCache
+from backend.utils.metrics import metrics  # noqa: F401
+from backend.utils.profiling import RequestProfiler
+from backend.utils.rate_limit import LoginThrottle
+from backend.utils.recurring_scheduler import RecurringScheduler
+from backend.utils.tricount_store import TricountStore
+
 jwt = JWTManager()
 bcrypt = Bcrypt()
+login_throttle = LoginThrottle()
+idempotency = IdempotencyCache()
+tricount_store = TricountStore()
+profiler = RequestProfiler()
+recurring_scheduler = RecurringScheduler(tricount_store)
@@ -2,7 +2,7 @@ from dataclasses import dataclass, field
 from uuid import uuid4
 
 
-@dataclass
+@dataclass(slots=True)
 class AuthUser:
     email: str
     password_hash: str
@@ -1,10 +1,17 @@
+import datetime
 from dataclasses import dataclass, field
+from sys import intern
 from uuid import uuid4
 
 from .currency import Currency
 
 
-@dataclass
+def intern_id(value):
+    # Ids repeat in every expense: share a single string object for each
+    return intern(value) if type(value) is str else value
+
+
+@dataclass(slots=True)
 class Expense:
     id: str = field(default_factory=lambda: str(uuid4()))
     description: str = ""
@@ -12,8 +19,9 @@ class Expense:
     currency: Currency = Currency.EUR
 
     payer_id: str = ""
-    participants_ids: list[str] = field(default_factory=list)
+    participants_ids: tuple[str, ...] = ()
     weights: dict[str, float] = field(default_factory=dict)
+    date: datetime.date | None = None
 
     def split_amount(self) -> float:
         if not self.participants_ids:
@@ -0,0 +1,111 @@
+from bisect import insort
+
+TOP_EXPENSES = 5
+
+
+class ExpenseStats:
+    """Per-user aggregates of an ExpenseTable, indexed like its
+    ``user_ids``: amount paid, amount consumed (the user's shares), number
+    of expenses involving the user and their biggest ones.
+
+    The table keeps them up to date on every append and removal once they
+    are built, so reading them costs O(users) instead of a pass over every
+    expense. Totals follow ``compute_balances``: ``paid - consumed`` is the
+    user's balance.
+    """
+
+    __slots__ = ("paid", "consumed", "counts", "top")
+
+    def __init__(self):
+        self.paid: list[float] = []
+        self.consumed: list[float] = []
+        self.counts: list[int] = []
+        # (-amount, expense id, description), biggest first
+        self.top: list[list[tuple[float, str, str]]] = []
+
+    @classmethod
+    def from_table(cls, table) -> "ExpenseStats":
+        stats = cls()
+        # Users may be indexed without any remaining expense
+        stats.resize(len(table.user_ids))
+        for row in range(len(table)):
+            stats.add(table, row)
+        return stats
+
+    def resize(self, users: int) -> None:
+        missing = users - len(self.paid)
+        if missing > 0:
+            self.paid.extend([0.0] * missing)
+            self.consumed.extend([0.0] * missing)
+            self.counts.extend([0] * missing)
+            self.top.extend([] for _ in range(missing))
+
+    def add(self, table, row: int) -> None:
+        self.resize(len(table.user_ids))
+        shares = table.shares(row)
+        if shares is None:
+            return
+
+        amount = table.amounts[row]
+        payer = table.payers[row]
+        entry = (-amount, table.ids[row], table.descriptions[row])
+        self.paid[payer] += amount
+        for user, share in shares:
+            self.consumed[user] += share
+        for user in {payer, *(user for user, _ in shares)}:
+            self.counts[user] += 1
+            top = self.top[user]
+            insort(top, entry)
+            del top[TOP_EXPENSES:]
+
+    def remove(self, table, row: int) -> list[int]:
+        """Take ``row`` out of the totals before it is deleted. Returns the
+        users whose biggest expenses must be rebuilt once it is gone."""
+        shares = table.shares(row)
+        if shares is None:
+            return []
+
+        amount = table.amounts[row]
+        payer = table.payers[row]
+        expense_id = table.ids[row]
+        self.paid[payer] -= amount
+        for user, share in shares:
+            self.consumed[user] -= share
+
+        stale = []
+        for user in {payer, *(user for user, _ in shares)}:
+            self.counts[user] -= 1
+            top = self.top[user]
+            kept = [entry for entry in top if entry[1] != expense_id]
+            # A full list may hide the next biggest expense
+            if len(kept) < len(top) and self.counts[user] >= len(top):
+                stale.append(user)
+            self.top[user] = kept
+        return stale
+
+    def rebuild_top(self, table, users: list[int]) -> None:
+        for user in users:
+            top = []
+            for row in range(len(table)):
+                shares = table.shares(row)
+                if shares is None:
+                    continue
+                if table.payers[row] == user or any(
+                    u == user for u, _ in shares
+                ):
+                    insort(
+                        top,
+                        (
+                            -table.amounts[row],
+                            table.ids[row],
+                            table.descriptions[row],
+                        ),
+                    )
+                    del top[TOP_EXPENSES:]
+            self.top[user] = top
+
+    def top_expenses(self, user: int) -> list[dict]:
+        return [
+            {"id": expense_id, "description": description, "amount": -amount}
+            for amount, expense_id, description in self.top[user]
+        ]
@@ -0,0 +1,287 @@
+import datetime
+from array import array
+from collections.abc import Sequence
+from typing import Iterable, Iterator
+
+from .currency import Currency
+from .expense import Expense, intern_id
+from .expense_stats import ExpenseStats
+from .expense_timeline import ExpenseTimeline
+
+CURRENCIES = tuple(Currency)
+CURRENCY_CODES = {currency: code for code, currency in enumerate(CURRENCIES)}
+
+
+class ExpenseTable:
+    """Expenses of one tricount stored column by column.
+
+    Each user id referenced by an expense is mapped once to a dense index.
+    Amounts, payers and currencies are typed arrays with one slot per
+    expense; participants and weights are stored CSR-style: the entries of
+    expense ``i`` are ``part_index[part_offsets[i]:part_offsets[i + 1]]``
+    (and likewise for ``weight_index``/``weight_values``). ``days`` holds
+    the ordinal of each expense's date, 0 when it has none.
+
+    Per-user statistics and the timeline are built on first use and then
+    maintained by ``append_row`` and ``remove_row``.
+    """
+
+    __slots__ = (
+        "user_ids",
+        "user_index",
+        "ids",
+        "descriptions",
+        "amounts",
+        "currencies",
+        "payers",
+        "part_offsets",
+        "part_index",
+        "weight_offsets",
+        "weight_index",
+        "weight_values",
+        "days",
+        "stats",
+        "timeline",
+    )
+
+    def __init__(self):
+        self.user_ids: list[str] = []
+        self.user_index: dict[str, int] = {}
+        self.ids: list[str] = []
+        self.descriptions: list[str] = []
+        self.amounts = array("d")
+        self.currencies = array("B")
+        self.payers = array("i")
+        self.part_offsets = array("q", [0])
+        self.part_index = array("i")
+        self.weight_offsets = array("q", [0])
+        self.weight_index = array("i")
+        self.weight_values = array("d")
+        self.days = array("i")
+        self.stats: ExpenseStats | None = None
+        self.timeline: ExpenseTimeline | None = None
+
+    @classmethod
+    def from_expenses(cls, expenses: Iterable[Expense]) -> "ExpenseTable":
+        table = cls()
+        for expense in expenses:
+            table.append(expense)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ExpenseTable):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def index_user(self, user_id: str) -> int:
+        index = self.user_index.get(user_id)
+        if index is None:
+            index = self.user_index[intern_id(user_id)] = len(self.user_ids)
+            self.user_ids.append(intern_id(user_id))
+            if self.stats is not None:
+                self.stats.resize(len(self.user_ids))
+        return index
+
+    def append_row(
+        self,
+        id: str,
+        description: str,
+        amount: float,
+        currency: Currency,
+        payer_id: str,
+        participants_ids: Iterable[str],
+        weights: dict[str, float],
+        date: datetime.date | None = None,
+    ) -> int:
+        # Convert everything first so that a bad value leaves no partial row
+        amount = float(amount)
+        day = date.toordinal() if date is not None else 0
+        currency_code = CURRENCY_CODES[currency]
+        weight_values = array("d", weights.values())
+        index_user = self.index_user
+        payer = index_user(payer_id)
+        participants = [index_user(uid) for uid in participants_ids]
+        weight_index = [index_user(uid) for uid in weights]
+
+        self.ids.append(id)
+        self.descriptions.append(description)
+        self.amounts.append(amount)
+        self.currencies.append(currency_code)
+        self.payers.append(payer)
+        self.part_index.extend(participants)
+        self.part_offsets.append(len(self.part_index))
+        self.weight_index.extend(weight_index)
+        self.weight_values.extend(weight_values)
+        self.weight_offsets.append(len(self.weight_index))
+        self.days.append(day)
+        row = len(self.ids) - 1
+        if self.stats is not None:
+            self.stats.add(self, row)
+        if self.timeline is not None:
+            self.timeline.add(self, row)
+        return row
+
+    def append(self, expense: Expense) -> int:
+        return self.append_row(
+            id=expense.id,
+            description=expense.description,
+            amount=expense.amount,
+            currency=expense.currency,
+            payer_id=expense.payer_id,
+            participants_ids=expense.participants_ids,
+            weights=expense.weights,
+            date=expense.date,
+        )
+
+    def participants(self, row: int) -> tuple[str, ...]:
+        user_ids = self.user_ids
+        return tuple(
+            user_ids[i]
+            for i in self.part_index[
+                self.part_offsets[row] : self.part_offsets[row + 1]
+            ]
+        )
+
+    def weights(self, row: int) -> dict[str, float]:
+        start, end = self.weight_offsets[row], self.weight_offsets[row + 1]
+        user_ids = self.user_ids
+        return {
+            user_ids[i]: weight
+            for i, weight in zip(
+                self.weight_index[start:end], self.weight_values[start:end]
+            )
+        }
+
+    def shares(self, row: int) -> list[tuple[int, float]] | None:
+        """User index and share of the amount of everyone consuming
+        ``row``, split like ``compute_balances`` does, or None when the
+        expense has no participant."""
+        part_start, part_end = (
+            self.part_offsets[row],
+            self.part_offsets[row + 1],
+        )
+        if part_start == part_end:
+            return None
+
+        amount = self.amounts[row]
+        start, end = self.weight_offsets[row], self.weight_offsets[row + 1]
+        if start != end:
+            weights = self.weight_values[start:end]
+            total_weight = sum(weights)
+            if total_weight <= 0:
+                return []
+            return [
+                (user, (weight / total_weight) * amount)
+                for user, weight in zip(self.weight_index[start:end], weights)
+            ]
+
+        share = amount / (part_end - part_start)
+        return [(user, share) for user in self.part_index[part_start:part_end]]
+
+    def user_stats(self) -> ExpenseStats:
+        if self.stats is None:
+            self.stats = ExpenseStats.from_table(self)
+        return self.stats
+
+    def date(self, row: int) -> datetime.date | None:
+        day = self.days[row]
+        return datetime.date.fromordinal(day) if day else None
+
+    def time_index(self) -> ExpenseTimeline:
+        if self.timeline is None:
+            self.timeline = ExpenseTimeline.from_table(self)
+        return self.timeline
+
+    def row(self, row: int) -> Expense:
+        return Expense(
+            id=self.ids[row],
+            description=self.descriptions[row],
+            amount=self.amounts[row],
+            currency=CURRENCIES[self.currencies[row]],
+            payer_id=self.user_ids[self.payers[row]],
+            participants_ids=self.participants(row),
+            weights=self.weights(row),
+            date=self.date(row),
+        )
+
+    def __iter__(self) -> Iterator[Expense]:
+        return (self.row(i) for i in range(len(self.ids)))
+
+    def find(self, expense_id: str) -> int | None:
+        try:
+            return self.ids.index(expense_id)
+        except ValueError:
+            return None
+
+    def references(self, user_id: str) -> bool:
+        index = self.user_index.get(user_id)
+        if index is None:
+            return False
+        return index in self.payers or index in self.part_index
+
+    def remove_row(self, row: int) -> None:
+        stale = self.stats.remove(self, row) if self.stats is not None else []
+        if self.timeline is not None:
+            self.timeline.remove(self, row)
+        part_start = self.part_offsets[row]
+        part_count = self.part_offsets[row + 1] - part_start
+        weight_start = self.weight_offsets[row]
+        weight_count = self.weight_offsets[row + 1] - weight_start
+
+        del self.ids[row]
+        del self.descriptions[row]
+        del self.amounts[row]
+        del self.currencies[row]
+        del self.payers[row]
+        del self.days[row]
+        del self.part_index[part_start : part_start + part_count]
+        del self.weight_index[weight_start : weight_start + weight_count]
+        del self.weight_values[weight_start : weight_start + weight_count]
+
+        self.part_offsets = self.part_offsets[: row + 1] + array(
+            "q", (o - part_count for o in self.part_offsets[row + 2 :])
+        )
+        self.weight_offsets = self.weight_offsets[: row + 1] + array(
+            "q", (o - weight_count for o in self.weight_offsets[row + 2 :])
+        )
+        if stale:
+            self.stats.rebuild_top(self, stale)
+
+
+class ExpensesView(Sequence):
+    """List-like access to an ExpenseTable, materializing Expense objects
+    on demand for callers written against ``list[Expense]``."""
+
+    __slots__ = ("table",)
+
+    def __init__(self, table: ExpenseTable):
+        self.table = table
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.table.row(i) for i in range(len(self.table))[index]]
+        if index < 0:
+            index += len(self.table)
+        if not 0 <= index < len(self.table):
+            raise IndexError("expense index out of range")
+        return self.table.row(index)
+
+    def __iter__(self) -> Iterator[Expense]:
+        return iter(self.table)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+    def append(self, expense: Expense) -> None:
+        self.table.append(expense)
@@ -0,0 +1,98 @@
+from bisect import bisect_left, bisect_right
+
+
+class ExpenseTimeline:
+    """Dated expenses of an ExpenseTable sorted by day, and one bucket per
+    day holding their total, count and the share consumed by each user.
+
+    Like ExpenseStats it is built on first use and then maintained by the
+    table, so range queries bisect ``days`` and rollups read the buckets
+    instead of scanning every expense. Days are ``date.toordinal()``
+    values; undated expenses (day 0) are left out.
+    """
+
+    __slots__ = ("days", "rows", "bucket_days", "totals", "counts", "consumed")
+
+    def __init__(self):
+        self.days: list[int] = []
+        self.rows: list[int] = []
+        self.bucket_days: list[int] = []
+        self.totals: list[float] = []
+        self.counts: list[int] = []
+        self.consumed: list[dict[int, float]] = []
+
+    @classmethod
+    def from_table(cls, table) -> "ExpenseTimeline":
+        timeline = cls()
+        for row in range(len(table)):
+            timeline.add(table, row)
+        return timeline
+
+    def add(self, table, row: int) -> None:
+        day = table.days[row]
+        if not day:
+            return
+
+        position = bisect_right(self.days, day)
+        self.days.insert(position, day)
+        self.rows.insert(position, row)
+
+        bucket = bisect_left(self.bucket_days, day)
+        if bucket == len(self.bucket_days) or self.bucket_days[bucket] != day:
+            self.bucket_days.insert(bucket, day)
+            self.totals.insert(bucket, 0.0)
+            self.counts.insert(bucket, 0)
+            self.consumed.insert(bucket, {})
+        self.totals[bucket] += table.amounts[row]
+        self.counts[bucket] += 1
+        consumed = self.consumed[bucket]
+        for user, share in table.shares(row) or ():
+            consumed[user] = consumed.get(user, 0.0) + share
+
+    def remove(self, table, row: int) -> None:
+        """Take ``row`` out before it is deleted from the table, and shift
+        the rows that follow it."""
+        day = table.days[row]
+        if day:
+            start = bisect_left(self.days, day)
+            position = self.rows.index(
+                row, start, bisect_right(self.days, day)
+            )
+            del self.days[position]
+            del self.rows[position]
+
+            bucket = bisect_left(self.bucket_days, day)
+            self.counts[bucket] -= 1
+            if self.counts[bucket] == 0:
+                del self.bucket_days[bucket]
+                del self.totals[bucket]
+                del self.counts[bucket]
+                del self.consumed[bucket]
+            else:
+                self.totals[bucket] -= table.amounts[row]
+                consumed = self.consumed[bucket]
+                for user, share in table.shares(row) or ():
+                    consumed[user] -= share
+
+        self.rows = [r - 1 if r > row else r for r in self.rows]
+
+    def rows_between(self, start: int, end: int) -> list[int]:
+        """Rows dated from day ``start`` to day ``end`` included, oldest
+        first."""
+        return self.rows[
+            bisect_left(self.days, start) : bisect_right(self.days, end)
+        ]
+
+    def buckets_between(
+        self, start: int, end: int
+    ) -> list[tuple[int, float, int, dict[int, float]]]:
+        low = bisect_left(self.bucket_days, start)
+        high = bisect_right(self.bucket_days, end)
+        return list(
+            zip(
+                self.bucket_days[low:high],
+                self.totals[low:high],
+                self.counts[low:high],
+                self.consumed[low:high],
+            )
+        )
@@ -0,0 +1,53 @@
+import calendar
+import datetime
+from dataclasses import dataclass, field
+from uuid import uuid4
+
+PERIODS = ("day", "week", "month")
+
+
+@dataclass(slots=True)
+class RecurringExpense:
+    """Template of an expense entered again every period, from
+    ``start_date`` until ``end_date`` (included) when set. ``next_date`` is
+    the first occurrence not materialized yet."""
+
+    id: str = field(default_factory=lambda: str(uuid4()))
+    description: str = ""
+    amount: float = 0.0
+    payer_id: str = ""
+    participants_ids: tuple[str, ...] = ()
+    weights: dict[str, float] = field(default_factory=dict)
+    period: str = "month"
+    start_date: datetime.date = field(default_factory=datetime.date.today)
+    next_date: datetime.date | None = None
+    end_date: datetime.date | None = None
+
+    def __post_init__(self):
+        if self.next_date is None:
+            self.next_date = self.start_date
+
+    def is_due(self, today: datetime.date) -> bool:
+        return self.next_date <= today and (
+            self.end_date is None or self.next_date <= self.end_date
+        )
+
+    def advance(self) -> None:
+        if self.period == "day":
+            self.next_date += datetime.timedelta(days=1)
+        elif self.period == "week":
+            self.next_date += datetime.timedelta(weeks=1)
+        else:
+            # Stick to the day of the start date, or the last of the month
+            year, month = divmod(self.next_date.month, 12)
+            year += self.next_date.year
+            last_day = calendar.monthrange(year, month + 1)[1]
+            self.next_date = datetime.date(
+                year, month + 1, min(self.start_date.day, last_day)
+            )
+
+    def next_due(self) -> datetime.date | None:
+        """Date of the next occurrence, None once the template ended."""
+        if self.end_date is not None and self.next_date > self.end_date:
+            return None
+        return self.next_date
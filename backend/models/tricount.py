@@ -1,20 +1,36 @@
+import datetime
 from dataclasses import dataclass, field
+from typing import Iterable
 from uuid import uuid4
 
 from .currency import Currency
 from .expense import Expense
+from .expense_table import ExpensesView, ExpenseTable
+from .recurring_expense import RecurringExpense
 from .user import User
 
 
-@dataclass
+@dataclass(slots=True)
 class Tricount:
     id: str = field(default_factory=lambda: str(uuid4()))
     owner_email: str = ""
     name: str = ""
     currency: Currency = Currency.EUR
+    version: int = 0
 
     users: list[User] = field(default_factory=list)
-    expenses: list[Expense] = field(default_factory=list)
+    expense_table: ExpenseTable = field(
+        default_factory=ExpenseTable, repr=False
+    )
+    recurring: list[RecurringExpense] = field(default_factory=list)
+
+    @property
+    def expenses(self) -> ExpensesView:
+        return ExpensesView(self.expense_table)
+
+    @expenses.setter
+    def expenses(self, expenses: Iterable[Expense]) -> None:
+        self.expense_table = ExpenseTable.from_expenses(expenses)
 
     def add_user(self, name: str, email: str) -> User:
         user = User(name=name, email=email)
@@ -28,11 +44,12 @@ class Tricount:
         payer_id: str,
         participants_ids: list[str],
         weights: dict = None,
+        date: datetime.date | None = None,
     ) -> Expense:
         if weights is None:
             weights = {}
 
-        expense = Expense(
+        row = self.expense_table.append_row(
             id=str(uuid4()),
             description=description,
             amount=amount,
@@ -40,8 +57,44 @@ class Tricount:
             payer_id=payer_id,
             participants_ids=participants_ids,
             weights=weights,
+            date=date,
+        )
+        return self.expense_table.row(row)
+
+    def remove_expense(self, expense_id: str) -> bool:
+        row = self.expense_table.find(expense_id)
+        if row is None:
+            return False
+        self.expense_table.remove_row(row)
+        return True
+
+    def add_recurring(self, recurring: RecurringExpense) -> RecurringExpense:
+        self.recurring.append(recurring)
+        return recurring
+
+    def remove_recurring(self, recurring_id: str) -> bool:
+        kept = [r for r in self.recurring if r.id != recurring_id]
+        removed = len(kept) < len(self.recurring)
+        self.recurring = kept
+        return removed
+
+    def next_due(self) -> datetime.date | None:
+        """Earliest occurrence of a recurring expense still to enter."""
+        return min(
+            filter(None, (r.next_due() for r in self.recurring)),
+            default=None,
         )
-        self.expenses.append(expense)
+
+    def references_user(self, user_id: str) -> bool:
+        return self.expense_table.references(user_id) or any(
+            r.payer_id == user_id
+            or user_id in r.participants_ids
+            or user_id in r.weights
+            for r in self.recurring
+        )
+
+    def has_member(self, email: str) -> bool:
+        return any(u.email == email for u in self.users)
 
     def get_user(self, user_id: str) -> User | None:
         return next((u for u in self.users if u.id == user_id), None)
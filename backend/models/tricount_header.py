@@ -0,0 +1,32 @@
+from dataclasses import dataclass, field
+
+from .currency import Currency
+
+
+@dataclass(slots=True)
+class TricountHeader:
+    """What listings and permission checks need to know about a tricount,
+    kept for every tricount whether or not it is loaded in memory."""
+
+    id: str
+    name: str
+    currency: Currency
+    owner_email: str
+    emails: frozenset[str]
+    users_count: int
+    expenses_count: int
+    version: int
+    # Ordinal of the next recurring expense to enter, 0 when there is none
+    next_due: int = 0
+    # Stored in the archive tier rather than in the data file
+    archived: bool = False
+    # Sum of the expenses, and net balance of each member email (summed
+    # over the participants registered with it)
+    total: float = 0.0
+    balances: dict[str, float] = field(default_factory=dict)
+    # Amounts paid and consumed, balance and number of expenses of each
+    # member email, as served by GET /api/tricounts/stats
+    stats: dict[str, dict] = field(default_factory=dict)
+
+    def has_member(self, email: str) -> bool:
+        return email in self.emails
@@ -2,7 +2,7 @@ from dataclasses import dataclass, field
 from uuid import uuid4
 
 
-@dataclass
+@dataclass(slots=True)
 class User:
     id: str = field(default_factory=lambda: str(uuid4()))
     name: str = ""
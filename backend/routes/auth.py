@@ -1,9 +1,13 @@
+import math
+from time import perf_counter
+
 from flask import Blueprint, abort, jsonify, request
 from flask_jwt_extended import create_access_token
 
-from backend.extensions import bcrypt
+from backend.extensions import bcrypt, login_throttle
 from backend.models.auth_user import AuthUser
-from backend.utils.auth_storage import load_users, save_users
+from backend.utils.auth_storage import load_users, save_users, users_lock
+from backend.utils.metrics import metrics
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -17,15 +21,22 @@ def register():
 
     if not email or not password or not name:
         abort(400, description="Email, mot de passe ou nom manquant")
+    if not all(isinstance(value, str) for value in (email, password, name)):
+        abort(400, description="Email, mot de passe ou nom invalide")
 
-    auth_users = load_users()
-    if any(u.email == email for u in auth_users):
+    if any(u.email == email for u in load_users()):
         abort(409, description="Cet email est déjà utilisé")
-    hashed_pw = bcrypt.generate_password_hash(password).decode("utf-8")
+    # Hashed outside of the lock, the email is checked again under it
+    with metrics.timer("bcrypt_hash"):
+        hashed_pw = bcrypt.generate_password_hash(password).decode("utf-8")
 
     new_auth_user = AuthUser(email=email, password_hash=hashed_pw, name=name)
-    auth_users.append(new_auth_user)
-    save_users(users=auth_users)
+    with users_lock():
+        auth_users = load_users()
+        if any(u.email == email for u in auth_users):
+            abort(409, description="Cet email est déjà utilisé")
+        auth_users.append(new_auth_user)
+        save_users(users=auth_users)
 
     return (
         jsonify({"id": new_auth_user.id}),
@@ -41,14 +52,34 @@ def login():
 
     if not email or not password:
         abort(400, description="Email ou mot de passe manquant")
+    if not isinstance(email, str) or not isinstance(password, str):
+        abort(400, description="Email ou mot de passe invalide")
+
+    address = login_throttle.client_address(request)
+    retry_after = login_throttle.check(email=email, address=address)
+    if retry_after > 0:
+        response = jsonify(
+            {"error": "Trop de tentatives de connexion, réessayez plus tard"}
+        )
+        if math.isfinite(retry_after):
+            response.headers["Retry-After"] = str(math.ceil(retry_after))
+        return response, 429
 
     auth_users = load_users()
 
     auth_user = next((u for u in auth_users if u.email == email), None)
 
-    if auth_user and bcrypt.check_password_hash(
-        auth_user.password_hash, password
-    ):
+    valid = False
+    if auth_user:
+        start = perf_counter()
+        with metrics.timer("bcrypt_check"):
+            valid = bcrypt.check_password_hash(
+                auth_user.password_hash, password
+            )
+        login_throttle.record_hash(perf_counter() - start)
+
+    if valid:
+        login_throttle.record_success(email=email, address=address)
         access_token = create_access_token(identity=auth_user.email)
 
         return (
@@ -0,0 +1,41 @@
+import hmac
+from pathlib import Path
+
+from flask import Blueprint, abort, current_app, jsonify, request
+
+from backend.extensions import tricount_store
+from backend.utils.backup import backup_name, create_backup, verify_backup
+
+backup_bp = Blueprint("backup", __name__)
+
+
+def _ensure_token() -> None:
+    # Disabled unless BACKUP_TOKEN is set, and then hidden from others
+    token = current_app.config.get("BACKUP_TOKEN")
+    sent = request.headers.get("X-Backup-Token", "")
+    if not token or not hmac.compare_digest(sent, token):
+        abort(404, description="Ressource non trouvée")
+
+
+def _backup_dir() -> Path:
+    return Path(current_app.config.get("BACKUP_DIR", "data/backups"))
+
+
+@backup_bp.route("", methods=["POST"])
+def create():
+    _ensure_token()
+    name = backup_name()
+    manifest = create_backup(tricount_store, _backup_dir() / name)
+    manifest.pop("files")
+    return jsonify({"file": name, **manifest}), 201
+
+
+@backup_bp.route("/<name>/verify", methods=["GET"])
+def verify(name: str):
+    _ensure_token()
+    path = _backup_dir() / name
+    if Path(name).name != name or not path.is_file():
+        abort(404, description="Sauvegarde non trouvée")
+
+    problems = verify_backup(path)
+    return jsonify({"file": name, "ok": not problems, "problems": problems})
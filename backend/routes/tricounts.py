@@ -1,45 +1,128 @@
+import datetime
+import math
+
 from flask import Blueprint, abort, jsonify, request, send_file
 from flask_jwt_extended import get_jwt_identity, jwt_required
 
+from backend.extensions import idempotency, tricount_store
 from backend.models.currency import Currency
+from backend.models.recurring_expense import PERIODS as RECURRING_PERIODS
+from backend.models.recurring_expense import RecurringExpense
 from backend.models.tricount import Tricount
+from backend.services.balance import current_balances
 from backend.services.export import export_tricount_to_excel
-from backend.utils.tricount_storage import load_tricounts, save_tricounts
+from backend.services.importer import (
+    import_expense_rows,
+    import_format,
+    read_expense_rows,
+)
+from backend.services.recurring import MAX_CATCH_UP, materialize_recurring
+from backend.services.simulation import (
+    MAX_SCENARIOS,
+    MAX_SIMULATED_EXPENSES,
+    simulate_expenses,
+)
+from backend.services.stats import compute_tricount_stats
+from backend.services.timeline import PERIODS, compute_timeline
 from backend.utils.utils import (
-    get_tricount_from_id,
-    get_tricount_from_id_with_permissions,
+    TRICOUNT_FIELDS,
+    ensure_tricount_exists,
+    ensure_tricount_permissions,
+    parse_date,
+    recurring_to_dict,
     tricount_with_balances_to_dict,
 )
 
 tricount_bp = Blueprint("tricounts", __name__)
 
-tricounts = load_tricounts()
+MAX_BATCH = 100
+
+
+def _expense_fields(payload: dict) -> dict:
+    description = (payload.get("description") or "").strip()
+    if not description:
+        abort(400, description="La description est requise")
+
+    try:
+        amount = float(payload.get("amount"))
+    except Exception:
+        abort(400, description="Le montant doit être un nombre")
+    # float() also accepts "nan" and "inf"
+    if not math.isfinite(amount):
+        abort(400, description="Le montant doit être un nombre")
+
+    try:
+        weights = {
+            uid: float(w)
+            for uid, w in dict(payload.get("weights") or {}).items()
+        }
+    except Exception:
+        abort(400, description="Les poids doivent être des nombres")
+    if not all(map(math.isfinite, weights.values())):
+        abort(400, description="Les poids doivent être des nombres")
+
+    payer_id = payload.get("payer_id")
+    participants_ids = payload.get("participants_ids") or []
+    if not payer_id:
+        abort(400, description="Le payeur est requis")
+    if not participants_ids:
+        abort(400, description="Au moins un participant est requis")
+
+    return {
+        "description": description,
+        "amount": amount,
+        "payer_id": payer_id,
+        "participants_ids": participants_ids,
+        "weights": weights,
+    }
+
+
+def _list_arg(name: str) -> list[str]:
+    """Values of a query parameter, repeated or comma separated."""
+    return [
+        value.strip()
+        for arg in request.args.getlist(name)
+        for value in arg.split(",")
+        if value.strip()
+    ]
+
+
+def _date_field(payload: dict, key: str):
+    try:
+        return parse_date(payload.get(key))
+    except (TypeError, ValueError):
+        abort(400, description="La date doit être au format AAAA-MM-JJ")
 
 
 @tricount_bp.route("", methods=["GET"])
 @jwt_required()
 def list_tricounts():
     user_email = get_jwt_identity()
-    return jsonify(
-        [
+    listed = []
+    for header in tricount_store.headers():
+        if not (
+            header.has_member(user_email) or header.owner_email == user_email
+        ):
+            continue
+        listed.append(
             {
-                "id": tricount.id,
-                "name": tricount.name,
-                "currency": tricount.currency.value,
-                "users_count": len(tricount.users),
-                "expenses_count": len(tricount.expenses),
+                "id": header.id,
+                "name": header.name,
+                "currency": header.currency.value,
+                "users_count": header.users_count,
+                "expenses_count": header.expenses_count,
+                "archived": header.archived,
+                "total": round(header.total, 2),
+                # The caller's own balance, kept in the header
+                "balance": round(header.balances.get(user_email, 0.0), 2),
             }
-            for tricount in tricounts
-            if (
-                any(u.email == user_email for u in tricount.users)
-                or tricount.owner_email == user_email
-            )
-        ]
-    )
+        )
+    return jsonify(listed)
 
 
 @tricount_bp.route("", methods=["POST"])
 @jwt_required()
+@idempotency.idempotent
 def create_tricount():
     user_email = get_jwt_identity()
     payload = request.get_json(silent=True) or {}
@@ -51,46 +134,220 @@ def create_tricount():
     tricount = Tricount(
         name=name, owner_email=user_email, currency=Currency.EUR
     )
-    tricounts.append(tricount)
-    save_tricounts(tricounts=tricounts)
+    tricount_store.add(tricount)
 
     return jsonify(tricount_with_balances_to_dict(tricount=tricount)), 201
 
 
+@tricount_bp.route("/stats", methods=["GET"])
+@jwt_required()
+def get_my_stats():
+    user_email = get_jwt_identity()
+    listed = []
+    totals = {}
+    # Read from the headers: no tricount is loaded
+    for header in tricount_store.headers():
+        if not header.has_member(user_email):
+            continue
+        stats = {
+            "id": header.id,
+            "name": header.name,
+            "currency": header.currency.value,
+            **header.stats[user_email],
+        }
+        listed.append(stats)
+
+        total = totals.setdefault(
+            stats["currency"],
+            {
+                "paid": 0.0,
+                "consumed": 0.0,
+                "balance": 0.0,
+                "expenses_count": 0,
+            },
+        )
+        for key in total:
+            total[key] += stats[key]
+
+    for total in totals.values():
+        for key in ("paid", "consumed", "balance"):
+            total[key] = round(total[key], 2)
+    return jsonify({"tricounts": listed, "totals": totals})
+
+
+@tricount_bp.route("/batch", methods=["GET"])
+@jwt_required()
+def get_tricounts_batch():
+    user_email = get_jwt_identity()
+    ids = list(dict.fromkeys(_list_arg("ids")))
+    if not ids:
+        abort(400, description="Au moins un identifiant est requis")
+    if len(ids) > MAX_BATCH:
+        abort(400, description=f"Au plus {MAX_BATCH} 3Comptes par requête")
+    fields = tuple(_list_arg("fields")) or TRICOUNT_FIELDS
+    unknown = [field for field in fields if field not in TRICOUNT_FIELDS]
+    if unknown:
+        abort(400, description=f"Champs inconnus : {', '.join(unknown)}")
+
+    # Permissions are checked on the headers, without loading anything
+    allowed = [
+        header.id
+        for header in tricount_store.headers(ids)
+        if header.owner_email == user_email or header.has_member(user_email)
+    ]
+    with_balances = "balances" in fields or "settlements" in fields
+    listed = []
+    for tricount_id in allowed:
+        with tricount_store.read(tricount_id) as tricount:
+            # Members may have changed since the headers were read
+            if tricount is None or not (
+                tricount.owner_email == user_email
+                or tricount.has_member(user_email)
+            ):
+                continue
+            listed.append(
+                tricount_with_balances_to_dict(
+                    tricount,
+                    fields=fields,
+                    balances=(
+                        current_balances(tricount) if with_balances else None
+                    ),
+                )
+            )
+
+    found = {data["id"] for data in listed}
+    return jsonify(
+        {
+            "tricounts": listed,
+            "missing": [
+                tricount_id for tricount_id in ids if tricount_id not in found
+            ],
+        }
+    )
+
+
 @tricount_bp.route("/<tricount_id>", methods=["GET"])
 @jwt_required()
 def get_tricount(tricount_id: str):
-    tricount = get_tricount_from_id_with_permissions(
-        tricount_id, tricounts=tricounts, user_email=get_jwt_identity()
-    )
-    return jsonify(tricount_with_balances_to_dict(tricount=tricount))
+    with tricount_store.read(tricount_id) as tricount:
+        tricount = ensure_tricount_permissions(
+            tricount, user_email=get_jwt_identity()
+        )
+        return jsonify(tricount_with_balances_to_dict(tricount=tricount))
+
+
+@tricount_bp.route("/<tricount_id>/stats", methods=["GET"])
+@jwt_required()
+def get_tricount_stats(tricount_id: str):
+    with tricount_store.read(tricount_id) as tricount:
+        tricount = ensure_tricount_permissions(
+            tricount, user_email=get_jwt_identity()
+        )
+        return jsonify(
+            {
+                "id": tricount.id,
+                "currency": tricount.currency.value,
+                "users": compute_tricount_stats(tricount),
+            }
+        )
+
+
+@tricount_bp.route("/<tricount_id>/timeline", methods=["GET"])
+@jwt_required()
+def get_timeline(tricount_id: str):
+    period = request.args.get("period", "month")
+    if period not in PERIODS:
+        abort(400, description="La période doit être day, week ou month")
+    try:
+        start = parse_date(request.args.get("from"))
+        end = parse_date(request.args.get("to"))
+    except ValueError:
+        abort(400, description="Les dates doivent être au format AAAA-MM-JJ")
+
+    with tricount_store.read(tricount_id) as tricount:
+        tricount = ensure_tricount_permissions(
+            tricount, user_email=get_jwt_identity()
+        )
+        return jsonify(
+            {
+                "id": tricount.id,
+                "currency": tricount.currency.value,
+                **compute_timeline(tricount, start, end, period=period),
+            }
+        )
+
+
+@tricount_bp.route("/<tricount_id>/simulate", methods=["POST"])
+@jwt_required()
+def simulate(tricount_id: str):
+    payload = request.get_json(silent=True) or {}
+    scenarios = payload.get("scenarios")
+    if scenarios is None:
+        scenarios = [{"expenses": payload.get("expenses")}]
+    if not isinstance(scenarios, list) or not scenarios:
+        abort(400, description="Au moins un scénario est requis")
+    if len(scenarios) > MAX_SCENARIOS:
+        abort(
+            400,
+            description=f"Au plus {MAX_SCENARIOS} scénarios par requête",
+        )
+
+    simulated = []
+    for scenario in scenarios:
+        expenses = (
+            scenario.get("expenses") if isinstance(scenario, dict) else None
+        )
+        if not (
+            isinstance(expenses, list)
+            and expenses
+            and all(isinstance(expense, dict) for expense in expenses)
+        ):
+            abort(400, description="Chaque scénario doit avoir une dépense")
+        simulated.append([_expense_fields(expense) for expense in expenses])
+    if sum(map(len, simulated)) > MAX_SIMULATED_EXPENSES:
+        abort(
+            400,
+            description=f"Au plus {MAX_SIMULATED_EXPENSES} dépenses simulées par requête",
+        )
+
+    with tricount_store.read(tricount_id) as tricount:
+        tricount = ensure_tricount_permissions(
+            tricount, user_email=get_jwt_identity()
+        )
+        return jsonify(
+            {
+                "id": tricount.id,
+                "currency": tricount.currency.value,
+                **simulate_expenses(tricount, simulated),
+            }
+        )
 
 
 @tricount_bp.route("/<tricount_id>/users", methods=["POST"])
 @jwt_required()
+@idempotency.idempotent
 def add_user(tricount_id: str):
-    tricount = get_tricount_from_id_with_permissions(
-        tricount_id=tricount_id,
-        tricounts=tricounts,
-        user_email=get_jwt_identity(),
-    )
     user_email = get_jwt_identity()
 
     payload = request.get_json(silent=True) or {}
     name = (payload.get("name") or "").strip()
     email = (payload.get("email") or "").strip() or user_email
 
-    if not name:
-        abort(400, description="Un nom est requis")
+    with tricount_store.write(tricount_id) as tricount:
+        tricount = ensure_tricount_permissions(tricount, user_email=user_email)
 
-    if any(u.name == name for u in tricount.users):
-        abort(
-            409, description="Ce nom est déjà utilisé par un autre utilisateur"
-        )
+        if not name:
+            abort(400, description="Un nom est requis")
+
+        if any(u.name == name for u in tricount.users):
+            abort(
+                409,
+                description="Ce nom est déjà utilisé par un autre utilisateur",
+            )
 
-    user = tricount.add_user(name=name, email=email)
+        user = tricount.add_user(name=name, email=email)
 
-    save_tricounts(tricounts=tricounts)
+        tricount_store.commit(tricount)
 
     return (
         jsonify(
@@ -106,16 +363,14 @@ def add_user(tricount_id: str):
 
 @tricount_bp.route("/<tricount_id>/users/<user_id>", methods=["DELETE"])
 @jwt_required()
+@idempotency.idempotent
 def delete_user(tricount_id: str, user_id: str):
-    tricount = get_tricount_from_id_with_permissions(
-        tricount_id=tricount_id,
-        tricounts=tricounts,
-        user_email=get_jwt_identity(),
-        owner_needed=True,
-    )
+    with tricount_store.write(tricount_id) as tricount:
+        tricount = ensure_tricount_permissions(
+            tricount, user_email=get_jwt_identity(), owner_needed=True
+        )
 
-    for e in tricount.expenses:
-        if e.payer_id == user_id or user_id in e.participants_ids:
+        if tricount.references_user(user_id):
             return (
                 jsonify(
                     {
@@ -125,83 +380,156 @@ def delete_user(tricount_id: str, user_id: str):
                 400,
             )
 
-    tricount.users = [u for u in tricount.users if u.id != user_id]
-    save_tricounts(tricounts=tricounts)
+        tricount.users = [u for u in tricount.users if u.id != user_id]
+        tricount_store.commit(tricount)
 
-    return jsonify(tricount_with_balances_to_dict(tricount=tricount)), 200
+        return jsonify(tricount_with_balances_to_dict(tricount=tricount)), 200
 
 
 @tricount_bp.route("/<tricount_id>/expenses", methods=["POST"])
 @jwt_required()
+@idempotency.idempotent
 def add_expense(tricount_id: str):
-    tricount = get_tricount_from_id_with_permissions(
-        tricount_id=tricount_id,
-        tricounts=tricounts,
-        user_email=get_jwt_identity(),
-    )
-
     payload = request.get_json(silent=True) or {}
-    description = (payload.get("description") or "").strip()
-    amount = payload.get("amount")
-    payer_id = payload.get("payer_id")
-    participants_ids = payload.get("participants_ids") or []
 
-    weights = payload.get("weights") or {}
+    with tricount_store.write(tricount_id) as tricount:
+        tricount = ensure_tricount_permissions(
+            tricount, user_email=get_jwt_identity()
+        )
+        fields = _expense_fields(payload)
+        date = _date_field(payload, "date") or datetime.date.today()
 
-    if not description:
-        abort(400, description="La description est requise")
+        tricount.add_expense(**fields, date=date)
 
-    try:
-        amount = float(amount)
-    except Exception:
-        abort(400, description="Le montant doit être un nombre")
+        tricount_store.commit(tricount)
+
+        return jsonify(tricount_with_balances_to_dict(tricount=tricount)), 201
 
-    if not payer_id:
-        abort(400, description="Le payeur est requis")
-    if not participants_ids:
-        abort(400, description="Au moins un participant est requis")
 
-    tricount.add_expense(
-        description=description,
-        amount=amount,
-        payer_id=payer_id,
-        participants_ids=participants_ids,
-        weights=weights,
+@tricount_bp.route("/<tricount_id>/import", methods=["POST"])
+@jwt_required()
+@idempotency.idempotent
+def import_expenses(tricount_id: str):
+    user_email = get_jwt_identity()
+    ensure_tricount_permissions(
+        tricount_store.header(tricount_id), user_email=user_email
     )
 
-    save_tricounts(tricounts=tricounts)
+    file = request.files.get("file")
+    file_format = import_format(file.filename) if file else None
+    if file_format is None:
+        abort(400, description="Le fichier doit être au format CSV ou XLSX")
 
-    return jsonify(tricount_with_balances_to_dict(tricount=tricount)), 201
+    # Read before taking the write lock: large files take a while
+    try:
+        rows, errors = read_expense_rows(file.stream, file_format)
+    except ValueError as e:
+        abort(400, description=str(e))
+
+    with tricount_store.write(tricount_id) as tricount:
+        tricount = ensure_tricount_permissions(tricount, user_email=user_email)
+        report = import_expense_rows(tricount, rows, errors, user_email)
+        if report["added"]:
+            tricount_store.commit(tricount)
+
+    return jsonify(report), 201 if report["added"] else 200
 
 
 @tricount_bp.route("/<tricount_id>/expenses/<expense_id>", methods=["DELETE"])
 @jwt_required()
+@idempotency.idempotent
 def delete_expense(tricount_id: str, expense_id: str):
-    tricount = get_tricount_from_id_with_permissions(
-        tricount_id=tricount_id,
-        tricounts=tricounts,
-        user_email=get_jwt_identity(),
-    )
+    with tricount_store.write(tricount_id) as tricount:
+        tricount = ensure_tricount_permissions(
+            tricount, user_email=get_jwt_identity()
+        )
+
+        tricount.remove_expense(expense_id)
+        tricount_store.commit(tricount)
+
+        return jsonify(tricount_with_balances_to_dict(tricount=tricount)), 200
+
+
+@tricount_bp.route("/<tricount_id>/recurring", methods=["GET"])
+@jwt_required()
+def list_recurring(tricount_id: str):
+    with tricount_store.read(tricount_id) as tricount:
+        tricount = ensure_tricount_permissions(
+            tricount, user_email=get_jwt_identity()
+        )
+        return jsonify([recurring_to_dict(r) for r in tricount.recurring])
+
 
-    tricount.expenses = [e for e in tricount.expenses if e.id != expense_id]
-    save_tricounts(tricounts=tricounts)
+@tricount_bp.route("/<tricount_id>/recurring", methods=["POST"])
+@jwt_required()
+@idempotency.idempotent
+def add_recurring(tricount_id: str):
+    payload = request.get_json(silent=True) or {}
+
+    with tricount_store.write(tricount_id) as tricount:
+        tricount = ensure_tricount_permissions(
+            tricount, user_email=get_jwt_identity()
+        )
+        fields = _expense_fields(payload)
+        period = payload.get("period") or "month"
+        if period not in RECURRING_PERIODS:
+            abort(400, description="La période doit être day, week ou month")
+        start_date = _date_field(payload, "start_date")
+        end_date = _date_field(payload, "end_date")
+        if start_date and start_date < datetime.date.today() - MAX_CATCH_UP:
+            abort(
+                400,
+                description="La date de début doit dater de moins d'un an",
+            )
 
-    return jsonify(tricount_with_balances_to_dict(tricount=tricount)), 200
+        recurring = tricount.add_recurring(
+            RecurringExpense(
+                description=fields["description"],
+                amount=fields["amount"],
+                payer_id=fields["payer_id"],
+                participants_ids=tuple(fields["participants_ids"]),
+                weights=fields["weights"],
+                period=period,
+                start_date=start_date or datetime.date.today(),
+                end_date=end_date,
+            )
+        )
+        # Occurrences already due are entered right away, up to a limit
+        materialize_recurring(tricount, datetime.date.today())
+        tricount_store.commit(tricount)
+
+        return jsonify(recurring_to_dict(recurring)), 201
+
+
+@tricount_bp.route(
+    "/<tricount_id>/recurring/<recurring_id>", methods=["DELETE"]
+)
+@jwt_required()
+@idempotency.idempotent
+def delete_recurring(tricount_id: str, recurring_id: str):
+    with tricount_store.write(tricount_id) as tricount:
+        tricount = ensure_tricount_permissions(
+            tricount, user_email=get_jwt_identity()
+        )
+        if not tricount.remove_recurring(recurring_id):
+            abort(404, description="Dépense récurrente non trouvée")
+        tricount_store.commit(tricount)
+
+    return "", 204
 
 
 @tricount_bp.route("/<tricount_id>/export/excel", methods=["GET"])
 @jwt_required()
 def export_tricount_excel(tricount_id: str):
-    tricount = get_tricount_from_id_with_permissions(
-        tricount_id=tricount_id,
-        tricounts=tricounts,
-        user_email=get_jwt_identity(),
-    )
+    with tricount_store.read(tricount_id) as tricount:
+        tricount = ensure_tricount_permissions(
+            tricount, user_email=get_jwt_identity()
+        )
 
-    output = export_tricount_to_excel(tricount=tricount)
-    filename = (
-        f"tricount_{(tricount.name or tricount.id).replace(' ', '_')}.xlsx"
-    )
+        output = export_tricount_to_excel(tricount=tricount)
+        filename = (
+            f"tricount_{(tricount.name or tricount.id).replace(' ', '_')}.xlsx"
+        )
 
     return send_file(
         output,
@@ -213,72 +541,90 @@ def export_tricount_excel(tricount_id: str):
 
 @tricount_bp.route("/<tricount_id>", methods=["DELETE"])
 @jwt_required()
+@idempotency.idempotent
 def delete_tricount(tricount_id: str):
-    tricount = get_tricount_from_id_with_permissions(
-        tricount_id=tricount_id,
-        tricounts=tricounts,
+    ensure_tricount_permissions(
+        tricount_store.header(tricount_id),
         user_email=get_jwt_identity(),
         owner_needed=True,
     )
 
-    tricounts[:] = [t for t in tricounts if t.id != tricount_id]
-    save_tricounts(tricounts=tricounts)
+    tricount_store.remove(tricount_id)
     return "", 204
 
 
-@tricount_bp.route("/<tricount_id>/invite", methods=["GET"])
+@tricount_bp.route("/<tricount_id>/archive", methods=["POST"])
 @jwt_required()
-def invite_new_user(tricount_id: str):
-    tricount = get_tricount_from_id_with_permissions(
-        tricount_id=tricount_id,
-        tricounts=tricounts,
+@idempotency.idempotent
+def archive_tricount(tricount_id: str):
+    ensure_tricount_permissions(
+        tricount_store.header(tricount_id),
         user_email=get_jwt_identity(),
+        owner_needed=True,
     )
-    return jsonify({"tricount_id": tricount.id})
+
+    # The owner's choice: unlike the CLI pass, settlement is not checked.
+    # Any later change moves it back out of the archive
+    if not tricount_store.archive(tricount_id):
+        ensure_tricount_exists(tricount_store.header(tricount_id))
+        abort(409, description="Ce 3Compte est déjà archivé")
+    return jsonify({"id": tricount_id, "archived": True})
+
+
+@tricount_bp.route("/<tricount_id>/invite", methods=["GET"])
+@jwt_required()
+def invite_new_user(tricount_id: str):
+    with tricount_store.read(tricount_id) as tricount:
+        tricount = ensure_tricount_permissions(
+            tricount, user_email=get_jwt_identity()
+        )
+        return jsonify({"tricount_id": tricount.id})
 
 
 @tricount_bp.route("/<tricount_id>/users", methods=["GET"])
 @jwt_required()
 def get_users(tricount_id: str):
-    tricount = get_tricount_from_id(
-        tricount_id=tricount_id, tricounts=tricounts
-    )
-    return (
-        jsonify(
-            [
-                {
-                    "id": user.id,
-                    "name": user.name,
-                    "email": user.email,
-                }
-                for user in tricount.users
-            ]
-        ),
-        200,
-    )
+    with tricount_store.read(tricount_id) as tricount:
+        tricount = ensure_tricount_exists(tricount)
+        return (
+            jsonify(
+                [
+                    {
+                        "id": user.id,
+                        "name": user.name,
+                        "email": user.email,
+                    }
+                    for user in tricount.users
+                ]
+            ),
+            200,
+        )
 
 
 @tricount_bp.route("/<tricount_id>/join", methods=["POST"])
 @jwt_required()
+@idempotency.idempotent
 def join_tricount(tricount_id: str):
     user_email = get_jwt_identity()
-    tricount = get_tricount_from_id(
-        tricount_id=tricount_id, tricounts=tricounts
-    )
     payload = request.get_json(silent=True) or {}
 
     name = (payload.get("name") or "").strip()
     user_id = payload.get("user_id")
     email = user_email
 
-    if not user_id:
-        if not name:
-            abort(400, description="Un nom est requis")
-        user = tricount.add_user(name=name, email=email)
-    else:
-        user = tricount.modify_user_email(user_id=user_id, email=user_email)
+    with tricount_store.write(tricount_id) as tricount:
+        tricount = ensure_tricount_exists(tricount)
+
+        if not user_id:
+            if not name:
+                abort(400, description="Un nom est requis")
+            user = tricount.add_user(name=name, email=email)
+        else:
+            user = tricount.modify_user_email(
+                user_id=user_id, email=user_email
+            )
 
-    save_tricounts(tricounts=tricounts)
+        tricount_store.commit(tricount)
 
     return (
         jsonify(
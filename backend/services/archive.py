@@ -0,0 +1,46 @@
+import datetime
+
+from backend.models.tricount import Tricount
+from backend.services.balance import compute_balances
+from backend.utils.metrics import timed
+from backend.utils.tricount_store import TricountStore
+
+SETTLED_EPS = 0.01
+
+
+def is_settled(tricount: Tricount, eps: float = SETTLED_EPS) -> bool:
+    """Whether ``tricount`` has expenses, nothing left to enter and every
+    balance within ``eps`` of zero."""
+    return (
+        len(tricount.expense_table) > 0
+        and tricount.next_due() is None
+        and all(abs(b) <= eps for b in compute_balances(tricount).values())
+    )
+
+
+@timed("archive_settled")
+def archive_settled(
+    store: TricountStore,
+    eps: float = SETTLED_EPS,
+    idle_days: int = 0,
+    today: datetime.date | None = None,
+) -> int:
+    """Archive every settled tricount whose latest dated expense is at least
+    ``idle_days`` old, saving the store once. Returns how many were
+    archived."""
+    last_day = (today or datetime.date.today()).toordinal() - idle_days
+
+    def should_archive(tricount: Tricount) -> bool:
+        days = tricount.expense_table.days
+        return (not days or max(days) <= last_day) and is_settled(
+            tricount, eps
+        )
+
+    archived = 0
+    with store.batch():
+        for header in store.headers():
+            if header.archived or header.next_due or not header.expenses_count:
+                continue
+            if store.archive(header.id, when=should_archive):
+                archived += 1
+    return archived
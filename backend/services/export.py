@@ -1,50 +1,76 @@
 from io import BytesIO
 
-from openpyxl import Workbook
-
+from backend.models.expense_table import CURRENCIES
 from backend.models.tricount import Tricount
 from backend.services.balance import compute_balances
 from backend.services.settlement import compute_settlements
 
 
 def export_tricount_to_excel(tricount: Tricount) -> BytesIO:
+    # openpyxl is slow to import and only needed here
+    from openpyxl import Workbook
+
     wb = Workbook()
 
     ws_exp = wb.active
     ws_exp.title = "Dépenses"
     ws_exp.append(
-       ["Description", "Montant", "Devise", "Payeur", "Participants", "Poids"]
+        [
+            "Date",
+            "Description",
+            "Montant",
+            "Devise",
+            "Payeur",
+            "Participants",
+            "Poids",
+        ]
     )
 
-    for expense in tricount.expenses:
-        payer_name = ""
-
-        for user in tricount.users:
-            if user.id == expense.payer_id:
-                payer_name = user.name
-                break
-
-        participant_names = []
-
-        for user in tricount.users:
-            if user.id in expense.participants_ids:
-                participant_names.append(user.name)
-        
-        weights_list = []
-
-        for participant_id in expense.participants_ids:
-            weight = expense.weights.get(participant_id, 1)
-            weights_list.append(weight)
-
-        ws_exp.append([
-            expense.description,
-            expense.amount,
-            expense.currency.value,
-            payer_name,
-            ", ".join(participant_names),
-            ", ".join(str(weight) for weight in weights_list),
-        ])
-
+    table = tricount.expense_table
+    names = {user.id: user.name for user in tricount.users}
+    payer_names = [names.get(uid, "") for uid in table.user_ids]
+    # Participants are listed in the order of the tricount users
+    members = [
+        (table.user_index[user.id], user.name)
+        for user in tricount.users
+        if user.id in table.user_index
+    ]
+
+    for row in range(len(table)):
+        part_index = table.part_index[
+            table.part_offsets[row] : table.part_offsets[row + 1]
+        ]
+        participants = set(part_index)
+        listed = [
+            (index, name) for index, name in members if index in participants
+        ]
+
+        weight_start = table.weight_offsets[row]
+        weight_end = table.weight_offsets[row + 1]
+        weights = dict(
+            zip(
+                table.weight_index[weight_start:weight_end],
+                table.weight_values[weight_start:weight_end],
+            )
+        )
+        # In the order of the names so that importing the file pairs them.
+        # Participants left out of the weights of an expense pay nothing
+        default_weight = 0 if weights else 1
+        weights_list = [
+            weights.get(index, default_weight) for index, _ in listed
+        ]
+
+        ws_exp.append(
+            [
+                table.date(row),
+                table.descriptions[row],
+                table.amounts[row],
+                CURRENCIES[table.currencies[row]].value,
+                payer_names[table.payers[row]],
+                ", ".join(name for _, name in listed),
+                ", ".join(str(weight) for weight in weights_list),
+            ]
+        )
 
     ws_bal = wb.create_sheet(title="Soldes")
     ws_bal.append(["Utilisateur", "Solde"])
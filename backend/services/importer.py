@@ -0,0 +1,243 @@
+import csv
+import datetime
+import io
+import math
+from itertools import chain
+from typing import IO, Iterable, Iterator, NamedTuple
+from xml.etree.ElementTree import ParseError
+from zipfile import BadZipFile
+
+from backend.models.tricount import Tricount
+from backend.utils.utils import parse_date
+
+FORMATS = ("csv", "xlsx")
+# Layout written by export_tricount_to_excel
+COLUMNS = (
+    "Date",
+    "Description",
+    "Montant",
+    "Devise",
+    "Payeur",
+    "Participants",
+    "Poids",
+)
+REQUIRED_COLUMNS = ("Description", "Montant", "Payeur", "Participants")
+SHEET = "Dépenses"
+MAX_ERRORS = 100
+
+
+class ExpenseRow(NamedTuple):
+    line: int
+    date: datetime.date | None
+    description: str
+    amount: float
+    currency: str | None
+    payer: str
+    participants: list[str]
+    weights: list[float]
+
+
+def import_format(filename: str | None) -> str | None:
+    extension = (filename or "").rpartition(".")[2].lower()
+    return extension if extension in FORMATS else None
+
+
+def _csv_rows(file: IO[bytes]) -> Iterator[list[str]]:
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    # Spreadsheets set to French separate columns with semicolons
+    header = text.readline()
+    delimiter = ";" if header.count(";") > header.count(",") else ","
+    yield from csv.reader(chain([header], text), delimiter=delimiter)
+
+
+def _xlsx_rows(file: IO[bytes]) -> Iterator[tuple]:
+    # openpyxl is slow to import and only needed here
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        sheet = (
+            workbook[SHEET]
+            if SHEET in workbook.sheetnames
+            else workbook.active
+        )
+        yield from sheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _text(value) -> str:
+    return "" if value is None else str(value).strip()
+
+
+def _number(value) -> float:
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        text = _text(value)
+        if "," in text and "." not in text:
+            text = text.replace(",", ".")
+        number = float(text)
+    # float() also reads "nan" and "inf"
+    if not math.isfinite(number):
+        raise ValueError(value)
+    return number
+
+
+def _date(value) -> datetime.date | None:
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return parse_date(_text(value))
+
+
+def _names(value) -> list[str]:
+    return [name for name in map(str.strip, _text(value).split(",")) if name]
+
+
+def _parse_row(line: int, values: dict) -> ExpenseRow:
+    description = _text(values.get("Description"))
+    if not description:
+        raise ValueError("La description est requise")
+
+    try:
+        amount = _number(values.get("Montant"))
+    except ValueError:
+        raise ValueError("Le montant doit être un nombre") from None
+
+    payer = _text(values.get("Payeur"))
+    participants = _names(values.get("Participants"))
+    if not payer:
+        raise ValueError("Le payeur est requis")
+    if not participants:
+        raise ValueError("Au moins un participant est requis")
+
+    weights = []
+    if _text(values.get("Poids")):
+        try:
+            weights = [_number(w) for w in _text(values["Poids"]).split(",")]
+        except ValueError:
+            raise ValueError("Les poids doivent être des nombres") from None
+        if len(weights) != len(participants):
+            raise ValueError("Il faut un poids par participant")
+
+    try:
+        date = _date(values.get("Date"))
+    except ValueError:
+        raise ValueError("La date doit être au format AAAA-MM-JJ") from None
+
+    return ExpenseRow(
+        line,
+        date,
+        description,
+        amount,
+        _text(values.get("Devise")) or None,
+        payer,
+        participants,
+        weights,
+    )
+
+
+def parse_expense_rows(
+    rows: Iterable[Iterable],
+) -> tuple[list[ExpenseRow], list[dict]]:
+    """Validate spreadsheet rows laid out like the export, the first one
+    naming the columns. Returns the valid expenses and an error for each
+    rejected row (line numbers start at 1 with the header)."""
+    rows = iter(rows)
+    header = [_text(value) for value in next(rows, ())]
+    missing = [name for name in REQUIRED_COLUMNS if name not in header]
+    if missing:
+        raise ValueError(f"Colonnes manquantes : {', '.join(missing)}")
+    columns = [
+        (position, name)
+        for position, name in enumerate(header)
+        if name in COLUMNS
+    ]
+
+    parsed = []
+    errors = []
+    for line, row in enumerate(rows, start=2):
+        row = tuple(row)
+        if not any(_text(value) for value in row):
+            continue
+        values = {
+            name: row[position]
+            for position, name in columns
+            if position < len(row)
+        }
+        try:
+            parsed.append(_parse_row(line, values))
+        except ValueError as e:
+            errors.append({"row": line, "error": str(e)})
+    return parsed, errors
+
+
+def read_expense_rows(
+    file: IO[bytes], file_format: str
+) -> tuple[list[ExpenseRow], list[dict]]:
+    """Stream a CSV or xlsx file row by row through parse_expense_rows.
+    Raises ValueError when the file itself cannot be read."""
+    rows = _xlsx_rows(file) if file_format == "xlsx" else _csv_rows(file)
+    try:
+        return parse_expense_rows(rows)
+    except UnicodeDecodeError:
+        raise ValueError("Le fichier doit être encodé en UTF-8") from None
+    except (OSError, KeyError, csv.Error, BadZipFile, ParseError) as e:
+        # openpyxl raises zipfile and XML errors on anything but an xlsx
+        raise ValueError(f"Fichier illisible : {e}") from None
+
+
+def import_expense_rows(
+    tricount: Tricount,
+    rows: list[ExpenseRow],
+    errors: list[dict],
+    email: str,
+) -> dict:
+    """Add parsed expenses to ``tricount``, creating the users named in
+    them (with ``email``) that it does not have yet. The caller commits the
+    tricount once afterwards."""
+    user_ids = {user.name: user.id for user in tricount.users}
+    created = []
+    errors = list(errors)
+    added = 0
+
+    for row in rows:
+        if row.currency and row.currency != tricount.currency.value:
+            errors.append(
+                {
+                    "row": row.line,
+                    "error": f"La devise doit être {tricount.currency.value}",
+                }
+            )
+            continue
+
+        for name in (row.payer, *row.participants):
+            if name not in user_ids:
+                user_ids[name] = tricount.add_user(name=name, email=email).id
+                created.append(name)
+
+        participants_ids = [user_ids[name] for name in row.participants]
+        weights = {}
+        # The export writes a weight of 1 for every participant of an
+        # unweighted expense
+        if any(weight != 1 for weight in row.weights):
+            weights = dict(zip(participants_ids, row.weights))
+        tricount.add_expense(
+            description=row.description,
+            amount=row.amount,
+            payer_id=user_ids[row.payer],
+            participants_ids=participants_ids,
+            weights=weights,
+            date=row.date,
+        )
+        added += 1
+
+    errors.sort(key=lambda error: error["row"])
+    return {
+        "added": added,
+        "users_created": created,
+        "errors": errors[:MAX_ERRORS],
+        "errors_count": len(errors),
+    }
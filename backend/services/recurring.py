@@ -0,0 +1,63 @@
+import datetime
+
+from backend.models.tricount import Tricount
+from backend.utils.metrics import timed
+from backend.utils.tricount_store import TricountStore
+
+# Occurrences entered per tricount in one call, later ones are left to the
+# next pass so that the write lock is never held for a long catch-up
+MAX_OCCURRENCES = 400
+# How far in the past a new template may start
+MAX_CATCH_UP = datetime.timedelta(days=366)
+
+
+def materialize_recurring(
+    tricount: Tricount, today: datetime.date, limit: int = MAX_OCCURRENCES
+) -> int:
+    """Enter the occurrences of the recurring expenses of ``tricount`` due
+    by ``today``, dated on their own day, at most ``limit`` of them.
+    Returns how many were added."""
+    added = 0
+    for recurring in tricount.recurring:
+        while added < limit and recurring.is_due(today):
+            tricount.add_expense(
+                description=recurring.description,
+                amount=recurring.amount,
+                payer_id=recurring.payer_id,
+                participants_ids=recurring.participants_ids,
+                weights=recurring.weights,
+                date=recurring.next_date,
+            )
+            recurring.advance()
+            added += 1
+    return added
+
+
+@timed("run_recurring")
+def run_recurring(
+    store: TricountStore, today: datetime.date | None = None
+) -> tuple[int, int]:
+    """Materialize the due occurrences of all tricounts in one pass. Only
+    tricounts whose header has something due are loaded, each is committed
+    once and the store is saved once. A tricount further behind than
+    ``MAX_OCCURRENCES`` stays due and catches up over the next passes.
+    Returns the number of tricounts touched and of expenses added."""
+    today = today or datetime.date.today()
+    due = [
+        header.id
+        for header in store.headers()
+        if header.next_due and header.next_due <= today.toordinal()
+    ]
+
+    touched = added = 0
+    with store.batch():
+        for tricount_id in due:
+            with store.write(tricount_id) as tricount:
+                if tricount is None:
+                    continue
+                count = materialize_recurring(tricount, today)
+                if count:
+                    store.commit(tricount)
+                    touched += 1
+                    added += count
+    return touched, added
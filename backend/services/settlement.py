@@ -1,3 +1,7 @@
+from backend.utils.metrics import timed
+
+
+@timed("compute_settlements")
 def compute_settlements(
     balances: dict[str, float],
     eps: float = 1e-6,
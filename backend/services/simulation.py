@@ -0,0 +1,47 @@
+from backend.models.tricount import Tricount
+from backend.services.balance import current_balances, expense_deltas
+from backend.services.settlement import compute_settlements
+from backend.utils.metrics import timed
+
+MAX_SCENARIOS = 50
+MAX_SIMULATED_EXPENSES = 1000
+
+
+@timed("simulate_expenses")
+def simulate_expenses(tricount: Tricount, scenarios: list[list[dict]]) -> dict:
+    """Balances and settlements of ``tricount`` if the expenses of each
+    scenario were added, without touching it. The current balances are
+    read once and every scenario only overlays the users its expenses
+    involve, so a scenario costs O(its expenses + users) whatever the size
+    of the tricount."""
+    balances = current_balances(tricount)
+    results = []
+    for expenses in scenarios:
+        # Users who are not members have no balance, as in compute_balances
+        changes = {
+            uid: delta
+            for uid, delta in expense_deltas(expenses).items()
+            if uid in balances
+        }
+        simulated = dict(balances)
+        for uid, delta in changes.items():
+            simulated[uid] += delta
+        results.append(
+            {
+                "balances": simulated,
+                "changes": changes,
+                "settlements": [
+                    {"from": f, "to": t, "amount": amount}
+                    for (f, t, amount) in compute_settlements(simulated)
+                ],
+            }
+        )
+
+    return {
+        "balances": balances,
+        "settlements": [
+            {"from": f, "to": t, "amount": amount}
+            for (f, t, amount) in compute_settlements(balances)
+        ],
+        "scenarios": results,
+    }
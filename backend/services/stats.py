@@ -0,0 +1,67 @@
+from backend.models.expense_stats import TOP_EXPENSES
+from backend.models.tricount import Tricount
+from backend.utils.metrics import timed
+
+
+def _user_totals(tricount: Tricount, user_ids: list[str]) -> dict:
+    """Totals of one or more participants of ``tricount``, read from the
+    aggregates maintained by its expense table."""
+    table = tricount.expense_table
+    stats = table.user_stats()
+    paid = consumed = 0.0
+    count = 0
+    for user_id in user_ids:
+        index = table.user_index.get(user_id)
+        if index is None:
+            continue
+        paid += stats.paid[index]
+        consumed += stats.consumed[index]
+        count += stats.counts[index]
+
+    return {
+        "paid": round(paid, 2),
+        "consumed": round(consumed, 2),
+        "balance": round(paid - consumed, 2),
+        "expenses_count": count,
+    }
+
+
+def _user_stats(tricount: Tricount, user_ids: list[str]) -> dict:
+    """Totals and biggest expenses of one or more participants."""
+    table = tricount.expense_table
+    stats = table.user_stats()
+    top = {}
+    for user_id in user_ids:
+        index = table.user_index.get(user_id)
+        if index is None:
+            continue
+        for expense in stats.top_expenses(index):
+            top[expense["id"]] = expense
+
+    return {
+        **_user_totals(tricount, user_ids),
+        "top_expenses": sorted(
+            top.values(), key=lambda expense: -expense["amount"]
+        )[:TOP_EXPENSES],
+    }
+
+
+@timed("compute_tricount_stats")
+def compute_tricount_stats(tricount: Tricount) -> list[dict]:
+    return [
+        {"id": user.id, "name": user.name, **_user_stats(tricount, [user.id])}
+        for user in tricount.users
+    ]
+
+
+def compute_email_stats(tricount: Tricount) -> dict[str, dict]:
+    """Totals of each member email of ``tricount``, summed over the
+    participants registered with it. Kept in the tricount's header, so
+    they leave out the biggest expenses."""
+    user_ids: dict[str, list[str]] = {}
+    for user in tricount.users:
+        if user.email:
+            user_ids.setdefault(user.email, []).append(user.id)
+    return {
+        email: _user_totals(tricount, ids) for email, ids in user_ids.items()
+    }
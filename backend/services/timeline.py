@@ -0,0 +1,66 @@
+import datetime
+
+from backend.models.tricount import Tricount
+from backend.utils.metrics import timed
+from backend.utils.utils import expense_to_dict
+
+PERIODS = ("day", "week", "month")
+
+
+def period_start(day: datetime.date, period: str) -> datetime.date:
+    if period == "week":
+        return day - datetime.timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+
+@timed("compute_timeline")
+def compute_timeline(
+    tricount: Tricount,
+    start: datetime.date | None,
+    end: datetime.date | None,
+    period: str = "month",
+) -> dict:
+    """Dated expenses between ``start`` and ``end`` (both included, open
+    when None) and their totals per period, read from the table's time
+    index: the daily buckets are only folded into weeks or months."""
+    table = tricount.expense_table
+    timeline = table.time_index()
+    low = start.toordinal() if start else 1
+    high = end.toordinal() if end else datetime.date.max.toordinal()
+
+    buckets: dict[datetime.date, dict] = {}
+    for day, total, count, consumed in timeline.buckets_between(low, high):
+        key = period_start(datetime.date.fromordinal(day), period)
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = {"total": 0.0, "count": 0, "users": {}}
+        bucket["total"] += total
+        bucket["count"] += count
+        users = bucket["users"]
+        for index, share in consumed.items():
+            user_id = table.user_ids[index]
+            users[user_id] = users.get(user_id, 0.0) + share
+
+    return {
+        "period": period,
+        "from": start.isoformat() if start else None,
+        "to": end.isoformat() if end else None,
+        "buckets": [
+            {
+                "start": key.isoformat(),
+                "total": round(bucket["total"], 2),
+                "count": bucket["count"],
+                "users": {
+                    user_id: round(share, 2)
+                    for user_id, share in bucket["users"].items()
+                },
+            }
+            for key, bucket in buckets.items()
+        ],
+        "expenses": [
+            expense_to_dict(table.row(row))
+            for row in timeline.rows_between(low, high)
+        ],
+    }
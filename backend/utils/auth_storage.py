@@ -1,24 +1,74 @@
+import gzip
 import json
+import os
+import tempfile
+import threading
+import zlib
+from contextlib import contextmanager
 from dataclasses import asdict
 from pathlib import Path
 
 from backend.models.auth_user import AuthUser
+from backend.utils import tricount_storage
+from backend.utils.metrics import timed
 
 DATA_FILE = Path("data/users.json")
 
+# Same formats as tricount_storage, "deflate" gzips the whole file
+FORMAT = "json"
+COMPRESSION_LEVEL = 1
+GZIP_MAGIC = b"\x1f\x8b"
 
-def load_users() -> list[AuthUser]:
-    if not DATA_FILE.exists() or DATA_FILE.stat().st_size == 0:
+_lock = threading.Lock()
+
+
+def lock_file() -> Path:
+    return DATA_FILE.with_name(f"{DATA_FILE.stem}.lock")
+
+
+@contextmanager
+def users_lock():
+    """Serializes load/modify/save cycles of DATA_FILE, between the threads
+    of this process and, through a flock, with other processes."""
+    with _lock, tricount_storage.file_lock(lock_file()):
+        yield
+
+
+@timed("users_load")
+def load_users(path: Path | None = None) -> list[AuthUser]:
+    path = path or DATA_FILE
+    if not path.exists() or path.stat().st_size == 0:
         return []
     try:
-        with open(DATA_FILE, "r") as f:
-            data = json.load(f)
-            return [AuthUser(**u) for u in data]
-    except (json.JSONDecodeError, FileNotFoundError, TypeError):
+        raw = path.read_bytes()
+        if raw[:2] == GZIP_MAGIC:
+            raw = gzip.decompress(raw)
+        data = json.loads(raw)
+        return [AuthUser(**u) for u in data]
+    except (ValueError, OSError, EOFError, zlib.error, TypeError):
         return []
 
 
+@timed("users_save")
 def save_users(users: list[AuthUser]) -> None:
     DATA_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(DATA_FILE, "w") as f:
-        json.dump([asdict(u) for u in users], f, indent=2)
+    data = [asdict(u) for u in users]
+    if FORMAT == "json":
+        encoded = json.dumps(data, indent=2).encode("utf-8")
+    else:
+        encoded = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    if FORMAT == "deflate":
+        encoded = gzip.compress(
+            encoded, compresslevel=COMPRESSION_LEVEL, mtime=0
+        )
+    # Renamed into place so that readers and backups never see a torn file
+    fd, tmp_path = tempfile.mkstemp(
+        dir=DATA_FILE.parent, prefix=f".{DATA_FILE.name}."
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(encoded)
+        os.replace(tmp_path, DATA_FILE)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -0,0 +1,252 @@
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import zlib
+from pathlib import Path
+
+from backend.utils import auth_storage, tricount_storage
+from backend.utils.metrics import timed
+from backend.utils.tricount_store import TricountStore
+
+MANIFEST = "MANIFEST.json"
+COMPRESSION_LEVEL = 6
+CHUNK_SIZE = 1 << 20
+
+
+class _HashingReader:
+    def __init__(self, f):
+        self._f = f
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._f.read(size)
+        self.sha256.update(data)
+        return data
+
+
+def _pin(path: Path, staging: Path, name: str) -> None:
+    target = staging / name
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(path, target)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        # No hard links across file systems (or on some volumes)
+        shutil.copy2(path, target)
+
+
+def _pin_files(staging: Path) -> None:
+    """Hard link the data files into ``staging``. Files are only ever
+    replaced by a rename, so the links keep their current content."""
+    _pin(tricount_storage.DATA_FILE, staging, tricount_storage.DATA_FILE.name)
+    index = tricount_storage.index_file()
+    _pin(index, staging, index.name)
+    _pin(auth_storage.DATA_FILE, staging, auth_storage.DATA_FILE.name)
+    archive_dir = tricount_storage.archive_dir()
+    if archive_dir.is_dir():
+        for path in archive_dir.iterdir():
+            _pin(path, staging, f"{archive_dir.name}/{path.name}")
+
+
+def _index_counts(path: Path) -> tuple[int, int]:
+    tricounts = archived = 0
+    if path.exists():
+        with path.open("r", encoding="utf-8") as f:
+            f.readline()
+            for line in f:
+                tricounts += 1
+                archived += bool(json.loads(line).get("archived"))
+    return tricounts, archived
+
+
+def backup_name() -> str:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return f"backup-{now:%Y%m%dT%H%M%S%fZ}.tar.gz"
+
+
+@timed("backup_create")
+def create_backup(store: TricountStore, output: Path) -> dict:
+    """Write a gzipped tar of the tricounts (data file, index and archives)
+    and users as they were at one point in time. Saves are only held off
+    while the files are hard linked aside, the archive is written from the
+    links while writes go on. Returns the manifest, stored last in the
+    archive with the size and SHA-256 of every other member."""
+    data_dir = tricount_storage.DATA_FILE.parent
+    data_dir.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(dir=data_dir, prefix=".backup-"))
+    try:
+        with store.pinned():
+            _pin_files(staging)
+
+        tricounts, archived = _index_counts(
+            staging / tricount_storage.index_file().name
+        )
+        manifest = {
+            "created": datetime.datetime.now(datetime.timezone.utc)
+            .replace(microsecond=0)
+            .isoformat(),
+            "tricounts": tricounts,
+            "archived": archived,
+            "users": len(
+                auth_storage.load_users(staging / auth_storage.DATA_FILE.name)
+            ),
+            "files": {},
+        }
+
+        output.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=output.parent, prefix=f".{output.name}."
+        )
+        try:
+            with os.fdopen(fd, "wb") as f, tarfile.open(
+                fileobj=f, mode="w:gz", compresslevel=COMPRESSION_LEVEL
+            ) as tar:
+                for path in sorted(
+                    p for p in staging.rglob("*") if p.is_file()
+                ):
+                    name = path.relative_to(staging).as_posix()
+                    info = tar.gettarinfo(path, arcname=name)
+                    with path.open("rb") as source:
+                        reader = _HashingReader(source)
+                        tar.addfile(info, reader)
+                    manifest["files"][name] = {
+                        "size": info.size,
+                        "sha256": reader.sha256.hexdigest(),
+                    }
+
+                encoded = json.dumps(manifest, indent=2).encode("utf-8")
+                info = tarfile.TarInfo(MANIFEST)
+                info.size = len(encoded)
+                info.mtime = int(datetime.datetime.now().timestamp())
+                tar.addfile(info, io.BytesIO(encoded))
+            os.replace(tmp_path, output)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return manifest
+
+
+def _check_contents(root: Path, manifest: dict) -> list[str]:
+    """Check that the extracted files of a backup are readable and agree
+    with each other."""
+    problems = []
+    data_file = root / tricount_storage.DATA_FILE.name
+    index_file = root / tricount_storage.index_file().name
+    archive_dir = root / tricount_storage.archive_dir().name
+
+    try:
+        scanned = {
+            data["id"]: span
+            for data, span in tricount_storage.scan_tricounts(path=data_file)
+        }
+    except ValueError as e:
+        return [f"{data_file.name}: {e}"]
+
+    indexed, archived = {}, []
+    if index_file.exists():
+        with index_file.open("r", encoding="utf-8") as f:
+            meta = json.loads(f.readline())
+            for line in f:
+                entry = json.loads(line)
+                if entry.get("archived"):
+                    archived.append(entry["id"])
+                else:
+                    indexed[entry["id"]] = tuple(entry["span"])
+        checksum = 0
+        if data_file.exists():
+            with data_file.open("rb") as f:
+                while chunk := f.read(CHUNK_SIZE):
+                    checksum = zlib.crc32(chunk, checksum)
+        if meta.get("checksum") not in (None, checksum):
+            problems.append(f"{data_file.name}: CRC-32 differs from the index")
+        if indexed != scanned:
+            problems.append(f"{index_file.name}: does not match the data file")
+    else:
+        indexed = scanned
+
+    for tricount_id in archived:
+        path = archive_dir / f"{tricount_id}.json.gz"
+        try:
+            data = json.loads(gzip.decompress(path.read_bytes()))
+        except (OSError, EOFError, ValueError, zlib.error) as e:
+            problems.append(f"archive of {tricount_id}: {e}")
+            continue
+        if data.get("id") != tricount_id:
+            problems.append(f"archive of {tricount_id}: wrong tricount")
+
+    if len(indexed) + len(archived) != manifest.get("tricounts"):
+        problems.append("number of tricounts differs from the manifest")
+
+    users_file = root / auth_storage.DATA_FILE.name
+    if users_file.exists():
+        raw = users_file.read_bytes()
+        try:
+            if raw[:2] == auth_storage.GZIP_MAGIC:
+                raw = gzip.decompress(raw)
+            users = json.loads(raw) if raw else []
+        except (OSError, EOFError, ValueError, zlib.error) as e:
+            problems.append(f"{users_file.name}: {e}")
+        else:
+            if len(users) != manifest.get("users"):
+                problems.append("number of users differs from the manifest")
+    return problems
+
+
+@timed("backup_verify")
+def verify_backup(path: Path) -> list[str]:
+    """Problems found in the backup at ``path``, none when it is intact:
+    every member must match the size and SHA-256 of the manifest, and the
+    tricounts, index, archives and users must all be readable and
+    consistent."""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        found = {}
+        manifest = None
+        try:
+            with tarfile.open(path, mode="r:gz") as tar:
+                for info in tar:
+                    if not info.isfile():
+                        continue
+                    source = tar.extractfile(info)
+                    if info.name == MANIFEST:
+                        manifest = json.loads(source.read())
+                        continue
+                    target = root / info.name
+                    if root not in target.resolve().parents:
+                        return [f"{info.name}: outside of the backup"]
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    sha256 = hashlib.sha256()
+                    with target.open("wb") as f:
+                        while chunk := source.read(CHUNK_SIZE):
+                            sha256.update(chunk)
+                            f.write(chunk)
+                    found[info.name] = {
+                        "size": info.size,
+                        "sha256": sha256.hexdigest(),
+                    }
+        except (OSError, EOFError, tarfile.TarError, ValueError) as e:
+            return [f"unreadable backup: {e}"]
+
+        if manifest is None:
+            return [f"{MANIFEST} is missing"]
+        problems = [
+            f"{name}: missing or modified"
+            for name, expected in manifest["files"].items()
+            if found.get(name) != expected
+        ]
+        problems += [
+            f"{name}: not in the manifest"
+            for name in found.keys() - manifest["files"].keys()
+        ]
+        if problems:
+            return problems
+        return _check_contents(root, manifest)
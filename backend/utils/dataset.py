@@ -0,0 +1,196 @@
+import datetime
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+from backend.models.auth_user import AuthUser
+from backend.models.currency import Currency
+from backend.models.tricount import Tricount
+from backend.utils.utils import tricount_from_dict
+
+FIRST_NAMES = [
+    "Alice",
+    "Bob",
+    "Chloé",
+    "David",
+    "Emma",
+    "Farid",
+    "Gaëlle",
+    "Hugo",
+    "Inès",
+    "Jules",
+    "Karim",
+    "Léa",
+    "Mehdi",
+    "Nina",
+    "Oscar",
+    "Paul",
+]
+
+DESCRIPTIONS = [
+    "Courses",
+    "Restaurant",
+    "Essence",
+    "Péage",
+    "Location",
+    "Billets de train",
+    "Apéro",
+    "Boulangerie",
+    "Musée",
+    "Loyer",
+    "Électricité",
+    "Internet",
+]
+
+FIRST_DAY = datetime.date(2025, 1, 1)
+
+
+def generate_tricount_dict(
+    rng: random.Random,
+    users: int = 8,
+    expenses: int = 200,
+    weighted_ratio: float = 0.2,
+    owner_email: str = "owner@bench.com",
+    name: str = "Tricount",
+    emails: list[str] | None = None,
+) -> dict:
+    """Build a tricount in the storage format, with ids drawn from ``rng``
+    so that the same seed always produces the same dataset. Members get
+    ``emails`` when given (the first one owning the tricount)."""
+    if emails:
+        owner_email = emails[0]
+    members = [
+        {
+            "id": _seeded_id(rng),
+            "name": f"{FIRST_NAMES[i % len(FIRST_NAMES)]} {i}",
+            "email": (
+                emails[i]
+                if emails
+                else owner_email if i == 0 else f"user{i}@bench.com"
+            ),
+        }
+        for i in range(users)
+    ]
+    user_ids = [member["id"] for member in members]
+    # A few members pay for most things, as in real groups
+    payer_weights = [1.0 / (rank + 1) for rank in range(users)]
+
+    rows = []
+    for _ in range(expenses):
+        if rng.random() < 0.5:
+            participants_ids = list(user_ids)
+        else:
+            participants_ids = rng.sample(user_ids, rng.randint(1, users))
+
+        weights = {}
+        if rng.random() < weighted_ratio:
+            weights = {
+                uid: float(rng.randint(1, 3)) for uid in participants_ids
+            }
+
+        rows.append(
+            {
+                "id": _seeded_id(rng),
+                "description": rng.choice(DESCRIPTIONS),
+                "amount": round(min(rng.lognormvariate(3.0, 1.0), 5000.0), 2),
+                "currency": Currency.EUR.value,
+                "payer_id": rng.choices(user_ids, weights=payer_weights)[0],
+                "participants_ids": participants_ids,
+                "weights": weights,
+                "date": (
+                    FIRST_DAY + datetime.timedelta(days=rng.randrange(365))
+                ).isoformat(),
+            }
+        )
+
+    return {
+        "id": _seeded_id(rng),
+        "owner_email": owner_email,
+        "name": name,
+        "currency": Currency.EUR.value,
+        "users": members,
+        "expenses": rows,
+    }
+
+
+def generate_tricounts(
+    seed: int = 42,
+    groups: int = 10,
+    users: int = 8,
+    expenses: int = 200,
+    weighted_ratio: float = 0.2,
+    owner_email: str = "owner@bench.com",
+) -> list[Tricount]:
+    rng = random.Random(seed)
+    return [
+        tricount_from_dict(
+            data=generate_tricount_dict(
+                rng,
+                users=users,
+                expenses=expenses,
+                weighted_ratio=weighted_ratio,
+                owner_email=owner_email,
+                name=f"Tricount {i}",
+            )
+        )
+        for i in range(groups)
+    ]
+
+
+def _seeded_id(rng: random.Random) -> str:
+    return "%08x-%04x-4%03x-%04x-%012x" % (
+        rng.getrandbits(32),
+        rng.getrandbits(16),
+        rng.getrandbits(12),
+        0x8000 | rng.getrandbits(14),
+        rng.getrandbits(48),
+    )
+
+
+def _hash_password(password_and_rounds: tuple[str, int]) -> str:
+    password, rounds = password_and_rounds
+    # What Flask-Bcrypt's generate_password_hash stores
+    return bcrypt.hashpw(
+        password.encode("utf-8"), bcrypt.gensalt(rounds)
+    ).decode("utf-8")
+
+
+def hash_passwords(
+    passwords: list[str], rounds: int = 12, workers: int | None = None
+) -> list[str]:
+    """bcrypt hashes of ``passwords``, computed by a pool of ``workers``
+    processes (one per CPU by default)."""
+    workers = workers or os.cpu_count() or 1
+    jobs = [(password, rounds) for password in passwords]
+    if workers == 1 or len(jobs) <= 1:
+        return list(map(_hash_password, jobs))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(1, len(jobs) // (workers * 4))
+        return list(pool.map(_hash_password, jobs, chunksize=chunksize))
+
+
+def generate_users(
+    count: int,
+    password: str = "pass{i}",
+    domain: str = "seed.test",
+    start: int = 0,
+    rounds: int = 12,
+    workers: int | None = None,
+) -> list[AuthUser]:
+    """Users ``user{i}@domain`` for i from ``start``, with the password
+    ``password.format(i=i)``."""
+    indexes = range(start, start + count)
+    hashes = hash_passwords(
+        [password.format(i=i) for i in indexes], rounds, workers
+    )
+    return [
+        AuthUser(
+            email=f"user{i}@{domain}",
+            password_hash=password_hash,
+            name=f"{FIRST_NAMES[i % len(FIRST_NAMES)]} {i}",
+        )
+        for i, password_hash in zip(indexes, hashes)
+    ]
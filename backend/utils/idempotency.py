@@ -0,0 +1,340 @@
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from flask import abort, current_app, make_response, request
+from flask_jwt_extended import get_jwt_identity
+
+from backend.utils import tricount_storage
+from backend.utils.metrics import metrics
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+# Uploads are fingerprinted by size rather than read twice
+MAX_HASHED_BODY = 1 << 20
+# Shared mode enforces the size bounds every that many stored responses
+SWEEP_EVERY = 100
+LOCK_NAME = ".lock"
+
+_IN_FLIGHT = object()
+
+
+class IdempotencyCache:
+    """Responses of mutating requests sent with an ``Idempotency-Key``
+    header, replayed when a client retries with the same key instead of
+    running the request again.
+
+    Keys are scoped to the caller, method and path. Entries expire after
+    ``ttl`` seconds, and the oldest ones are evicted beyond ``max_entries``
+    responses or ``max_bytes`` bytes of bodies. Server errors are not kept,
+    so retrying them runs the request again.
+
+    Entries live in memory, or with ``shared`` in one file per key in
+    ``tricount_storage.idempotency_dir()``, so that every worker sharing
+    the data volume sees them. A key is claimed by creating its file
+    exclusively, and expires ``ttl`` seconds after the file was last
+    written. A claim whose response was never written, because its worker
+    died, is taken over ``lease`` seconds after it was made. The size
+    bounds are enforced every ``SWEEP_EVERY`` stored responses, under a
+    file lock.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 86_400,
+        lease: float = 120,
+        max_entries: int = 10_000,
+        max_bytes: int = 64 << 20,
+        shared: bool = False,
+        clock=time.time,
+    ):
+        self.enabled = True
+        self.ttl = ttl
+        self.lease = lease
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self._clock = clock
+        self._stored = 0
+        # scope -> (expires, fingerprint, status, body, content type)
+        self._entries: OrderedDict[tuple, tuple] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        config = app.config
+        self.enabled = config.get("IDEMPOTENCY_ENABLED", True)
+        self.ttl = config.get("IDEMPOTENCY_TTL", 86_400)
+        self.lease = config.get("IDEMPOTENCY_LEASE", 120)
+        self.max_entries = config.get("IDEMPOTENCY_MAX_ENTRIES", 10_000)
+        self.max_bytes = config.get("IDEMPOTENCY_MAX_BYTES", 64 << 20)
+        self.shared = config.get(
+            "IDEMPOTENCY_SHARED", config.get("TRICOUNT_MULTIPROCESS", False)
+        )
+        if not self.shared:
+            self.clear()
+
+    def _fingerprint(self) -> bytes:
+        length = request.content_length or 0
+        if length > MAX_HASHED_BODY:
+            return f"{request.content_type}:{length}".encode()
+        return hashlib.sha256(request.get_data()).digest()
+
+    def _drop(self, scope: tuple) -> None:
+        entry = self._entries.pop(scope)
+        if entry[2] is not _IN_FLIGHT:
+            self._bytes -= len(entry[3])
+
+    def _evict(self, now: float) -> None:
+        # Entries are kept in insertion order, which is also expiry order
+        while self._entries:
+            scope, entry = next(iter(self._entries.items()))
+            if entry[2] is _IN_FLIGHT and entry[0] > now:
+                break
+            if (
+                entry[0] > now
+                and len(self._entries) <= self.max_entries
+                and self._bytes <= self.max_bytes
+            ):
+                break
+            self._drop(scope)
+
+    def _begin(self, scope: tuple, fingerprint: bytes):
+        """The stored entry for ``scope``, or None after marking it as in
+        flight."""
+        if self.shared:
+            return self._begin_shared(scope, fingerprint)
+        with self._lock:
+            now = self._clock()
+            self._evict(now)
+            entry = self._entries.get(scope)
+            if entry is not None:
+                return entry
+            self._entries[scope] = (now + self.ttl, fingerprint, _IN_FLIGHT)
+            return None
+
+    def _finish(self, scope: tuple, fingerprint: bytes, response) -> None:
+        if self.shared:
+            self._finish_shared(scope, fingerprint, response)
+            return
+        with self._lock:
+            if scope in self._entries:
+                self._drop(scope)
+            if response is None or response.status_code >= 500:
+                return
+            body = response.get_data()
+            if len(body) > self.max_bytes:
+                return
+
+            self._entries[scope] = (
+                self._clock() + self.ttl,
+                fingerprint,
+                response.status_code,
+                body,
+                response.content_type,
+            )
+            self._bytes += len(body)
+            self._evict(self._clock())
+        metrics.inc("idempotency_requests_total", result="stored")
+
+    def _path(self, scope: tuple) -> Path:
+        digest = hashlib.sha256(json.dumps(scope).encode()).hexdigest()
+        return tricount_storage.idempotency_dir() / digest
+
+    def _read_shared(self, path: Path) -> tuple | None:
+        """Entry stored at ``path``, None when missing or expired."""
+        try:
+            with path.open("rb") as f:
+                mtime = os.fstat(f.fileno()).st_mtime
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        now = self._clock()
+        meta, _, body = data.partition(b"\n")
+        try:
+            meta = json.loads(meta)
+        except ValueError:
+            # Claimed by a request that has not written its marker yet
+            meta = {"status": None}
+        if meta["status"] is None:
+            # In flight markers only last as long as their lease, so that
+            # the claim of a worker killed meanwhile gets taken over
+            expires = mtime + self.lease
+            if expires <= now:
+                return None
+            return (expires, None, _IN_FLIGHT)
+
+        expires = mtime + self.ttl
+        if expires <= now:
+            return None
+        return (
+            expires,
+            bytes.fromhex(meta["fingerprint"]),
+            meta["status"],
+            body,
+            meta["content_type"],
+        )
+
+    def _begin_shared(self, scope: tuple, fingerprint: bytes):
+        path = self._path(scope)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        marker = json.dumps({"fingerprint": fingerprint.hex(), "status": None})
+        while True:
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+            except FileExistsError:
+                pass
+            else:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(marker.encode())
+                return None
+
+            entry = self._read_shared(path)
+            if entry is not None:
+                return entry
+            # Expired: drop it unless another worker replaced it meanwhile
+            with tricount_storage.file_lock(path.parent / LOCK_NAME):
+                if self._read_shared(path) is None:
+                    path.unlink(missing_ok=True)
+
+    def _finish_shared(self, scope: tuple, fingerprint: bytes, response):
+        path = self._path(scope)
+        if response is None or response.status_code >= 500:
+            path.unlink(missing_ok=True)
+            return
+        body = response.get_data()
+        if len(body) > self.max_bytes:
+            path.unlink(missing_ok=True)
+            return
+
+        meta = {
+            "fingerprint": fingerprint.hex(),
+            "status": response.status_code,
+            "content_type": response.content_type,
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(json.dumps(meta).encode() + b"\n" + body)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        metrics.inc("idempotency_requests_total", result="stored")
+
+        with self._lock:
+            self._stored += 1
+            sweep = self._stored % SWEEP_EVERY == 0
+        if sweep:
+            self._sweep()
+
+    def _shared_files(self) -> list[tuple[float, int, Path]]:
+        """(mtime, size, path) of every stored entry, oldest first."""
+        directory = tricount_storage.idempotency_dir()
+        files = []
+        if not directory.is_dir():
+            return files
+        for entry in os.scandir(directory):
+            if entry.name.startswith("."):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, Path(entry.path)))
+        files.sort()
+        return files
+
+    def _sweep(self) -> None:
+        directory = tricount_storage.idempotency_dir()
+        with tricount_storage.file_lock(directory / LOCK_NAME):
+            files = self._shared_files()
+            count = len(files)
+            size = sum(file_size for _, file_size, _ in files)
+            now = self._clock()
+            for mtime, file_size, path in files:
+                if (
+                    mtime + self.ttl > now
+                    and count <= self.max_entries
+                    and size <= self.max_bytes
+                ):
+                    break
+                path.unlink(missing_ok=True)
+                count -= 1
+                size -= file_size
+
+    def idempotent(self, view):
+        """Route decorator, placed under ``jwt_required``."""
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not self.enabled or not key:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                abort(400, description="La clé d'idempotence est trop longue")
+
+            scope = (get_jwt_identity(), request.method, request.path, key)
+            fingerprint = self._fingerprint()
+            entry = self._begin(scope, fingerprint)
+            if entry is not None:
+                return self._replay(entry, fingerprint)
+
+            response = None
+            try:
+                response = make_response(view(*args, **kwargs))
+            finally:
+                self._finish(scope, fingerprint, response)
+            return response
+
+        return wrapper
+
+    def _replay(self, entry: tuple, fingerprint: bytes):
+        _, stored_fingerprint, status, *stored = entry
+        if status is _IN_FLIGHT:
+            metrics.inc("idempotency_requests_total", result="in_flight")
+            response = make_response(
+                {"error": "Cette requête est déjà en cours de traitement"},
+                409,
+            )
+            response.headers["Retry-After"] = "1"
+            return response
+        if stored_fingerprint != fingerprint:
+            metrics.inc("idempotency_requests_total", result="mismatch")
+            abort(
+                422,
+                description="Cette clé d'idempotence a déjà servi pour une autre requête",
+            )
+
+        metrics.inc("idempotency_requests_total", result="replayed")
+        body, content_type = stored
+        response = current_app.response_class(
+            body, status=status, content_type=content_type
+        )
+        response.headers["Idempotent-Replayed"] = "true"
+        return response
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.shared:
+            for _, _, path in self._shared_files():
+                path.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        if self.shared:
+            files = self._shared_files()
+            return {
+                "entries": len(files),
+                "bytes": sum(size for _, size, _ in files),
+            }
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
@@ -0,0 +1,247 @@
+import functools
+import hmac
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Callable
+
+from flask import Response, abort, current_app, g, request
+
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+HELP = {
+    "http_requests_total": "HTTP requests by route, method and status.",
+    "http_request_duration_seconds": "HTTP request latency.",
+    "tricount_section_duration_seconds": "Time spent in hot code paths.",
+    "tricount_cache_lookups_total": "Tricount cache hits and misses.",
+    "idempotency_requests_total": "Requests sent with an Idempotency-Key.",
+}
+
+
+class _Shard:
+    """Metrics recorded by a single thread.
+
+    Only the owning thread ever writes to a shard, so recording needs no
+    lock; the exporter sums all shards when ``/metrics`` is scraped.
+    """
+
+    __slots__ = ("counters", "histograms")
+
+    def __init__(self):
+        self.counters: dict[tuple, float] = {}
+        self.histograms: dict[tuple, list] = {}
+
+
+class Metrics:
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.enabled = True
+        self.buckets = buckets
+        self._local = threading.local()
+        self._shards: list[_Shard] = []
+        self._shards_lock = threading.Lock()
+        self._gauges: list[tuple[str, str, Callable[[], dict]]] = []
+
+    def init_app(self, app) -> None:
+        self.enabled = app.config.get("METRICS_ENABLED", True)
+        if not self.enabled:
+            return
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule("/metrics", "metrics", self._export)
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name: str, amount: float = 1.0, **labels) -> None:
+        if not self.enabled:
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+        counters = self._shard().counters
+        counters[key] = counters.get(key, 0.0) + amount
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        if not self.enabled:
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+        histograms = self._shard().histograms
+        histogram = histograms.get(key)
+        if histogram is None:
+            # Per-bucket counts (+Inf last), then sum
+            histogram = histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        histogram[bisect_left(self.buckets, value)] += 1
+        histogram[-1] += value
+
+    @contextmanager
+    def timer(self, section: str):
+        if not self.enabled:
+            yield
+            return
+
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(
+                "tricount_section_duration_seconds",
+                perf_counter() - start,
+                section=section,
+            )
+
+    def add_gauge(self, name: str, help: str, collect: Callable) -> None:
+        """Expose values computed at scrape time. ``collect`` returns a
+        mapping of label tuples (or ``()``) to values."""
+        self._gauges.append((name, help, collect))
+
+    def reset(self) -> None:
+        with self._shards_lock:
+            for shard in self._shards:
+                shard.counters.clear()
+                shard.histograms.clear()
+
+    def _before_request(self) -> None:
+        g.metrics_start = perf_counter()
+
+    def _after_request(self, response):
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return response
+
+        labels = {
+            "method": request.method,
+            "route": request.url_rule.rule if request.url_rule else "",
+            "status": str(response.status_code),
+        }
+        self.observe(
+            "http_request_duration_seconds", perf_counter() - start, **labels
+        )
+        self.inc("http_requests_total", **labels)
+        return response
+
+    def _collect(self) -> tuple[dict, dict]:
+        counters: dict[tuple, float] = {}
+        histograms: dict[tuple, list] = {}
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            # dict.copy() is atomic, the owning thread may keep writing
+            for key, value in shard.counters.copy().items():
+                counters[key] = counters.get(key, 0.0) + value
+            for key, values in shard.histograms.copy().items():
+                total = histograms.setdefault(key, [0] * len(values))
+                for i, value in enumerate(list(values)):
+                    total[i] += value
+        return counters, histograms
+
+    def render(self) -> str:
+        counters, histograms = self._collect()
+        lines = []
+        declared = set()
+
+        def declare(name, kind, help=None):
+            if name in declared:
+                return
+            declared.add(name)
+            lines.append(f"# HELP {name} {help or HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            declare(name, "counter")
+            lines.append(f"{name}{_labels(labels)} {_number(value)}")
+
+        for (name, labels), values in sorted(histograms.items()):
+            declare(name, "histogram")
+            cumulative = 0
+            bounds = [_number(b) for b in self.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, values[:-1]):
+                cumulative += count
+                le = _labels(labels + (("le", bound),))
+                lines.append(f"{name}_bucket{le} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(values[-1])}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+
+        for name, help, collect in self._gauges:
+            declare(name, "gauge", help)
+            for labels, value in collect().items():
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+
+        return "\n".join(lines) + "\n"
+
+    def _export(self):
+        # Disabled unless METRICS_TOKEN is set, and then hidden from others
+        token = current_app.config.get("METRICS_TOKEN")
+        sent = request.headers.get("Authorization", "")
+        if not token or not hmac.compare_digest(sent, f"Bearer {token}"):
+            abort(404, description="Ressource non trouvée")
+        return Response(
+            self.render(), mimetype="text/plain; version=0.0.4; charset=utf-8"
+        )
+
+
+def _escape(value) -> str:
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+    )
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _number(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+metrics = Metrics()
+
+
+def timed(section: str):
+    """Decorator recording the duration of each call under ``section``."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.observe(
+                    "tricount_section_duration_seconds",
+                    perf_counter() - start,
+                    section=section,
+                )
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,177 @@
+import cProfile
+import hmac
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from uuid import uuid4
+
+from flask import g, jsonify, request
+
+
+class StackSampler:
+    """Samples the stack of one thread at a fixed interval and counts
+    collapsed stacks, the input format of flamegraph tools."""
+
+    def __init__(self, thread_id: int, interval: float = 0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                module = frame.f_globals.get("__name__", "?")
+                names.append(f"{module}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+
+class RequestProfiler:
+    """Profiles single requests on demand.
+
+    Only active when ``PROFILING_ENABLED`` is set, and then only for
+    requests carrying ``X-Profile`` (or ``?profile=``): ``1`` writes a
+    pstats file and a collapsed-stack file to ``PROFILING_DIR``, ``summary``
+    replaces the response by the top functions. The request must also send
+    ``PROFILING_TOKEN``, without which profiling cannot be enabled, in
+    ``X-Profile-Token``.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = Path("data/profiles")
+        self.token = None
+        self.top = 20
+        self.sample_interval = 0.001
+        # cProfile cannot run in two threads at once on recent Pythons
+        self._busy = threading.Lock()
+
+    def init_app(self, app) -> None:
+        config = app.config
+        self.enabled = config.get("PROFILING_ENABLED", False)
+        self.directory = Path(config.get("PROFILING_DIR", self.directory))
+        self.token = config.get("PROFILING_TOKEN") or None
+        if self.enabled and not self.token:
+            raise RuntimeError("PROFILING_ENABLED requires PROFILING_TOKEN")
+        self.top = config.get("PROFILING_TOP", self.top)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def _requested_mode(self) -> str | None:
+        if not self.enabled or not self.token:
+            return None
+
+        mode = request.headers.get("X-Profile") or request.args.get("profile")
+        if mode not in ("1", "summary"):
+            return None
+        sent = request.headers.get("X-Profile-Token", "")
+        if not hmac.compare_digest(sent, self.token):
+            return None
+        return mode
+
+    def _before_request(self) -> None:
+        mode = self._requested_mode()
+        if mode is None or not self._busy.acquire(blocking=False):
+            return
+
+        sampler = StackSampler(threading.get_ident(), self.sample_interval)
+        profile = cProfile.Profile()
+        g.profiling = (mode, profile, sampler, time.perf_counter())
+        sampler.start()
+        profile.enable()
+
+    def _after_request(self, response):
+        profiling = g.pop("profiling", None)
+        if profiling is None:
+            return response
+
+        mode, profile, sampler, start = profiling
+        try:
+            profile.disable()
+            sampler.stop()
+        finally:
+            self._busy.release()
+        elapsed = time.perf_counter() - start
+
+        if mode == "summary":
+            return jsonify(
+                {
+                    "endpoint": request.endpoint,
+                    "status": response.status_code,
+                    "duration": elapsed,
+                    "samples": sum(sampler.stacks.values()),
+                    "top": self.summary(profile),
+                }
+            )
+
+        profile_id = self.write(profile, sampler)
+        response.headers["X-Profile-Id"] = profile_id
+        return response
+
+    def _teardown_request(self, exc) -> None:
+        # Safety net when the response never went through after_request
+        profiling = g.pop("profiling", None)
+        if profiling is not None:
+            _, profile, sampler, _ = profiling
+            profile.disable()
+            sampler.stop()
+            self._busy.release()
+
+    def summary(self, profile: cProfile.Profile) -> list[dict]:
+        stats = pstats.Stats(profile)
+        rows = sorted(
+            stats.stats.items(), key=lambda item: item[1][3], reverse=True
+        )
+        return [
+            {
+                "function": f"{Path(filename).name}:{line}({name})",
+                "calls": calls,
+                "total_time": total_time,
+                "cumulative_time": cumulative_time,
+            }
+            for (filename, line, name), (
+                _,
+                calls,
+                total_time,
+                cumulative_time,
+                _,
+            ) in rows[: self.top]
+        ]
+
+    def write(self, profile: cProfile.Profile, sampler: StackSampler) -> str:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        endpoint = (request.endpoint or "unknown").replace(".", "_")
+        profile_id = (
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{uuid4().hex[:8]}"
+        )
+        profile.dump_stats(self.directory / f"{profile_id}.pstats")
+        (self.directory / f"{profile_id}.folded").write_text(
+            sampler.collapsed(), encoding="utf-8"
+        )
+        return profile_id
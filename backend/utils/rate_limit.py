@@ -0,0 +1,210 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucketLimiter:
+    """Token buckets keyed by an arbitrary string, bounded in number.
+
+    Buckets refill continuously at ``refill_rate`` tokens per second up to
+    ``capacity``. When more than ``max_buckets`` keys are tracked, the least
+    recently used buckets are evicted: an evicted bucket simply starts full
+    again, which is the state an idle bucket would have reached anyway.
+    """
+
+    def __init__(
+        self,
+        capacity: float,
+        refill_rate: float,
+        max_buckets: int = 10_000,
+        clock=time.monotonic,
+    ):
+        self.capacity = float(capacity)
+        self.refill_rate = float(refill_rate)
+        self.max_buckets = max_buckets
+        self._clock = clock
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _refreshed(self, key: str, now: float) -> list[float] | None:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return None
+
+        tokens, updated = bucket
+        tokens = min(
+            self.capacity, tokens + (now - updated) * self.refill_rate
+        )
+        if tokens >= self.capacity:
+            # A full bucket carries no information, drop it to save memory
+            del self._buckets[key]
+            return None
+
+        bucket[0] = tokens
+        bucket[1] = now
+        self._buckets.move_to_end(key)
+        return bucket
+
+    def tokens(self, key: str) -> float:
+        with self._lock:
+            bucket = self._refreshed(key, self._clock())
+            return self.capacity if bucket is None else bucket[0]
+
+    def retry_after(self, key: str) -> float:
+        return self._wait(self.tokens(key), 1.0)
+
+    def _wait(self, tokens: float, amount: float) -> float:
+        missing = amount - tokens
+        if missing <= 0:
+            return 0.0
+        if self.refill_rate <= 0:
+            return math.inf
+        return missing / self.refill_rate
+
+    def _take(self, key: str, now: float, amount: float) -> None:
+        bucket = self._refreshed(key, now)
+        if bucket is None:
+            bucket = [self.capacity, now]
+            self._buckets[key] = bucket
+        bucket[0] = max(0.0, bucket[0] - amount)
+
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+
+    def consume(self, key: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._take(key, self._clock(), amount)
+
+    def acquire(self, key: str, amount: float = 1.0) -> float:
+        """Take ``amount`` tokens if the bucket holds them, in one step.
+        Returns 0 when taken, or the seconds until they will be there."""
+        with self._lock:
+            now = self._clock()
+            bucket = self._refreshed(key, now)
+            wait = self._wait(
+                self.capacity if bucket is None else bucket[0], amount
+            )
+            if wait == 0:
+                self._take(key, now, amount)
+            return wait
+
+    def refund(self, key: str, amount: float = 1.0) -> None:
+        """Give back tokens taken by ``acquire``."""
+        with self._lock:
+            bucket = self._refreshed(key, self._clock())
+            if bucket is not None:
+                bucket[0] = min(self.capacity, bucket[0] + amount)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class LoginThrottle:
+    """Rejects login attempts before the bcrypt check once a client or an
+    account has exhausted its budget of failed attempts.
+
+    Every attempt takes a token from both buckets before the check and a
+    successful one gives them back, so concurrent attempts cannot all get
+    through on the same remaining token.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.by_email = TokenBucketLimiter(capacity=5, refill_rate=1 / 60)
+        self.by_ip = TokenBucketLimiter(capacity=20, refill_rate=1 / 15)
+        self.trust_proxy = False
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def init_app(self, app) -> None:
+        config = app.config
+        self.enabled = config.get("LOGIN_THROTTLE_ENABLED", True)
+        self.trust_proxy = config.get("LOGIN_THROTTLE_TRUST_PROXY", False)
+        self.by_email = TokenBucketLimiter(
+            capacity=config.get("LOGIN_THROTTLE_EMAIL_CAPACITY", 5),
+            refill_rate=config.get("LOGIN_THROTTLE_EMAIL_REFILL", 1 / 60),
+            max_buckets=config.get("LOGIN_THROTTLE_MAX_BUCKETS", 10_000),
+        )
+        self.by_ip = TokenBucketLimiter(
+            capacity=config.get("LOGIN_THROTTLE_IP_CAPACITY", 20),
+            refill_rate=config.get("LOGIN_THROTTLE_IP_REFILL", 1 / 15),
+            max_buckets=config.get("LOGIN_THROTTLE_MAX_BUCKETS", 10_000),
+        )
+        self.reset_stats()
+
+    def client_address(self, request) -> str:
+        if self.trust_proxy:
+            forwarded = request.headers.get("X-Real-IP")
+            if forwarded:
+                return forwarded.strip()
+        return request.remote_addr or "unknown"
+
+    def check(self, email: str, address: str) -> float:
+        """Take the attempt's tokens and return 0 if it may proceed, or
+        return the number of seconds the client should wait before
+        retrying, taking nothing."""
+        if not self.enabled:
+            return 0.0
+
+        email = email.lower()
+        with self._lock:
+            # The address goes first: a client spraying emails is stopped
+            # there, before its email buckets evict the drained ones
+            wait = self.by_ip.acquire(address)
+            if wait == 0:
+                wait = self.by_email.acquire(email)
+                if wait > 0:
+                    self.by_ip.refund(address)
+        with self._stats_lock:
+            self.attempts += 1
+            if wait > 0:
+                self.rejected += 1
+        return wait
+
+    def record_success(self, email: str, address: str) -> None:
+        """Give back the tokens of an attempt that logged in."""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self.by_email.refund(email.lower())
+            self.by_ip.refund(address)
+
+    def record_hash(self, seconds: float) -> None:
+        with self._stats_lock:
+            self.hash_checks += 1
+            self.hash_seconds += seconds
+
+    def reset(self) -> None:
+        self.by_email.clear()
+        self.by_ip.clear()
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self.attempts = 0
+            self.rejected = 0
+            self.hash_checks = 0
+            self.hash_seconds = 0.0
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            average_hash = (
+                self.hash_seconds / self.hash_checks
+                if self.hash_checks
+                else 0.0
+            )
+            return {
+                "attempts": self.attempts,
+                "rejected": self.rejected,
+                "hash_checks_saved": self.rejected,
+                "hash_seconds_saved": round(self.rejected * average_hash, 6),
+                "tracked_emails": len(self.by_email),
+                "tracked_addresses": len(self.by_ip),
+            }
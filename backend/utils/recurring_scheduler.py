@@ -0,0 +1,68 @@
+import threading
+
+from backend.services.recurring import run_recurring
+from backend.utils import tricount_storage
+from backend.utils.tricount_store import TricountStore
+
+
+class RecurringScheduler:
+    """Materializes due recurring expenses in a background thread every
+    ``interval`` seconds (disabled when 0).
+
+    Every worker starts one, but only the process holding the lock on
+    ``tricount_storage.scheduler_lock_file()`` runs the passes. The others
+    try to take it at each interval, so one of them takes over when that
+    process exits.
+    """
+
+    def __init__(self, store: TricountStore, interval: float = 0.0):
+        self.store = store
+        self.interval = interval
+        self.logger = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock_file = None
+
+    def init_app(self, app) -> None:
+        self.interval = app.config.get("RECURRING_INTERVAL", 0.0)
+        self.logger = app.logger
+        self.start()
+
+    def start(self) -> None:
+        if self._thread is not None or self.interval <= 0:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="recurring-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        thread = self._thread
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+            self._thread = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _lead(self) -> bool:
+        """Whether this process runs the passes, taking the lock if free."""
+        if self._lock_file is None:
+            self._lock_file = tricount_storage.try_file_lock(
+                tricount_storage.scheduler_lock_file()
+            )
+        return self._lock_file is not None
+
+    def _run(self) -> None:
+        while True:
+            try:
+                if self._lead():
+                    run_recurring(self.store)
+            except Exception:
+                if self.logger is not None:
+                    self.logger.exception("Recurring expenses pass failed")
+            if self._stop.wait(self.interval):
+                return
@@ -0,0 +1,344 @@
+import marshal
+import os
+import sys
+import tempfile
+import threading
+from array import array
+from datetime import date
+from pathlib import Path
+from typing import Iterable
+
+from backend.models.currency import Currency
+from backend.models.expense import intern_id
+from backend.models.expense_table import ExpenseTable
+from backend.models.recurring_expense import RecurringExpense
+from backend.models.tricount import Tricount
+from backend.models.tricount_header import TricountHeader
+from backend.models.user import User
+from backend.utils import tricount_storage
+from backend.utils.metrics import timed
+
+MAGIC = b"3CSNAP\x07\n"
+TRAILER_SIZE = 16
+CURRENCIES = {currency.value: currency for currency in Currency}
+
+# Records hold raw array buffers: only reuse them on a matching machine
+PLATFORM = (
+    sys.byteorder,
+    marshal.version,
+    tuple(array(code).itemsize for code in "Bidq"),
+)
+
+
+def snapshot_file() -> Path:
+    data_file = tricount_storage.DATA_FILE
+    return data_file.with_name(f"{data_file.stem}.snapshot")
+
+
+def tricount_to_record(tricount: Tricount) -> bytes:
+    table = tricount.expense_table
+    return marshal.dumps(
+        (
+            tricount.id,
+            tricount.owner_email,
+            tricount.name,
+            tricount.currency.value,
+            tricount.version,
+            [(u.id, u.name, u.email) for u in tricount.users],
+            table.user_ids,
+            table.ids,
+            table.descriptions,
+            table.amounts.tobytes(),
+            table.currencies.tobytes(),
+            table.payers.tobytes(),
+            table.part_offsets.tobytes(),
+            table.part_index.tobytes(),
+            table.weight_offsets.tobytes(),
+            table.weight_index.tobytes(),
+            table.weight_values.tobytes(),
+            table.days.tobytes(),
+            [
+                (
+                    r.id,
+                    r.description,
+                    r.amount,
+                    r.payer_id,
+                    r.participants_ids,
+                    r.weights,
+                    r.period,
+                    r.start_date.toordinal(),
+                    r.next_date.toordinal(),
+                    r.end_date.toordinal() if r.end_date else 0,
+                )
+                for r in tricount.recurring
+            ],
+        )
+    )
+
+
+def _array(code: str, data: bytes) -> array:
+    values = array(code)
+    values.frombytes(data)
+    return values
+
+
+def tricount_from_record(record: bytes) -> Tricount:
+    (
+        tricount_id,
+        owner_email,
+        name,
+        currency,
+        version,
+        users,
+        user_ids,
+        ids,
+        descriptions,
+        amounts,
+        currencies,
+        payers,
+        part_offsets,
+        part_index,
+        weight_offsets,
+        weight_index,
+        weight_values,
+        days,
+        recurring,
+    ) = marshal.loads(record)
+
+    table = ExpenseTable()
+    table.user_ids = [intern_id(uid) for uid in user_ids]
+    table.user_index = {uid: i for i, uid in enumerate(table.user_ids)}
+    table.ids = ids
+    table.descriptions = descriptions
+    table.amounts = _array("d", amounts)
+    table.currencies = _array("B", currencies)
+    table.payers = _array("i", payers)
+    table.part_offsets = _array("q", part_offsets)
+    table.part_index = _array("i", part_index)
+    table.weight_offsets = _array("q", weight_offsets)
+    table.weight_index = _array("i", weight_index)
+    table.weight_values = _array("d", weight_values)
+    table.days = _array("i", days)
+
+    return Tricount(
+        id=tricount_id,
+        owner_email=owner_email,
+        name=name,
+        currency=Currency(currency),
+        version=version,
+        users=[
+            User(id=intern_id(uid), name=user_name, email=email)
+            for uid, user_name, email in users
+        ],
+        expense_table=table,
+        recurring=[
+            RecurringExpense(
+                id=recurring_id,
+                description=description,
+                amount=amount,
+                payer_id=intern_id(payer_id),
+                participants_ids=tuple(map(intern_id, participants_ids)),
+                weights=weights,
+                period=period,
+                start_date=date.fromordinal(start),
+                next_date=date.fromordinal(next_day),
+                end_date=date.fromordinal(end) if end else None,
+            )
+            for (
+                recurring_id,
+                description,
+                amount,
+                payer_id,
+                participants_ids,
+                weights,
+                period,
+                start,
+                next_day,
+                end,
+            ) in recurring
+        ],
+    )
+
+
+@timed("snapshot_save")
+def save_snapshot(
+    data: tuple,
+    checksum: int,
+    index: tuple | None,
+    entries: Iterable[
+        tuple[TricountHeader, tricount_storage.Span | None, bytes | None]
+    ],
+) -> None:
+    """Write a snapshot of the DATA_FILE with the given stamp and checksum
+    (and of the index describing it): the records of every tricount, then a
+    head holding their headers, spans and record positions column by
+    column, then a trailer pointing at the head. Archived tricounts only
+    have a header, their span and record are stored as (-1, 0)."""
+    path = snapshot_file()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            position = f.write(MAGIC)
+            columns = [[] for _ in range(13)]
+            spans = array("q")
+            records = array("q")
+            for header, span, record in entries:
+                for column, value in zip(
+                    columns,
+                    (
+                        header.id,
+                        header.name,
+                        header.currency.value,
+                        header.owner_email,
+                        tuple(header.emails),
+                        header.users_count,
+                        header.expenses_count,
+                        header.version,
+                        header.next_due,
+                        header.archived,
+                        header.total,
+                        header.balances,
+                        header.stats,
+                    ),
+                ):
+                    column.append(value)
+                spans.extend(span or (-1, 0))
+                if record is None:
+                    records.extend((-1, 0))
+                else:
+                    records.extend((position, len(record)))
+                    position += f.write(record)
+
+            head = marshal.dumps(
+                {
+                    "platform": PLATFORM,
+                    "data": data,
+                    "checksum": checksum,
+                    "index": index,
+                    "columns": columns,
+                    "spans": spans.tobytes(),
+                    "records": records.tobytes(),
+                }
+            )
+            f.write(head)
+            f.write(position.to_bytes(8, "big"))
+            f.write(len(head).to_bytes(8, "big"))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _pairs(data: bytes) -> list[tuple[int, int]]:
+    values = iter(_array("q", data).tolist())
+    return list(zip(values, values))
+
+
+class Snapshot:
+    """An open snapshot file. The file handle is kept so that records stay
+    readable after another process replaces the snapshot."""
+
+    def __init__(self, f, head: dict):
+        self.data = head["data"]
+        self.checksum = head["checksum"]
+        self.index = head["index"]
+        self._columns = head["columns"]
+        self._spans = _pairs(head["spans"])
+
+        ids, versions = self._columns[0], self._columns[7]
+        self._records = dict(zip(ids, zip(versions, _pairs(head["records"]))))
+        self._file = f
+        self._lock = threading.Lock()
+
+    @classmethod
+    @timed("snapshot_load")
+    def open(cls) -> "Snapshot | None":
+        try:
+            f = snapshot_file().open("rb")
+        except FileNotFoundError:
+            return None
+
+        try:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError("not a snapshot")
+            f.seek(-TRAILER_SIZE, os.SEEK_END)
+            trailer = f.read(TRAILER_SIZE)
+            f.seek(int.from_bytes(trailer[:8], "big"))
+            head = marshal.loads(f.read(int.from_bytes(trailer[8:], "big")))
+            if head["platform"] != PLATFORM:
+                raise ValueError("snapshot written on another platform")
+            return cls(f, head)
+        except (OSError, ValueError, EOFError, KeyError, TypeError):
+            f.close()
+            return None
+
+    def close(self) -> None:
+        self._file.close()
+
+    def take_entries(
+        self,
+    ) -> list[tuple[TricountHeader, tricount_storage.Span | None]]:
+        """Headers and spans of the snapshot, handed over once."""
+        columns, self._columns = self._columns, [[]] * 13
+        spans, self._spans = self._spans, []
+        return [
+            (
+                TricountHeader(
+                    id,
+                    name,
+                    CURRENCIES[currency],
+                    owner_email,
+                    frozenset(emails),
+                    users_count,
+                    expenses_count,
+                    version,
+                    next_due,
+                    archived,
+                    total,
+                    balances,
+                    stats,
+                ),
+                span if span[0] >= 0 else None,
+            )
+            for (
+                id,
+                name,
+                currency,
+                owner_email,
+                emails,
+                users_count,
+                expenses_count,
+                version,
+                next_due,
+                archived,
+                total,
+                balances,
+                stats,
+            ), span in zip(zip(*columns), spans)
+        ]
+
+    def describes_data(self) -> bool:
+        """Whether the snapshot was taken from the current DATA_FILE, judged
+        from its stamp (inode, mtime, size) and then its checksum."""
+        return (
+            self.data == tricount_storage.data_stamp()
+            and self.checksum == tricount_storage.fresh_checksum()
+        )
+
+    def record(self, tricount_id: str, version: int) -> bytes | None:
+        version_and_position = self._records.get(tricount_id)
+        if version_and_position is None:
+            return None
+        record_version, (start, length) = version_and_position
+        if record_version != version or start < 0:
+            return None
+        with self._lock:
+            self._file.seek(start)
+            return self._file.read(length)
+
+    def read(self, tricount_id: str, version: int) -> Tricount | None:
+        record = self.record(tricount_id, version)
+        if record is None:
+            return None
+        return tricount_from_record(record)
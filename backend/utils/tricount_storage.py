@@ -1,26 +1,475 @@
+import codecs
+import gzip
 import json
+import os
+import re
+import tempfile
+import zlib
+from contextlib import ExitStack, contextmanager
 from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
 
 from backend.models.tricount import Tricount
-from backend.utils.utils import tricount_from_dict, tricount_to_dict
+from backend.models.tricount_header import TricountHeader
+from backend.utils.metrics import timed
+from backend.utils.utils import (
+    header_from_dict,
+    header_from_tricount,
+    header_to_dict,
+    tricount_from_dict,
+    tricount_to_dict,
+)
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
 
 DATA_FILE = Path("data/tricounts.json")
+SCAN_CHUNK_SIZE = 1 << 20
+
+# Format written by saves, reads detect it: "json" is the indented array,
+# "compact" drops the indentation, "deflate" stores each tricount as its own
+# zlib frame so that it can still be read or copied alone
+FORMATS = ("json", "compact", "deflate")
+FORMAT = "json"
+COMPRESSION_LEVEL = 1
+FRAMED_MAGIC = b"3CDEFL\x01\n"
+
+# (offset, length) of one encoded tricount inside DATA_FILE, in bytes
+Span = tuple[int, int]
+
+
+class TricountIndex(NamedTuple):
+    data: tuple | None  # stamp of the DATA_FILE it describes
+    checksum: int | None  # CRC-32 of that DATA_FILE
+    entries: list[tuple[TricountHeader, Span | None]]  # None when archived
+
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r"[ \t\n\r]*")
+
+
+def index_file() -> Path:
+    return DATA_FILE.with_name(f"{DATA_FILE.stem}.index.json")
+
+
+def lock_file() -> Path:
+    return DATA_FILE.with_name(f"{DATA_FILE.stem}.lock")
+
+
+def archive_dir() -> Path:
+    return DATA_FILE.with_name(f"{DATA_FILE.stem}.archive")
+
+
+def archive_file(tricount_id: str) -> Path:
+    return archive_dir() / f"{tricount_id}.json.gz"
+
+
+def idempotency_dir() -> Path:
+    return DATA_FILE.with_name(f"{DATA_FILE.stem}.idempotency")
+
+
+@contextmanager
+def file_lock(path: Path | None = None):
+    """Exclusive inter-process lock serializing writers of DATA_FILE, or of
+    whatever ``path`` guards."""
+    path = path or lock_file()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def scheduler_lock_file() -> Path:
+    return DATA_FILE.with_name(f"{DATA_FILE.stem}.scheduler.lock")
+
+
+def try_file_lock(path: Path):
+    """Open ``path`` and take an exclusive lock on it without waiting.
+    Returns the open file, which holds the lock until closed, or None when
+    another process (or file object) already holds it."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    f = path.open("a")
+    if fcntl is not None:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return None
+    return f
+
+
+def _sync_dir(path: Path) -> None:
+    # Makes a rename inside ``path`` durable; directories cannot be opened
+    # for that on Windows
+    if os.name != "posix":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def _atomic_open(path: Path, mode: str = "w"):
+    # Readers in other processes never see a half-written file, and the
+    # new content is on disk once this returns
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    encoding = None if "b" in mode else "utf-8"
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    _sync_dir(path.parent)
+
+
+@timed("storage_encode")
+def encode_tricount(tricount: Tricount) -> str:
+    if FORMAT == "json":
+        return json.dumps(
+            tricount_to_dict(tricount=tricount), indent=2, ensure_ascii=False
+        )
+    return json.dumps(
+        tricount_to_dict(tricount=tricount),
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+
+
+def _decompress(segment: bytes) -> bytes:
+    try:
+        return zlib.decompress(segment)
+    except zlib.error as e:
+        raise ValueError(f"corrupt tricount frame: {e}") from None
+
+
+def _convert_segment(segment: bytes, framed: bool) -> bytes:
+    # Encoded tricounts are JSON objects, anything else is a zlib frame
+    compressed = segment[:1] != b"{"
+    if framed and not compressed:
+        return zlib.compress(segment, COMPRESSION_LEVEL)
+    if compressed and not framed:
+        return _decompress(segment)
+    return segment
+
+
+@timed("storage_save")
+def save_encoded_tricounts(
+    segments: Iterable[str | bytes | Span],
+) -> tuple[list[Span], int]:
+    """Write the tricounts in FORMAT: a JSON array, or length-prefixed
+    zlib frames ending with an empty one. A span instead of an encoded
+    segment copies that unchanged tricount from the current file, converted
+    when that file was written in another format. Returns the span of
+    every tricount in the new file and the checksum of the file."""
+    framed = FORMAT == "deflate"
+    start, end = (FRAMED_MAGIC, bytes(4)) if framed else (b"[", b"\n]")
+    spans = []
+    with ExitStack() as stack, _atomic_open(DATA_FILE, "wb") as f:
+        source = None
+        checksum = zlib.crc32(start)
+        position = f.write(start)
+        for i, segment in enumerate(segments):
+            if isinstance(segment, tuple):
+                if source is None:
+                    source = stack.enter_context(DATA_FILE.open("rb"))
+                source.seek(segment[0])
+                segment = source.read(segment[1])
+            elif isinstance(segment, str):
+                segment = segment.encode("utf-8")
+            segment = _convert_segment(segment, framed)
+            if framed:
+                separator = len(segment).to_bytes(4, "big")
+            else:
+                separator = b",\n" if i else b"\n"
+            checksum = zlib.crc32(segment, zlib.crc32(separator, checksum))
+            position += f.write(separator)
+            spans.append((position, len(segment)))
+            position += f.write(segment)
+        checksum = zlib.crc32(end, checksum)
+        f.write(end)
+    return spans, checksum
 
 
 def save_tricounts(tricounts: list[Tricount]) -> None:
-    DATA_FILE.parent.mkdir(parents=True, exist_ok=True)
-    data = [tricount_to_dict(tricount=tricount) for tricount in tricounts]
-    with DATA_FILE.open("w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    spans, checksum = save_encoded_tricounts(
+        encode_tricount(tricount=tricount) for tricount in tricounts
+    )
+    save_index(
+        (
+            (header_from_tricount(tricount), span)
+            for tricount, span in zip(tricounts, spans)
+        ),
+        checksum=checksum,
+    )
 
 
-def load_tricounts() -> list[Tricount]:
-    if not DATA_FILE.exists() or DATA_FILE.stat().st_size == 0:
+def _byte_length(text: str) -> int:
+    return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+
+def scan_tricounts(
+    chunk_size: int = SCAN_CHUNK_SIZE, path: Path | None = None
+) -> Iterator[tuple[dict, Span]]:
+    """Parse DATA_FILE (or ``path``) one tricount at a time, with the span
+    of each one so that it can later be read back alone. The file is read
+    in chunks, so memory stays bounded by the largest tricount rather than
+    by the file. Raises ValueError when the file is neither a JSON array
+    nor framed."""
+    try:
+        f = (path or DATA_FILE).open("rb")
+    except FileNotFoundError:
+        return
+
+    with f:
+        if f.read(len(FRAMED_MAGIC)) == FRAMED_MAGIC:
+            yield from _scan_frames(f)
+            return
+        f.seek(0)
+
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        # Unparsed text, position in it and matching byte offset in the file
+        text, pos, offset, eof = "", 0, 0, False
+
+        def read_more(size: int) -> None:
+            nonlocal text, pos, eof
+            chunk = f.read(size)
+            eof = not chunk
+            text = text[pos:] + decoder.decode(chunk, final=eof)
+            pos = 0
+
+        def advance(end: int) -> None:
+            nonlocal pos, offset
+            offset += _byte_length(text[pos:end])
+            pos = end
+
+        def skip_whitespace() -> None:
+            while True:
+                advance(_whitespace.match(text, pos).end())
+                if pos < len(text) or eof:
+                    return
+                read_more(chunk_size)
+
+        skip_whitespace()
+        if pos == len(text):
+            return
+        if text[pos] != "[":
+            raise json.JSONDecodeError("Expecting '['", text, pos)
+        advance(pos + 1)
+        skip_whitespace()
+        if text[pos : pos + 1] == "]":
+            return
+
+        while True:
+            # A tricount cut by the end of the buffer fails to parse: read
+            # at least as much again, so that large ones cost linear time
+            while True:
+                try:
+                    data, end = _decoder.raw_decode(text, pos)
+                    if end < len(text) or eof:
+                        break
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                read_more(max(chunk_size, len(text) - pos))
+            start = offset
+            advance(end)
+            yield data, (start, offset - start)
+
+            skip_whitespace()
+            if text[pos : pos + 1] == ",":
+                advance(pos + 1)
+                skip_whitespace()
+            elif text[pos : pos + 1] == "]":
+                return
+            else:
+                raise json.JSONDecodeError(
+                    "Expecting ',' delimiter", text, pos
+                )
+
+
+def _scan_frames(f) -> Iterator[tuple[dict, Span]]:
+    position = len(FRAMED_MAGIC)
+    while True:
+        header = f.read(4)
+        if len(header) < 4:
+            raise ValueError("truncated tricounts file")
+        length = int.from_bytes(header, "big")
+        if length == 0:
+            return
+        frame = f.read(length)
+        if len(frame) < length:
+            raise ValueError("truncated tricounts file")
+        yield json.loads(_decompress(frame)), (position + 4, length)
+        position += 4 + length
+
+
+def read_encoded_segment(span: Span) -> bytes:
+    """The JSON text of the tricount at ``span``, decompressed if needed."""
+    with DATA_FILE.open("rb") as f:
+        f.seek(span[0])
+        segment = f.read(span[1])
+    if segment[:1] != b"{":
+        return _decompress(segment)
+    return segment
+
+
+def read_tricount_segment(span: Span) -> dict:
+    return json.loads(read_encoded_segment(span))
+
+
+@timed("storage_load")
+def load_raw_tricounts() -> list[dict]:
+    try:
+        return [data for data, _ in scan_tricounts()]
+    except ValueError:
         return []
 
+
+@timed("storage_load")
+def load_tricounts() -> list[Tricount]:
+    # Each raw dict is dropped as soon as it is converted
     try:
-        with DATA_FILE.open("r", encoding="utf-8") as f:
-            raw = json.load(f)
-    except json.JSONDecodeError:
+        return [tricount_from_dict(data=data) for data, _ in scan_tricounts()]
+    except ValueError:
         return []
-    return [tricount_from_dict(data=data) for data in raw]
+
+
+def save_archived(tricount: Tricount) -> None:
+    """Write ``tricount`` alone, gzipped, outside of DATA_FILE."""
+    encoded = json.dumps(
+        tricount_to_dict(tricount=tricount),
+        separators=(",", ":"),
+        ensure_ascii=False,
+    ).encode("utf-8")
+    with _atomic_open(archive_file(tricount.id), "wb") as f:
+        f.write(gzip.compress(encoded, compresslevel=COMPRESSION_LEVEL))
+
+
+def read_archived(tricount_id: str) -> bytes:
+    """JSON text of an archived tricount."""
+    try:
+        return gzip.decompress(archive_file(tricount_id).read_bytes())
+    except (EOFError, zlib.error) as e:
+        raise ValueError(f"corrupt archived tricount: {e}") from None
+
+
+def delete_archived(tricount_id: str) -> None:
+    archive_file(tricount_id).unlink(missing_ok=True)
+
+
+def scan_archived() -> Iterator[dict]:
+    """Every archived tricount, for rebuilding the index. Unreadable files
+    are skipped."""
+    if not archive_dir().is_dir():
+        return
+    for path in sorted(archive_dir().glob("*.json.gz")):
+        try:
+            yield json.loads(gzip.decompress(path.read_bytes()))
+        except (OSError, EOFError, ValueError, zlib.error):
+            continue
+
+
+def save_index(
+    entries: Iterable[tuple[TricountHeader, Span | None]],
+    checksum: int | None = None,
+) -> None:
+    """The index lists the header and span of every tricount, in file
+    order, one per line. It is written after DATA_FILE and starts with a
+    line recording the stamp (and, when known, the checksum) of the
+    DATA_FILE it describes."""
+    with _atomic_open(index_file()) as f:
+        f.write(json.dumps({"data": data_stamp(), "checksum": checksum}))
+        for header, span in entries:
+            f.write("\n")
+            f.write(
+                json.dumps(
+                    {
+                        **header_to_dict(header),
+                        "span": list(span) if span else None,
+                    },
+                    ensure_ascii=False,
+                )
+            )
+        f.write("\n")
+
+
+def _read_index_meta(f) -> tuple[tuple | None, int | None]:
+    meta = json.loads(f.readline())
+    data = meta["data"]
+    return (tuple(data) if data is not None else None), meta["checksum"]
+
+
+def load_index(require_fresh: bool = False) -> TricountIndex | None:
+    """With ``require_fresh``, only return an index describing the current
+    DATA_FILE, which can then be trusted without reading DATA_FILE."""
+    try:
+        with index_file().open("r", encoding="utf-8") as f:
+            data, checksum = _read_index_meta(f)
+            if require_fresh and (data is None or data != data_stamp()):
+                return None
+            entries = []
+            for line in f:
+                entry = json.loads(line)
+                span = entry["span"]
+                entries.append(
+                    (header_from_dict(entry), tuple(span) if span else None)
+                )
+        return TricountIndex(data=data, checksum=checksum, entries=entries)
+    except (FileNotFoundError, ValueError, KeyError, TypeError):
+        return None
+
+
+def fresh_checksum() -> int | None:
+    """Checksum of DATA_FILE as recorded when it was written, read from the
+    first line of the index only, or computed when the index is stale."""
+    try:
+        with index_file().open("r", encoding="utf-8") as f:
+            data, checksum = _read_index_meta(f)
+        if data is not None and data == data_stamp() and checksum is not None:
+            return checksum
+    except (FileNotFoundError, ValueError, KeyError, TypeError):
+        pass
+    return data_checksum()
+
+
+def data_checksum() -> int | None:
+    """CRC-32 of DATA_FILE, the value recorded by save_encoded_tricounts."""
+    try:
+        with DATA_FILE.open("rb") as f:
+            checksum = 0
+            while chunk := f.read(1 << 20):
+                checksum = zlib.crc32(chunk, checksum)
+            return checksum
+    except FileNotFoundError:
+        return None
+
+
+def _stamp(path: Path) -> tuple | None:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def data_stamp() -> tuple | None:
+    return _stamp(DATA_FILE)
+
+
+def index_stamp() -> tuple | None:
+    """Cheap change detector for the index, compared before serving."""
+    return _stamp(index_file())
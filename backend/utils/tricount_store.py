@@ -0,0 +1,806 @@
+import atexit
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from dataclasses import replace
+from typing import Callable, Iterable, Iterator
+
+from backend.models.tricount import Tricount
+from backend.models.tricount_header import TricountHeader
+from backend.utils import tricount_storage
+from backend.utils.locks import RWLock
+from backend.utils.metrics import metrics
+from backend.utils.tricount_snapshot import (
+    Snapshot,
+    save_snapshot,
+    tricount_to_record,
+)
+from backend.utils.utils import (
+    header_from_tricount,
+    header_from_tricount_dict,
+    tricount_from_dict,
+)
+
+
+class TricountStore:
+    """Thread-safe, process-wide registry of tricounts.
+
+    Every tricount has a lightweight header (name, owner, member emails,
+    counts) kept in memory, which is enough for listings and permission
+    checks. Full tricounts are only loaded on access and kept in an LRU
+    cache bounded by ``cache_size`` tricounts and, optionally,
+    ``cache_bytes`` (estimated from their encoded size). Evicted tricounts
+    are read back from their span in the data file, or from their pending
+    encoded segment when the latest change is not saved yet.
+
+    Archived tricounts only keep their header in memory (flagged
+    ``archived``, without a span): their data lives gzipped in the archive
+    directory, so saves never copy them. Reads load them from there like
+    any evicted tricount, and committing a change moves them back into the
+    data file, their archive being deleted once that save is done.
+
+    Each tricount has its own readers-writer lock so that requests on
+    independent groups run concurrently. The registry lock only guards the
+    headers, spans and cache bookkeeping and is never held while a tricount
+    lock is being waited on.
+
+    ``commit`` encodes the tricount while the caller still holds its write
+    lock; saving writes these pending segments and copies every other
+    tricount unchanged from the current file, so it never needs to lock,
+    load or re-serialize other groups.
+
+    In multi-process mode (several gunicorn workers sharing the data
+    volume), every write holds an exclusive file lock from the moment it
+    re-reads the index until the file is saved, and each tricount carries
+    a version stamp so that a worker only evicts the tricounts other
+    workers have changed since it last looked. Writers of one worker take
+    turns under that lock: while others are queued, the file lock is
+    handed over to them unsaved, and the last one saves every change at
+    once (or the one reaching ``flush_max_changes``), so the threads of a
+    worker share one write instead of rewriting the file each.
+
+    With a positive ``flush_interval`` (single-process mode only), commits
+    only mark the store dirty and a background writer saves the file every
+    ``flush_interval`` seconds or ``flush_max_changes`` commits, so bursts
+    of mutations share one write. In durable mode a request returns only
+    once the group commit containing its change has reached the disk, and
+    fails if that save does; the change stays pending and the writer tries
+    again.
+    """
+
+    def __init__(
+        self,
+        multiprocess: bool = False,
+        flush_interval: float = 0.0,
+        flush_max_changes: int = 100,
+        durable: bool = True,
+        cache_size: int = 1000,
+        cache_bytes: int = 0,
+        snapshot: bool = False,
+    ):
+        self.multiprocess = multiprocess
+        self.flush_interval = flush_interval
+        self.flush_max_changes = flush_max_changes
+        self.durable = durable
+        self.cache_size = cache_size
+        self.cache_bytes = cache_bytes
+        self.snapshot = snapshot
+        self._registry_lock = threading.Lock()
+        self._persist_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._process_lock = threading.Lock()
+        # File lock kept by this worker across writers, and how many of
+        # them are waiting for their turn
+        self._file_lock: ExitStack | None = None
+        self._queued = 0
+        self._headers: dict[str, TricountHeader] = {}
+        self._spans: dict[str, tricount_storage.Span] = {}
+        self._pending: dict[str, str] = {}
+        # Archives to delete once the data file no longer needs them
+        self._stale_archives: set[str] = set()
+        self._resident: OrderedDict[str, Tricount] = OrderedDict()
+        self._sizes: dict[str, int] = {}
+        self._resident_bytes = 0
+        self._locks: dict[str, RWLock] = {}
+        self._index_stamp = None
+        self._snapshot: Snapshot | None = None
+
+        self._flush_cond = threading.Condition()
+        self._generation = 0
+        self._flushed = 0
+        # Latest generation whose save failed, and why
+        self._failed = 0
+        self._flush_error: Exception | None = None
+        self._writer: threading.Thread | None = None
+        self._closing = False
+        self._local = threading.local()
+
+    def init_app(self, app) -> None:
+        config = app.config
+        self.multiprocess = config.get("TRICOUNT_MULTIPROCESS", False)
+        self.flush_interval = config.get("TRICOUNT_FLUSH_INTERVAL", 0.0)
+        self.flush_max_changes = config.get("TRICOUNT_FLUSH_MAX_CHANGES", 100)
+        self.durable = config.get("TRICOUNT_DURABLE", True)
+        self.cache_size = config.get("TRICOUNT_CACHE_SIZE", 1000)
+        self.cache_bytes = config.get("TRICOUNT_CACHE_BYTES", 0)
+        self.snapshot = config.get("TRICOUNT_SNAPSHOT", False)
+        self.load()
+        self.start()
+
+    def load(self) -> None:
+        """Read the header and span of every tricount from the snapshot or
+        the index, or from a scan of the data file when neither describes
+        it. Tricounts themselves are only built on first access."""
+        with self._locked():
+            snapshot = self._open_snapshot()
+            index = None
+            if snapshot is None:
+                index = tricount_storage.load_index(require_fresh=True)
+
+            if snapshot is not None:
+                entries = snapshot.take_entries()
+                if snapshot.index != tricount_storage.index_stamp():
+                    tricount_storage.save_index(
+                        entries, checksum=snapshot.checksum
+                    )
+            elif index is not None:
+                entries = index.entries
+            else:
+                entries = self._scan_entries()
+                if entries:
+                    tricount_storage.save_index(
+                        entries, checksum=tricount_storage.data_checksum()
+                    )
+
+            with self._registry_lock:
+                self._clear()
+                for header, span in entries:
+                    self._headers[header.id] = header
+                    if span is not None:
+                        self._spans[header.id] = span
+                self._replace_snapshot(snapshot)
+            self._index_stamp = tricount_storage.index_stamp()
+
+    def _open_snapshot(self) -> Snapshot | None:
+        if not self.snapshot:
+            return None
+        snapshot = Snapshot.open()
+        if snapshot is not None and not snapshot.describes_data():
+            snapshot.close()
+            return None
+        return snapshot
+
+    def _replace_snapshot(self, snapshot: Snapshot | None) -> None:
+        # Readers holding the old one fall back to the data file
+        if self._snapshot is not None:
+            self._snapshot.close()
+        self._snapshot = snapshot
+
+    def _scan_entries(self) -> list:
+        entries = []
+        try:
+            for data, span in tricount_storage.scan_tricounts():
+                entries.append((header_from_tricount_dict(data), span))
+        except ValueError:
+            return []
+
+        # An archive can outlive the save that moved its tricount back
+        hot = {header.id for header, _ in entries}
+        for data in tricount_storage.scan_archived():
+            if data.get("id") not in hot:
+                header = header_from_tricount_dict(data)
+                entries.append((replace(header, archived=True), None))
+        return entries
+
+    def reset(self, tricounts: list[Tricount] = ()) -> None:
+        with self._registry_lock:
+            self._clear()
+            for tricount in tricounts:
+                encoded = tricount_storage.encode_tricount(tricount=tricount)
+                self._headers[tricount.id] = header_from_tricount(tricount)
+                self._pending[tricount.id] = encoded
+                self._admit(tricount, len(encoded))
+            self._replace_snapshot(None)
+            self._index_stamp = None
+
+    def _clear(self) -> None:
+        self._headers = {}
+        self._spans = {}
+        self._pending = {}
+        self._stale_archives = set()
+        self._resident = OrderedDict()
+        self._sizes = {}
+        self._resident_bytes = 0
+        self._locks = {}
+
+    def _admit(self, tricount: Tricount, size: int) -> None:
+        """Make ``tricount`` the most recently used one and evict the least
+        recently used ones over budget. Needs the registry lock."""
+        self._evict(tricount.id)
+        self._resident[tricount.id] = tricount
+        self._sizes[tricount.id] = size
+        self._resident_bytes += size
+
+        while len(self._resident) > 1 and (
+            (self.cache_size and len(self._resident) > self.cache_size)
+            or (self.cache_bytes and self._resident_bytes > self.cache_bytes)
+        ):
+            self._evict(next(iter(self._resident)))
+
+    def _evict(self, tricount_id: str) -> None:
+        if self._resident.pop(tricount_id, None) is not None:
+            self._resident_bytes -= self._sizes.pop(tricount_id)
+
+    def refresh(self) -> None:
+        """Pick up the changes saved by other processes, if any."""
+        stamp = tricount_storage.index_stamp()
+        if stamp is None or stamp == self._index_stamp:
+            return
+
+        with self._refresh_lock:
+            stamp = tricount_storage.index_stamp()
+            if stamp is None or stamp == self._index_stamp:
+                return
+
+            index = tricount_storage.load_index()
+            if index is None:
+                return
+            entries = index.entries
+            self._index_stamp = stamp
+
+            headers = {header.id: header for header, _ in entries}
+            with self._registry_lock:
+                # Changed tricounts are reloaded from the file on access
+                for tricount_id, header in self._headers.items():
+                    fresh = headers.get(tricount_id)
+                    if fresh is None or fresh.version != header.version:
+                        self._evict(tricount_id)
+                        self._pending.pop(tricount_id, None)
+                for tricount_id in self._locks.keys() - headers.keys():
+                    del self._locks[tricount_id]
+                self._headers = headers
+                self._spans = {
+                    header.id: span
+                    for header, span in entries
+                    if span is not None
+                }
+
+    @contextmanager
+    def _locked(self):
+        # Reentrant so that a batch can hold the file lock around writes
+        if not self.multiprocess or getattr(self._local, "locked", False):
+            yield
+            return
+
+        with self._flush_cond:
+            self._queued += 1
+        with self._process_lock:
+            with self._flush_cond:
+                self._queued -= 1
+            if self._file_lock is None:
+                stack = ExitStack()
+                stack.enter_context(tricount_storage.file_lock())
+                self._file_lock = stack
+            self._local.locked = True
+            try:
+                yield
+            finally:
+                self._local.locked = False
+                self._release_file_lock()
+
+    def _release_file_lock(self) -> None:
+        """Save the changes made under the file lock and release it, unless
+        more writers of this worker are queued: they then take it over and
+        the last one saves for everyone."""
+        with self._flush_cond:
+            if (
+                self._queued
+                and self._generation - self._flushed < self.flush_max_changes
+            ):
+                return
+        stack, self._file_lock = self._file_lock, None
+        with stack:
+            self.flush()
+
+    @contextmanager
+    def _exclusive(self):
+        with self._locked():
+            if self.multiprocess:
+                self.refresh()
+            yield
+
+    def header(self, tricount_id: str) -> TricountHeader | None:
+        if self.multiprocess:
+            self.refresh()
+        with self._registry_lock:
+            return self._headers.get(tricount_id)
+
+    def headers(
+        self, tricount_ids: Iterable[str] | None = None
+    ) -> list[TricountHeader]:
+        """Every header, or those of ``tricount_ids`` that exist (in that
+        order)."""
+        if self.multiprocess:
+            self.refresh()
+        with self._registry_lock:
+            if tricount_ids is None:
+                return list(self._headers.values())
+            return [
+                self._headers[tricount_id]
+                for tricount_id in tricount_ids
+                if tricount_id in self._headers
+            ]
+
+    def __len__(self) -> int:
+        return len(self._headers)
+
+    def cache_stats(self) -> dict:
+        with self._registry_lock:
+            return {
+                "tricounts": len(self._headers),
+                "resident": len(self._resident),
+                "resident_bytes": self._resident_bytes,
+                "pending": len(self._pending),
+                "archived": sum(h.archived for h in self._headers.values()),
+            }
+
+    def _lock_for(self, tricount_id: str) -> RWLock | None:
+        with self._registry_lock:
+            if tricount_id not in self._headers:
+                return None
+            lock = self._locks.get(tricount_id)
+            if lock is None:
+                lock = self._locks[tricount_id] = RWLock()
+            return lock
+
+    def _get(self, tricount_id: str) -> Tricount | None:
+        """Resident tricount, loaded first if evicted. Must be called while
+        holding its lock."""
+        with self._registry_lock:
+            tricount = self._resident.get(tricount_id)
+            if tricount is not None:
+                self._resident.move_to_end(tricount_id)
+            elif tricount_id not in self._headers:
+                # Deleted while we were waiting for its lock
+                return None
+        if tricount is not None:
+            metrics.inc("tricount_cache_lookups_total", result="hit")
+            return tricount
+
+        metrics.inc("tricount_cache_lookups_total", result="miss")
+        loaded = self._read_cold(tricount_id)
+        if loaded is None:
+            # The file was replaced after the span was looked up
+            if self.multiprocess:
+                self.refresh()
+                loaded = self._read_cold(tricount_id)
+            else:
+                with self._persist_lock:
+                    loaded = self._read_cold(tricount_id)
+        if loaded is None:
+            loaded = self._scan_cold(tricount_id)
+        if loaded is None:
+            return None
+
+        tricount, size = loaded
+        with self._registry_lock:
+            if tricount_id in self._headers:
+                self._admit(tricount, size)
+        return tricount
+
+    def _read_cold(self, tricount_id: str) -> tuple[Tricount, int] | None:
+        with self._registry_lock:
+            header = self._headers.get(tricount_id)
+            pending = self._pending.get(tricount_id)
+            span = self._spans.get(tricount_id)
+            snapshot = self._snapshot
+        if header is None:
+            return None
+        if pending is not None:
+            return tricount_from_dict(data=json.loads(pending)), len(pending)
+        if header.archived:
+            return self._read_archived(header)
+        if span is None:
+            return None
+
+        if snapshot is not None:
+            try:
+                tricount = snapshot.read(tricount_id, header.version)
+            except (OSError, ValueError):
+                tricount = None
+            if tricount is not None:
+                return tricount, span[1]
+
+        try:
+            encoded = tricount_storage.read_encoded_segment(span)
+            data = json.loads(encoded)
+        except (OSError, ValueError):
+            return None
+        if (
+            not isinstance(data, dict)
+            or data.get("id") != tricount_id
+            or data.get("version", 0) < header.version
+        ):
+            return None
+        return tricount_from_dict(data=data), len(encoded)
+
+    def _read_archived(
+        self, header: TricountHeader
+    ) -> tuple[Tricount, int] | None:
+        try:
+            encoded = tricount_storage.read_archived(header.id)
+            data = json.loads(encoded)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get("id") != header.id:
+            return None
+        return tricount_from_dict(data=data), len(encoded)
+
+    def _scan_cold(self, tricount_id: str) -> tuple[Tricount, int] | None:
+        try:
+            for data, span in tricount_storage.scan_tricounts():
+                if data["id"] == tricount_id:
+                    return tricount_from_dict(data=data), span[1]
+        except ValueError:
+            pass
+        return None
+
+    @contextmanager
+    def read(self, tricount_id: str) -> Iterator[Tricount | None]:
+        if self.multiprocess:
+            self.refresh()
+
+        lock = self._lock_for(tricount_id)
+        if lock is None:
+            yield None
+            return
+
+        with lock.read():
+            yield self._get(tricount_id)
+
+    @contextmanager
+    def write(self, tricount_id: str) -> Iterator[Tricount | None]:
+        with self._exclusive():
+            lock = self._lock_for(tricount_id)
+            if lock is None:
+                yield None
+                return
+
+            with lock.write():
+                yield self._get(tricount_id)
+        # Wait outside the tricount lock so other writers can join the batch
+        self._wait_durable()
+
+    def add(self, tricount: Tricount) -> None:
+        with self._exclusive():
+            tricount.version += 1
+            encoded = tricount_storage.encode_tricount(tricount=tricount)
+            with self._registry_lock:
+                self._headers[tricount.id] = header_from_tricount(tricount)
+                self._pending[tricount.id] = encoded
+                self._admit(tricount, len(encoded))
+            self._schedule_save()
+        self._wait_durable()
+
+    def remove(self, tricount_id: str) -> None:
+        with self._exclusive():
+            lock = self._lock_for(tricount_id)
+            if lock is None:
+                return
+
+            # Wait for in-flight requests on this tricount before dropping it
+            with lock.write():
+                with self._registry_lock:
+                    header = self._headers.pop(tricount_id, None)
+                    if header is not None and header.archived:
+                        self._stale_archives.add(tricount_id)
+                    self._spans.pop(tricount_id, None)
+                    self._pending.pop(tricount_id, None)
+                    self._locks.pop(tricount_id, None)
+                    self._evict(tricount_id)
+            self._schedule_save()
+        self._wait_durable()
+
+    def commit(self, tricount: Tricount) -> None:
+        """Persist a mutated tricount. Must be called while holding its
+        write lock."""
+        tricount.version += 1
+        try:
+            encoded = tricount_storage.encode_tricount(tricount=tricount)
+            header = header_from_tricount(tricount)
+        except Exception:
+            # The caller has already changed it: drop the cached copy so
+            # that the next access reloads what the header describes
+            tricount.version -= 1
+            with self._registry_lock:
+                self._evict(tricount.id)
+            raise
+        with self._registry_lock:
+            previous = self._headers.get(tricount.id)
+            if previous is None:
+                return
+            if previous.archived:
+                self._stale_archives.add(tricount.id)
+            self._headers[tricount.id] = header
+            self._pending[tricount.id] = encoded
+            self._admit(tricount, len(encoded))
+        self._schedule_save()
+
+    def archive(
+        self,
+        tricount_id: str,
+        when: Callable[[Tricount], bool] | None = None,
+    ) -> bool:
+        """Move a tricount to the archive tier, if ``when`` (checked under
+        its write lock) allows it. Returns whether it was archived."""
+        with self._exclusive():
+            lock = self._lock_for(tricount_id)
+            if lock is None:
+                return False
+
+            with lock.write():
+                tricount = self._get(tricount_id)
+                if tricount is None or (
+                    when is not None and not when(tricount)
+                ):
+                    return False
+                with self._registry_lock:
+                    if self._headers[tricount_id].archived:
+                        return False
+
+                # Other workers evict their copy when the version changes.
+                # The persist lock keeps a save from deleting the new archive
+                tricount.version += 1
+                with self._persist_lock:
+                    tricount_storage.save_archived(tricount)
+                    with self._registry_lock:
+                        self._headers[tricount_id] = replace(
+                            header_from_tricount(tricount), archived=True
+                        )
+                        self._spans.pop(tricount_id, None)
+                        self._pending.pop(tricount_id, None)
+                        self._stale_archives.discard(tricount_id)
+                        self._evict(tricount_id)
+            self._schedule_save()
+        self._wait_durable()
+        return True
+
+    def start(self) -> None:
+        if self.snapshot:
+            atexit.unregister(self.close)
+            atexit.register(self.close)
+        if self._writer or self.multiprocess or self.flush_interval <= 0:
+            return
+
+        self._closing = False
+        self._writer = threading.Thread(
+            target=self._run_writer, name="tricount-writer", daemon=True
+        )
+        self._writer.start()
+        atexit.unregister(self.close)
+        atexit.register(self.close)
+
+    def close(self) -> None:
+        """Stop the background writer after a final flush, then write the
+        snapshot when enabled."""
+        writer = self._writer
+        if writer is not None:
+            with self._flush_cond:
+                self._closing = True
+                self._flush_cond.notify_all()
+            writer.join()
+            self._writer = None
+            self.flush()
+
+        if self.snapshot:
+            self.write_snapshot()
+        atexit.unregister(self.close)
+
+    def write_snapshot(self) -> None:
+        """Write the binary snapshot of the saved tricounts used by the next
+        start. Unchanged records are copied from the current snapshot, the
+        others are decoded once from the data file."""
+        with self._locked():
+            if self.multiprocess:
+                self.refresh()
+            if self._pending:
+                self.save()
+
+            with self._persist_lock:
+                with self._registry_lock:
+                    if self._pending:
+                        # Changed again meanwhile: keep the current snapshot
+                        return
+                    headers = list(self._headers.values())
+                    spans = dict(self._spans)
+                    snapshot = self._snapshot
+
+                index = tricount_storage.load_index(require_fresh=True)
+                if index is None or index.checksum is None:
+                    index = tricount_storage.TricountIndex(
+                        tricount_storage.data_stamp(),
+                        tricount_storage.data_checksum(),
+                        [(h, spans.get(h.id)) for h in headers],
+                    )
+                    tricount_storage.save_index(
+                        index.entries, checksum=index.checksum
+                    )
+
+                def entries():
+                    for header in headers:
+                        span = spans.get(header.id)
+                        record = None
+                        if span is None:
+                            yield header, None, None
+                            continue
+                        if snapshot is not None:
+                            record = snapshot.record(header.id, header.version)
+                        if record is None:
+                            data = tricount_storage.read_tricount_segment(span)
+                            record = tricount_to_record(
+                                tricount_from_dict(data=data)
+                            )
+                        yield header, span, record
+
+                save_snapshot(
+                    index.data,
+                    index.checksum,
+                    tricount_storage.index_stamp(),
+                    entries(),
+                )
+                with self._registry_lock:
+                    self._replace_snapshot(Snapshot.open())
+
+    @contextmanager
+    def pinned(self):
+        """Save pending changes, then hold saves off (in every worker in
+        multi-process mode) for the block, so that the data files stay
+        consistent with each other. Meant for taking hard links or short
+        copies, not for long work."""
+        with self._locked():
+            if self.multiprocess:
+                self.refresh()
+            if self._pending:
+                self.save()
+            with self._persist_lock:
+                yield
+
+    @contextmanager
+    def batch(self):
+        """Save every change made by this thread inside the block once, at
+        the end, instead of once per commit. In multi-process mode the file
+        lock is held for the whole block."""
+        if getattr(self._local, "batch", False):
+            yield
+            return
+
+        with self._locked():
+            if self.multiprocess:
+                self.refresh()
+            self._local.batch = True
+            self._local.batch_dirty = False
+            try:
+                yield
+            finally:
+                self._local.batch = False
+                if self._local.batch_dirty:
+                    self._schedule_save()
+        self._wait_durable()
+
+    def _schedule_save(self) -> None:
+        if getattr(self._local, "batch", False):
+            self._local.batch_dirty = True
+            return
+        if self._writer is None and not self.multiprocess:
+            self.save()
+            return
+
+        # Saved by the writer, or when the file lock is released
+        with self._flush_cond:
+            self._generation += 1
+            self._local.generation = self._generation
+            self._flush_cond.notify_all()
+
+    def _wait_durable(self) -> None:
+        generation = getattr(self._local, "generation", None)
+        if generation is None:
+            return
+
+        self._local.generation = None
+        if not self.durable:
+            return
+        with self._flush_cond:
+            while (
+                self._flushed < generation
+                and self._failed < generation
+                and (self._writer is not None or self.multiprocess)
+            ):
+                self._flush_cond.wait()
+            if self._flushed < generation and self._failed >= generation:
+                raise RuntimeError(
+                    "Saving the tricounts failed"
+                ) from self._flush_error
+        if self._flushed < generation:
+            # The writer was closed concurrently
+            self.flush()
+
+    def _run_writer(self) -> None:
+        while True:
+            with self._flush_cond:
+                while self._generation == self._flushed and not self._closing:
+                    self._flush_cond.wait()
+                if self._closing:
+                    return
+
+                deadline = time.monotonic() + self.flush_interval
+                while (
+                    self._generation - self._flushed < self.flush_max_changes
+                    and not self._closing
+                ):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._flush_cond.wait(remaining)
+
+            try:
+                self.flush()
+            except Exception:
+                # Waiters got the error; try again after a pause
+                with self._flush_cond:
+                    if not self._closing:
+                        self._flush_cond.wait(self.flush_interval)
+
+    def flush(self) -> None:
+        """Write every pending change now."""
+        with self._flush_cond:
+            generation = self._generation
+            if generation == self._flushed:
+                return
+
+        try:
+            self.save()
+        except Exception as error:
+            with self._flush_cond:
+                self._failed = max(self._failed, generation)
+                self._flush_error = error
+                self._flush_cond.notify_all()
+            raise
+        with self._flush_cond:
+            self._flushed = max(self._flushed, generation)
+            self._flush_cond.notify_all()
+
+    def save(self) -> None:
+        # Holding the refresh lock keeps refresh() from mistaking the index
+        # being replaced here for changes made by another process
+        with self._persist_lock, self._refresh_lock:
+            with self._registry_lock:
+                headers = list(self._headers.values())
+                hot = [h for h in headers if not h.archived]
+                pending = dict(self._pending)
+                stale_archives = set(self._stale_archives)
+                segments = [
+                    pending[h.id] if h.id in pending else self._spans[h.id]
+                    for h in hot
+                ]
+            spans, checksum = tricount_storage.save_encoded_tricounts(segments)
+            saved = {header.id: span for header, span in zip(hot, spans)}
+            tricount_storage.save_index(
+                ((header, saved.get(header.id)) for header in headers),
+                checksum=checksum,
+            )
+
+            with self._registry_lock:
+                self._spans = {
+                    tricount_id: span
+                    for tricount_id, span in saved.items()
+                    if tricount_id in self._headers
+                }
+                for tricount_id, encoded in pending.items():
+                    if self._pending.get(tricount_id) is encoded:
+                        del self._pending[tricount_id]
+                self._stale_archives -= stale_archives
+            self._index_stamp = tricount_storage.index_stamp()
+            for tricount_id in stale_archives:
+                tricount_storage.delete_archived(tricount_id)
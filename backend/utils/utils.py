@@ -1,19 +1,141 @@
+import datetime
+
 from flask import abort
 
 from backend.models.currency import Currency
-from backend.models.expense import Expense
+from backend.models.expense import Expense, intern_id
+from backend.models.expense_table import CURRENCIES, ExpenseTable
+from backend.models.recurring_expense import RecurringExpense
 from backend.models.tricount import Tricount
+from backend.models.tricount_header import TricountHeader
 from backend.models.user import User
-from backend.services.balance import compute_balances
+from backend.services.balance import compute_balances, current_balances
 from backend.services.settlement import compute_settlements
+from backend.services.stats import compute_email_stats
+from backend.utils.metrics import timed
+
+
+def expenses_to_dicts(table: ExpenseTable) -> list[dict]:
+    user_ids = table.user_ids
+    currencies = [currency.value for currency in CURRENCIES]
+    part_offsets = table.part_offsets.tolist()
+    part_users = [user_ids[i] for i in table.part_index]
+    weight_offsets = table.weight_offsets.tolist()
+    weight_users = [user_ids[i] for i in table.weight_index]
+    weight_values = table.weight_values.tolist()
+    # Expenses share few distinct dates: format each one once
+    dates = {
+        day: datetime.date.fromordinal(day).isoformat()
+        for day in set(table.days)
+        if day
+    }
+    dates[0] = None
+
+    return [
+        {
+            "id": id,
+            "description": description,
+            "amount": amount,
+            "currency": currencies[currency],
+            "payer_id": user_ids[payer],
+            "participants_ids": part_users[part_start:part_end],
+            "weights": (
+                dict(
+                    zip(
+                        weight_users[weight_start:weight_end],
+                        weight_values[weight_start:weight_end],
+                    )
+                )
+                if weight_start != weight_end
+                else {}
+            ),
+            "date": dates[day],
+        }
+        for (
+            id,
+            description,
+            amount,
+            currency,
+            payer,
+            part_start,
+            part_end,
+            weight_start,
+            weight_end,
+            day,
+        ) in zip(
+            table.ids,
+            table.descriptions,
+            table.amounts,
+            table.currencies,
+            table.payers,
+            part_offsets,
+            part_offsets[1:],
+            weight_offsets,
+            weight_offsets[1:],
+            table.days,
+        )
+    ]
 
 
+def expense_to_dict(expense: Expense) -> dict:
+    return {
+        "id": expense.id,
+        "description": expense.description,
+        "amount": expense.amount,
+        "currency": expense.currency.value,
+        "payer_id": expense.payer_id,
+        "participants_ids": list(expense.participants_ids),
+        "weights": expense.weights,
+        "date": expense.date.isoformat() if expense.date else None,
+    }
+
+
+def parse_date(value: str | None) -> datetime.date | None:
+    return datetime.date.fromisoformat(value) if value else None
+
+
+def _format_date(value: datetime.date | None) -> str | None:
+    return value.isoformat() if value else None
+
+
+def recurring_to_dict(recurring: RecurringExpense) -> dict:
+    return {
+        "id": recurring.id,
+        "description": recurring.description,
+        "amount": recurring.amount,
+        "payer_id": recurring.payer_id,
+        "participants_ids": list(recurring.participants_ids),
+        "weights": recurring.weights,
+        "period": recurring.period,
+        "start_date": recurring.start_date.isoformat(),
+        "next_date": recurring.next_date.isoformat(),
+        "end_date": _format_date(recurring.end_date),
+    }
+
+
+def recurring_from_dict(data: dict) -> RecurringExpense:
+    return RecurringExpense(
+        id=data["id"],
+        description=data["description"],
+        amount=data["amount"],
+        payer_id=intern_id(data["payer_id"]),
+        participants_ids=tuple(map(intern_id, data["participants_ids"])),
+        weights=data.get("weights", {}),
+        period=data["period"],
+        start_date=parse_date(data["start_date"]),
+        next_date=parse_date(data.get("next_date")),
+        end_date=parse_date(data.get("end_date")),
+    )
+
+
+@timed("tricount_to_dict")
 def tricount_to_dict(tricount: Tricount) -> dict:
     return {
         "id": tricount.id,
         "owner_email": tricount.owner_email,
         "name": tricount.name,
         "currency": tricount.currency.value,
+        "version": tricount.version,
         "users": [
             {
                 "id": u.id,
@@ -22,39 +144,31 @@ def tricount_to_dict(tricount: Tricount) -> dict:
             }
             for u in tricount.users
         ],
-        "expenses": [
-            {
-                "id": e.id,
-                "description": e.description,
-                "amount": e.amount,
-                "currency": e.currency.value,
-                "payer_id": e.payer_id,
-                "participants_ids": e.participants_ids,
-                "weights": e.weights,
-            }
-            for e in tricount.expenses
-        ],
+        "expenses": expenses_to_dicts(tricount.expense_table),
+        "recurring": [recurring_to_dict(r) for r in tricount.recurring],
     }
 
 
+@timed("tricount_from_dict")
 def tricount_from_dict(data: dict) -> Tricount:
     tricount = Tricount(
         id=data["id"],
         owner_email=data.get("owner_email", ""),
         name=data["name"],
         currency=Currency(data["currency"]),
+        version=data.get("version", 0),
     )
 
     for u in data.get("users", []):
         user = User(
-            id=u["id"],
+            id=intern_id(u["id"]),
             name=u["name"],
             email=u.get("email"),
         )
         tricount.users.append(user)
 
     for e in data.get("expenses", []):
-        expense = Expense(
+        tricount.expense_table.append_row(
             id=e["id"],
             description=e["description"],
             amount=e["amount"],
@@ -62,33 +176,115 @@ def tricount_from_dict(data: dict) -> Tricount:
             payer_id=e["payer_id"],
             participants_ids=e["participants_ids"],
             weights=e.get("weights", {}),
+            date=parse_date(e.get("date")),
         )
-        tricount.expenses.append(expense)
 
+    tricount.recurring = [
+        recurring_from_dict(r) for r in data.get("recurring", [])
+    ]
     return tricount
 
 
-def get_tricount_from_id(
-    tricount_id: str, tricounts: list[Tricount]
-) -> Tricount:
-    t = next((t for t in tricounts if t.id == tricount_id), None)
-    if not t:
+def _ordinal(value: datetime.date | None) -> int:
+    return value.toordinal() if value else 0
+
+
+def _email_balances(
+    users: list[tuple[str, str]], balances: dict[str, float]
+) -> dict[str, float]:
+    by_email: dict[str, float] = {}
+    for user_id, email in users:
+        if email:
+            by_email[email] = by_email.get(email, 0.0) + balances.get(
+                user_id, 0.0
+            )
+    return by_email
+
+
+def header_from_tricount(tricount: Tricount) -> TricountHeader:
+    # Read from the totals the table maintains, not from every expense
+    stats = tricount.expense_table.user_stats()
+    return TricountHeader(
+        id=tricount.id,
+        name=tricount.name,
+        currency=tricount.currency,
+        owner_email=tricount.owner_email,
+        emails=frozenset(u.email for u in tricount.users if u.email),
+        users_count=len(tricount.users),
+        expenses_count=len(tricount.expense_table),
+        version=tricount.version,
+        next_due=_ordinal(tricount.next_due()),
+        total=sum(stats.paid),
+        balances=_email_balances(
+            [(u.id, u.email) for u in tricount.users],
+            current_balances(tricount),
+        ),
+        stats=compute_email_stats(tricount),
+    )
+
+
+def header_from_tricount_dict(data: dict) -> TricountHeader:
+    # Only used by scans, when the index is missing or stale: the member
+    # statistics need the tricount's expense table
+    return header_from_tricount(tricount_from_dict(data=data))
+
+
+def header_to_dict(header: TricountHeader) -> dict:
+    return {
+        "id": header.id,
+        "name": header.name,
+        "currency": header.currency.value,
+        "owner_email": header.owner_email,
+        "emails": sorted(header.emails),
+        "users_count": header.users_count,
+        "expenses_count": header.expenses_count,
+        "version": header.version,
+        "next_due": header.next_due,
+        "archived": header.archived,
+        "total": header.total,
+        "balances": header.balances,
+        "stats": header.stats,
+    }
+
+
+def header_from_dict(data: dict) -> TricountHeader:
+    return TricountHeader(
+        id=data["id"],
+        name=data["name"],
+        currency=Currency(data["currency"]),
+        owner_email=data["owner_email"],
+        emails=frozenset(data["emails"]),
+        users_count=data["users_count"],
+        expenses_count=data["expenses_count"],
+        version=data["version"],
+        next_due=data.get("next_due", 0),
+        archived=data.get("archived", False),
+        # Required: an index written before they existed is rebuilt
+        total=data["total"],
+        balances=data["balances"],
+        stats=data["stats"],
+    )
+
+
+def ensure_tricount_exists(
+    tricount: Tricount | TricountHeader | None,
+) -> Tricount | TricountHeader:
+    if not tricount:
         abort(404, description="3Compte non trouvé")
 
-    return t
+    return tricount
 
 
-def get_tricount_from_id_with_permissions(
-    tricount_id: str,
-    tricounts: list[Tricount],
+def ensure_tricount_permissions(
+    tricount: Tricount | TricountHeader | None,
     user_email: str,
     owner_needed: bool = False,
-) -> Tricount:
-    t = get_tricount_from_id(tricount_id, tricounts=tricounts)
+) -> Tricount | TricountHeader:
+    t = ensure_tricount_exists(tricount)
 
     if not (
         t.owner_email == user_email
-        or (any(u.email == user_email for u in t.users) and not owner_needed)
+        or (t.has_member(user_email) and not owner_needed)
     ):
         abort(
             404,
@@ -98,37 +294,50 @@ def get_tricount_from_id_with_permissions(
     return t
 
 
-def tricount_with_balances_to_dict(tricount: Tricount) -> dict:
-    balances = compute_balances(tricount)
-    settlements_raw = compute_settlements(balances)
+TRICOUNT_FIELDS = (
+    "id",
+    "name",
+    "currency",
+    "users",
+    "expenses",
+    "balances",
+    "settlements",
+)
 
-    return {
-        "id": tricount.id,
-        "name": tricount.name,
-        "currency": tricount.currency.value,
-        "users": [
+
+@timed("tricount_with_balances_to_dict")
+def tricount_with_balances_to_dict(
+    tricount: Tricount,
+    fields: tuple[str, ...] = TRICOUNT_FIELDS,
+    balances: dict[str, float] | None = None,
+) -> dict:
+    """The tricount as returned by the API, reduced to ``fields`` (always
+    with its id). ``balances`` are computed when not given and only if
+    needed."""
+    data = {"id": tricount.id}
+    if "name" in fields:
+        data["name"] = tricount.name
+    if "currency" in fields:
+        data["currency"] = tricount.currency.value
+    if "users" in fields:
+        data["users"] = [
             {
                 "id": u.id,
                 "name": u.name,
                 "email": u.email,
             }
             for u in tricount.users
-        ],
-        "expenses": [
-            {
-                "id": e.id,
-                "description": e.description,
-                "amount": e.amount,
-                "currency": e.currency.value,
-                "payer_id": e.payer_id,
-                "participants_ids": e.participants_ids,
-                "weights": e.weights,
-            }
-            for e in tricount.expenses
-        ],
-        "balances": balances,
-        "settlements": [
-            {"from": f, "to": t, "amount": amount}
-            for (f, t, amount) in settlements_raw
-        ],
-    }
+        ]
+    if "expenses" in fields:
+        data["expenses"] = expenses_to_dicts(tricount.expense_table)
+    if "balances" in fields or "settlements" in fields:
+        if balances is None:
+            balances = compute_balances(tricount)
+        if "balances" in fields:
+            data["balances"] = balances
+        if "settlements" in fields:
+            data["settlements"] = [
+                {"from": f, "to": t, "amount": amount}
+                for (f, t, amount) in compute_settlements(balances)
+            ]
+    return data
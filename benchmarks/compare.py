@@ -0,0 +1,61 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[dict]:
+    previous = {
+        result["name"]: result
+        for result in baseline["results"]
+        if "median" in result
+    }
+    rows = []
+    for result in current["results"]:
+        before = previous.get(result["name"])
+        if before is None or "median" not in result:
+            continue
+        ratio = result["median"] / before["median"] if before["median"] else 1
+        rows.append(
+            {
+                "name": result["name"],
+                "before": before["median"],
+                "after": result["median"],
+                "ratio": ratio,
+                "regression": ratio > 1 + threshold,
+            }
+        )
+    return rows
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Compare two benchmark reports produced by run.py."
+    )
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("current", type=Path)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="Relative slowdown of the median reported as a regression",
+    )
+    args = parser.parse_args(argv)
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    current = json.loads(args.current.read_text(encoding="utf-8"))
+    if baseline["params"] != current["params"]:
+        print("warning: reports were run with different parameters")
+
+    rows = compare(baseline, current, threshold=args.threshold)
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(
+            f"{row['name']:<45} {row['before'] * 1000:10.3f} ms"
+            f" -> {row['after'] * 1000:10.3f} ms ({row['ratio']:.2f}x){flag}"
+        )
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,550 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark-only-secret-key-0123456789")
+
+from backend.services.balance import compute_balances  # noqa: E402
+from backend.services.export import export_tricount_to_excel  # noqa: E402
+from backend.services.settlement import compute_settlements  # noqa: E402
+from backend.utils import auth_storage, tricount_storage  # noqa: E402
+from backend.utils.dataset import (  # noqa: E402
+    generate_tricount_dict,
+    generate_tricounts,
+)
+from backend.utils.utils import (  # noqa: E402
+    tricount_from_dict,
+    tricount_to_dict,
+)
+
+BENCH_EMAIL = "owner@bench.com"
+BENCH_PASSWORD = "benchmark-password"
+SUITES = (
+    "services",
+    "storage",
+    "routes",
+    "memory",
+    "startup",
+    "concurrency",
+)
+# Threads writing at once in the concurrency suite, one tricount each
+WRITERS = 8
+
+# Run in a fresh interpreter from a directory holding data/tricounts.json
+STARTUP_SCRIPT = """
+import json, sys, time
+
+start = time.perf_counter()
+from backend.api.tricount import app
+imported = time.perf_counter()
+
+from flask_jwt_extended import create_access_token
+
+with app.app_context():
+    token = create_access_token(identity=sys.argv[1])
+client = app.test_client()
+headers = {"Authorization": f"Bearer {token}"}
+before = time.perf_counter()
+response = client.get(f"/api/tricounts/{sys.argv[2]}", headers=headers)
+assert response.status_code == 200, response.status_code
+first = time.perf_counter()
+client.get(f"/api/tricounts/{sys.argv[2]}", headers=headers)
+second = time.perf_counter()
+print(json.dumps([imported - start, first - before, second - first]))
+"""
+
+
+def measure(name: str, func, repeat: int, items: int = 1) -> dict:
+    func()  # warm-up
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return {
+        "name": name,
+        "items": items,
+        "runs": repeat,
+        "min": min(runs),
+        "median": statistics.median(runs),
+        "mean": statistics.fmean(runs),
+    }
+
+
+def peak_memory(func) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_services(tricounts: list, repeat: int) -> list[dict]:
+    expenses = sum(len(t.expenses) for t in tricounts)
+    balances = [compute_balances(t) for t in tricounts]
+    dicts = [tricount_to_dict(tricount=t) for t in tricounts]
+
+    return [
+        measure(
+            "compute_balances",
+            lambda: [compute_balances(t) for t in tricounts],
+            repeat,
+            items=expenses,
+        ),
+        measure(
+            "compute_settlements",
+            lambda: [compute_settlements(b) for b in balances],
+            repeat,
+            items=len(balances),
+        ),
+        measure(
+            "tricount_to_dict",
+            lambda: [tricount_to_dict(tricount=t) for t in tricounts],
+            repeat,
+            items=expenses,
+        ),
+        measure(
+            "tricount_from_dict",
+            lambda: [tricount_from_dict(data=d) for d in dicts],
+            repeat,
+            items=expenses,
+        ),
+        measure(
+            "export_tricount_to_excel",
+            lambda: export_tricount_to_excel(tricount=tricounts[0]),
+            repeat,
+            items=len(tricounts[0].expenses),
+        ),
+    ]
+
+
+def bench_storage(tricounts: list, repeat: int) -> list[dict]:
+    expenses = sum(len(t.expenses) for t in tricounts)
+    results = []
+    saved_format = tricount_storage.FORMAT
+    try:
+        for storage_format in tricount_storage.FORMATS:
+            tricount_storage.FORMAT = storage_format
+            suffix = "" if storage_format == "json" else f"_{storage_format}"
+            results += [
+                measure(
+                    "save_tricounts" + suffix,
+                    lambda: tricount_storage.save_tricounts(
+                        tricounts=tricounts
+                    ),
+                    repeat,
+                    items=expenses,
+                ),
+                measure(
+                    "load_tricounts" + suffix,
+                    tricount_storage.load_tricounts,
+                    repeat,
+                    items=expenses,
+                ),
+                {
+                    "name": "tricounts_file_bytes" + suffix,
+                    "items": expenses,
+                    "value": tricount_storage.DATA_FILE.stat().st_size,
+                },
+            ]
+    finally:
+        tricount_storage.FORMAT = saved_format
+
+    results += [
+        {
+            "name": "save_tricounts_peak_bytes",
+            "items": expenses,
+            "value": peak_memory(
+                lambda: tricount_storage.save_tricounts(tricounts=tricounts)
+            ),
+        },
+        {
+            "name": "load_tricounts_peak_bytes",
+            "items": expenses,
+            "value": peak_memory(tricount_storage.load_tricounts),
+        },
+    ]
+    return results
+
+
+def bench_concurrency(tricounts: list, repeat: int) -> list[dict]:
+    """One expense added by each of ``WRITERS`` threads to its own
+    tricount, with a save per commit, with group commit, and under the
+    file lock of multi-process mode."""
+    from backend.utils.tricount_store import TricountStore
+
+    targets = [t.id for t in tricounts[:WRITERS]]
+    expenses = sum(len(t.expenses) for t in tricounts)
+
+    def add_expense(store: TricountStore, tricount_id: str) -> None:
+        with store.write(tricount_id) as tricount:
+            user_ids = [user.id for user in tricount.users]
+            tricount.add_expense("Benchmark", 42.0, user_ids[0], user_ids)
+            store.commit(tricount)
+
+    def write_all(store: TricountStore) -> None:
+        threads = [
+            threading.Thread(target=add_expense, args=(store, tricount_id))
+            for tricount_id in targets
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    results = []
+    for suffix, options in (
+        ("", {}),
+        ("_group_commit", {"flush_interval": 0.005}),
+        ("_multiprocess", {"multiprocess": True}),
+    ):
+        store = TricountStore(**options)
+        store.reset(tricounts)
+        store.save()
+        store.load()
+        store.start()
+        try:
+            results.append(
+                measure(
+                    "concurrent_writes" + suffix,
+                    lambda: write_all(store),
+                    repeat,
+                    items=expenses,
+                )
+            )
+        finally:
+            store.close()
+    return results
+
+
+def bench_memory(
+    seed: int, groups: int, users: int, expenses: int, weighted_ratio: float
+) -> list[dict]:
+    rng = random.Random(seed)
+    raw = json.dumps(
+        [
+            generate_tricount_dict(
+                rng,
+                users=users,
+                expenses=expenses,
+                weighted_ratio=weighted_ratio,
+            )
+            for _ in range(groups)
+        ]
+    )
+
+    # Parsed dicts are dropped once converted: only the models remain
+    tracemalloc.start()
+    try:
+        tricounts = [tricount_from_dict(data=d) for d in json.loads(raw)]
+        resident, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    count = sum(len(t.expenses) for t in tricounts)
+    return [
+        {
+            "name": "resident_tricounts_bytes",
+            "items": count,
+            "value": resident,
+        },
+        {
+            "name": "resident_bytes_per_expense",
+            "items": count,
+            "value": resident / count if count else 0,
+        },
+    ]
+
+
+def bench_routes(tricounts: list, repeat: int) -> list[dict]:
+    from backend.api.tricount import app
+    from backend.extensions import login_throttle, tricount_store
+
+    login_throttle.reset()
+    tricount_store.reset(tricounts)
+    tricount_store.save()
+
+    client = app.test_client()
+    client.post(
+        "/api/auth/register",
+        json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD, "name": "B"},
+    )
+    token = client.post(
+        "/api/auth/login",
+        json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD},
+    ).get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    tricount = tricounts[0]
+    base = f"/api/tricounts/{tricount.id}"
+    user_ids = [user.id for user in tricount.users]
+    expense = {
+        "description": "Benchmark",
+        "amount": 42.0,
+        "payer_id": user_ids[0],
+        "participants_ids": user_ids,
+    }
+    created = []
+
+    def add_expense():
+        data = client.post(
+            f"{base}/expenses", json=expense, headers=headers
+        ).get_json()
+        created.append(data["expenses"][-1]["id"])
+
+    def delete_expense():
+        client.delete(f"{base}/expenses/{created.pop()}", headers=headers)
+
+    items = len(tricount.expenses)
+    results = [
+        measure(
+            "GET /api/tricounts",
+            lambda: client.get("/api/tricounts", headers=headers),
+            repeat,
+            items=len(tricounts),
+        ),
+        measure(
+            "GET /api/tricounts/<id>",
+            lambda: client.get(base, headers=headers),
+            repeat,
+            items=items,
+        ),
+        measure(
+            "GET /api/tricounts/<id>/stats",
+            lambda: client.get(f"{base}/stats", headers=headers),
+            repeat,
+            items=items,
+        ),
+        measure(
+            "GET /api/tricounts/<id>/timeline",
+            lambda: client.get(
+                f"{base}/timeline?from=2025-03-01&to=2025-03-31&period=week",
+                headers=headers,
+            ),
+            repeat,
+            items=items,
+        ),
+        measure(
+            "GET /api/tricounts/stats",
+            lambda: client.get("/api/tricounts/stats", headers=headers),
+            repeat,
+            items=len(tricounts),
+        ),
+        measure(
+            "POST /api/tricounts/<id>/expenses",
+            add_expense,
+            repeat,
+            items=items,
+        ),
+        measure(
+            "DELETE /api/tricounts/<id>/expenses/<id>",
+            delete_expense,
+            repeat,
+            items=items,
+        ),
+        measure(
+            "GET /api/tricounts/<id>/export/excel",
+            lambda: client.get(f"{base}/export/excel", headers=headers),
+            repeat,
+            items=items,
+        ),
+    ]
+    tricount_store.reset()
+    return results
+
+
+def bench_startup(tricounts: list, repeat: int) -> list[dict]:
+    root = Path(__file__).resolve().parent.parent
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(
+            filter(None, [str(root), os.environ.get("PYTHONPATH")])
+        ),
+    }
+    expenses = sum(len(t.expenses) for t in tricounts)
+    target = tricounts[len(tricounts) // 2].id
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        saved_file = tricount_storage.DATA_FILE
+        tricount_storage.DATA_FILE = Path(work_dir) / "data" / "tricounts.json"
+        try:
+            tricount_storage.save_tricounts(tricounts=tricounts)
+        finally:
+            tricount_storage.DATA_FILE = saved_file
+
+        for suffix, snapshot in (("", "0"), ("_snapshot", "1")):
+            runs = []
+            # The warm-up run fills the page cache and writes the snapshot
+            for _ in range(repeat + 1):
+                output = subprocess.run(
+                    [
+                        sys.executable,
+                        "-c",
+                        STARTUP_SCRIPT,
+                        BENCH_EMAIL,
+                        target,
+                    ],
+                    cwd=work_dir,
+                    env={**env, "TRICOUNT_SNAPSHOT": snapshot},
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                ).stdout
+                runs.append(json.loads(output))
+            runs = runs[1:]
+
+            results += [
+                {
+                    "name": name + suffix,
+                    "items": expenses,
+                    "runs": repeat,
+                    "min": min(run[i] for run in runs),
+                    "median": statistics.median(run[i] for run in runs),
+                    "mean": statistics.fmean(run[i] for run in runs),
+                }
+                for i, name in enumerate(
+                    (
+                        "startup_import",
+                        "startup_first_request",
+                        "startup_next_request",
+                    )
+                )
+            ]
+    return results
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    seed: int = 42,
+    groups: int = 10,
+    users: int = 8,
+    expenses: int = 200,
+    weighted_ratio: float = 0.2,
+    repeat: int = 5,
+    suites: tuple[str, ...] = SUITES,
+) -> dict:
+    params = {
+        "seed": seed,
+        "groups": groups,
+        "users": users,
+        "expenses": expenses,
+        "weighted_ratio": weighted_ratio,
+        "repeat": repeat,
+    }
+    tricounts = generate_tricounts(
+        seed=seed,
+        groups=groups,
+        users=users,
+        expenses=expenses,
+        weighted_ratio=weighted_ratio,
+        owner_email=BENCH_EMAIL,
+    )
+
+    saved_files = (auth_storage.DATA_FILE, tricount_storage.DATA_FILE)
+    results = []
+    with tempfile.TemporaryDirectory() as data_dir:
+        auth_storage.DATA_FILE = Path(data_dir) / "users.json"
+        tricount_storage.DATA_FILE = Path(data_dir) / "tricounts.json"
+        try:
+            if "services" in suites:
+                results += bench_services(tricounts, repeat)
+            if "storage" in suites:
+                results += bench_storage(tricounts, repeat)
+            if "routes" in suites:
+                results += bench_routes(tricounts, repeat)
+            if "memory" in suites:
+                results += bench_memory(
+                    seed, groups, users, expenses, weighted_ratio
+                )
+            if "startup" in suites:
+                results += bench_startup(tricounts, repeat)
+            if "concurrency" in suites:
+                results += bench_concurrency(tricounts, repeat)
+        finally:
+            auth_storage.DATA_FILE, tricount_storage.DATA_FILE = saved_files
+
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+        "results": results,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Time the backend hot paths on a synthetic dataset."
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--groups", type=int, default=10)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--expenses", type=int, default=200)
+    parser.add_argument("--weighted-ratio", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--suite",
+        action="append",
+        choices=SUITES,
+        help="Suites to run (default: all)",
+    )
+    parser.add_argument(
+        "--output", type=Path, help="Write the JSON report to this file"
+    )
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(
+        seed=args.seed,
+        groups=args.groups,
+        users=args.users,
+        expenses=args.expenses,
+        weighted_ratio=args.weighted_ratio,
+        repeat=args.repeat,
+        suites=tuple(args.suite or SUITES),
+    )
+
+    encoded = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.write_text(encoded + "\n", encoding="utf-8")
+    else:
+        print(encoded)
+
+    for result in report["results"]:
+        if "median" in result:
+            print(
+                f"{result['name']:<45} {result['median'] * 1000:10.3f} ms",
+                file=sys.stderr,
+            )
+        else:
+            print(
+                f"{result['name']:<45} {result['value']:13.1f}",
+                file=sys.stderr,
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,7 +6,7 @@ from pathlib import Path
 import pytest
 
 from backend.api import tricount as api_tricount
-from backend.routes import tricounts as tricount_routes
+from backend.extensions import idempotency, login_throttle, tricount_store
 from backend.utils import auth_storage, tricount_storage
 from backend.utils.auth_storage import save_users
 from backend.utils.tricount_storage import save_tricounts
@@ -24,7 +24,7 @@ def app(tmp_path_factory):
     auth_storage.DATA_FILE = Path(data_dir) / "users.json"
     tricount_storage.DATA_FILE = Path(data_dir) / "tricounts.json"
 
-    tricount_routes.tricounts = []
+    tricount_store.reset()
 
     api_tricount.app.config.update(
         {
@@ -36,6 +36,8 @@ def app(tmp_path_factory):
 
     save_users([])
     save_tricounts([])
+    login_throttle.reset()
+    idempotency.clear()
 
     yield api_tricount.app
 
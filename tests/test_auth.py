@@ -62,6 +62,32 @@ def test_register_duplicate_email(client):
     assert "déjà utilisé" in data["error"]
 
 
+def test_concurrent_registrations_are_all_saved(app):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from backend.utils.auth_storage import load_users
+
+    def register(i):
+        return (
+            app.test_client()
+            .post(
+                "/api/auth/register",
+                json={
+                    "email": f"user{i}@test.com",
+                    "password": "pass123",
+                    "name": f"User {i}",
+                },
+            )
+            .status_code
+        )
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        statuses = list(pool.map(register, range(16)))
+
+    assert statuses == [201] * 16
+    assert len(load_users()) == 16
+
+
 def test_login_success(client):
     # Register user
     client.post(
@@ -121,3 +147,143 @@ def test_login_missing_fields(client):
     # Missing password
     response = client.post("/api/auth/login", json={"password": "pass123"})
     assert response.status_code == 400
+
+
+def test_login_throttled_before_password_check(client, monkeypatch):
+    from backend.extensions import bcrypt, login_throttle
+
+    client.post(
+        "/api/auth/register",
+        json={
+            "email": "user@test.com",
+            "password": "pass123",
+            "name": "User",
+        },
+    )
+
+    checks = []
+    check_password_hash = bcrypt.check_password_hash
+
+    def counting_check(pw_hash, password):
+        checks.append(password)
+        return check_password_hash(pw_hash, password)
+
+    monkeypatch.setattr(bcrypt, "check_password_hash", counting_check)
+
+    capacity = int(login_throttle.by_email.capacity)
+    for _ in range(capacity):
+        response = client.post(
+            "/api/auth/login",
+            json={"email": "user@test.com", "password": "wrongpass"},
+        )
+        assert response.status_code == 401
+
+    # Even the right password is refused once the budget is spent
+    response = client.post(
+        "/api/auth/login",
+        json={"email": "user@test.com", "password": "pass123"},
+    )
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
+    assert len(checks) == capacity
+
+    stats = login_throttle.stats()
+    assert stats["rejected"] == 1
+    assert stats["hash_checks_saved"] == 1
+
+
+def test_login_throttle_is_per_email(client):
+    from backend.extensions import login_throttle
+
+    client.post(
+        "/api/auth/register",
+        json={
+            "email": "user@test.com",
+            "password": "pass123",
+            "name": "User",
+        },
+    )
+
+    for _ in range(int(login_throttle.by_email.capacity)):
+        client.post(
+            "/api/auth/login",
+            json={"email": "other@test.com", "password": "wrongpass"},
+        )
+
+    response = client.post(
+        "/api/auth/login",
+        json={"email": "user@test.com", "password": "pass123"},
+    )
+    assert response.status_code == 200
+
+
+def test_token_bucket_refill_and_eviction():
+    from backend.utils.rate_limit import TokenBucketLimiter
+
+    now = [0.0]
+    limiter = TokenBucketLimiter(
+        capacity=2, refill_rate=1.0, max_buckets=2, clock=lambda: now[0]
+    )
+
+    limiter.consume("a")
+    limiter.consume("a")
+    assert limiter.retry_after("a") == 1.0
+
+    now[0] = 0.5
+    assert limiter.tokens("a") == 0.5
+
+    limiter.consume("b")
+    limiter.consume("c")
+    # "a" is the least recently used bucket and gets evicted
+    assert len(limiter) == 2
+    assert limiter.tokens("a") == 2.0
+
+
+def test_login_throttle_checks_the_address_first():
+    from backend.utils.rate_limit import LoginThrottle, TokenBucketLimiter
+
+    throttle = LoginThrottle()
+    throttle.by_email = TokenBucketLimiter(
+        capacity=1, refill_rate=0, max_buckets=2
+    )
+    throttle.by_ip = TokenBucketLimiter(capacity=1, refill_rate=0)
+
+    assert throttle.check("victim@test.com", "1.2.3.4") == 0
+    # Random emails from one address are refused without creating buckets
+    # that would evict the victim's drained one
+    for i in range(10):
+        throttle.check(f"spray{i}@test.com", "6.6.6.6")
+    assert throttle.check("victim@test.com", "5.6.7.8") > 0
+    assert throttle.by_email.tokens("victim@test.com") == 0
+
+
+def test_login_rejects_non_string_credentials(client):
+    response = client.post(
+        "/api/auth/login", json={"email": 5, "password": "pass123"}
+    )
+    assert response.status_code == 400
+
+    response = client.post(
+        "/api/auth/register",
+        json={"email": "user@test.com", "password": ["x"], "name": "User"},
+    )
+    assert response.status_code == 400
+
+
+def test_login_throttle_check_takes_the_token(client, auth_headers):
+    from backend.utils.rate_limit import LoginThrottle, TokenBucketLimiter
+
+    throttle = LoginThrottle()
+    throttle.by_email = TokenBucketLimiter(capacity=2, refill_rate=0)
+    throttle.by_ip = TokenBucketLimiter(capacity=20, refill_rate=0)
+
+    # Attempts in flight hold their token until they succeed
+    assert throttle.check("user@test.com", "1.2.3.4") == 0
+    assert throttle.check("USER@test.com", "1.2.3.4") == 0
+    assert throttle.check("user@test.com", "5.6.7.8") > 0
+    throttle.record_success("user@test.com", "1.2.3.4")
+    assert throttle.check("user@test.com", "5.6.7.8") == 0
+    assert throttle.by_ip.tokens("1.2.3.4") == 19
+
+    response = client.get("/api/auth/throttle", headers=auth_headers)
+    assert response.status_code == 404
@@ -0,0 +1,52 @@
+from backend.utils.dataset import generate_tricounts
+from backend.utils.utils import tricount_to_dict
+from benchmarks.run import run_benchmarks
+
+
+def test_generator_is_deterministic():
+    first = generate_tricounts(seed=1, groups=2, users=4, expenses=30)
+    second = generate_tricounts(seed=1, groups=2, users=4, expenses=30)
+
+    assert [tricount_to_dict(t) for t in first] == [
+        tricount_to_dict(t) for t in second
+    ]
+    assert all(len(t.users) == 4 for t in first)
+    assert all(len(t.expenses) == 30 for t in first)
+
+
+def test_generator_weighted_ratio():
+    (tricount,) = generate_tricounts(
+        seed=1, groups=1, users=4, expenses=50, weighted_ratio=1.0
+    )
+    assert all(expense.weights for expense in tricount.expenses)
+
+
+def test_run_benchmarks_report(app):
+    report = run_benchmarks(
+        groups=2, users=3, expenses=10, repeat=1, suites=("services",)
+    )
+
+    names = {result["name"] for result in report["results"]}
+    assert {"compute_balances", "compute_settlements"} <= names
+    assert report["params"]["expenses"] == 10
+    assert all(result["median"] >= 0 for result in report["results"])
+
+
+def test_startup_does_not_import_openpyxl(tmp_path):
+    import os
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    root = Path(__file__).resolve().parent.parent
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, backend.api.tricount; "
+            "assert 'openpyxl' not in sys.modules",
+        ],
+        cwd=tmp_path,
+        env={**os.environ, "PYTHONPATH": str(root), "JWT_SECRET_KEY": "x"},
+        check=True,
+    )
@@ -0,0 +1,67 @@
+from backend.utils.metrics import Metrics, metrics
+
+
+def test_metrics_endpoint(client, auth_headers):
+    metrics.reset()
+    create_response = client.post(
+        "/api/tricounts", json={"name": "Tricount"}, headers=auth_headers
+    )
+    tricount_id = create_response.get_json()["id"]
+    client.get(f"/api/tricounts/{tricount_id}", headers=auth_headers)
+    client.get("/api/tricounts/nonexistent", headers=auth_headers)
+    client.post(
+        "/api/auth/login",
+        json={"email": "user@test.com", "password": "pass123"},
+    )
+
+    # Hidden unless a token is configured and sent
+    assert client.get("/metrics").status_code == 404
+    client.application.config["METRICS_TOKEN"] = "scraper"
+    try:
+        assert client.get("/metrics").status_code == 404
+        response = client.get(
+            "/metrics", headers={"Authorization": "Bearer scraper"}
+        )
+    finally:
+        client.application.config["METRICS_TOKEN"] = None
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    body = response.get_data(as_text=True)
+
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert (
+        'http_requests_total{method="GET",route="/api/tricounts/<tricount_id>"'
+        ',status="200"} 1'
+    ) in body
+    assert (
+        'http_requests_total{method="GET",route="/api/tricounts/<tricount_id>"'
+        ',status="404"} 1'
+    ) in body
+    assert 'section="compute_balances"' in body
+    assert 'section="storage_save"' in body
+    assert 'section="bcrypt_check"' in body
+    assert "tricount_store_tricounts 1" in body
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Metrics(buckets=(0.1, 1.0))
+    registry.observe("latency_seconds", 0.05)
+    registry.observe("latency_seconds", 0.5)
+    registry.observe("latency_seconds", 5.0)
+
+    body = registry.render()
+    assert 'latency_seconds_bucket{le="0.1"} 1' in body
+    assert 'latency_seconds_bucket{le="1"} 2' in body
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in body
+    assert "latency_seconds_count 3" in body
+    assert "latency_seconds_sum 5.55" in body
+
+
+def test_disabled_metrics_record_nothing():
+    registry = Metrics()
+    registry.enabled = False
+    registry.inc("requests_total")
+    with registry.timer("section"):
+        pass
+
+    assert registry.render() == "\n"
@@ -1,5 +1,10 @@
+from datetime import date
+
+import pytest
+
 from backend.models.currency import Currency
 from backend.models.expense import Expense
+from backend.models.expense_timeline import ExpenseTimeline
 from backend.models.tricount import Tricount
 from backend.models.user import User
 
@@ -87,3 +92,130 @@ def test_expense_split_amount_no_participants():
 
     split = expense.split_amount()
     assert split == 0.0
+
+
+def test_models_are_slotted():
+    tricount = Tricount(name="Tricount", currency=Currency.EUR)
+    user = tricount.add_user("User", "user@test.com")
+    expense = tricount.add_expense(
+        description="Expense",
+        amount=10.0,
+        payer_id=user.id,
+        participants_ids=[user.id],
+    )
+
+    for model in (tricount, user, expense):
+        assert not hasattr(model, "__dict__")
+    assert expense.participants_ids == (user.id,)
+
+
+def test_storage_format_unchanged_and_ids_shared():
+    from backend.utils.utils import tricount_from_dict, tricount_to_dict
+
+    tricount = Tricount(name="Tricount", currency=Currency.EUR)
+    user1 = tricount.add_user("User1", "user1@test.com")
+    user2 = tricount.add_user("User2", "user2@test.com")
+    tricount.add_expense(
+        description="Expense",
+        amount=10.0,
+        payer_id=user1.id,
+        participants_ids=[user1.id, user2.id],
+        weights={user1.id: 1.0, user2.id: 2.0},
+    )
+
+    data = tricount_to_dict(tricount)
+    assert data["expenses"][0]["participants_ids"] == [user1.id, user2.id]
+
+    # Simulate strings freshly parsed from JSON
+    data["expenses"][0]["payer_id"] = "".join(user1.id)
+    loaded = tricount_from_dict(data)
+    assert tricount_to_dict(loaded) == data
+    assert loaded.expenses[0].payer_id is loaded.users[0].id
+
+
+def test_expense_table_columns():
+    tricount = Tricount(name="Tricount", currency=Currency.EUR)
+    user1 = tricount.add_user("User1", "user1@test.com")
+    user2 = tricount.add_user("User2", "user2@test.com")
+    first = tricount.add_expense(
+        description="First",
+        amount=30.0,
+        payer_id=user1.id,
+        participants_ids=[user1.id, user2.id],
+    )
+    second = tricount.add_expense(
+        description="Second",
+        amount=20.0,
+        payer_id=user2.id,
+        participants_ids=[user2.id],
+        weights={user2.id: 2.0},
+    )
+
+    table = tricount.expense_table
+    assert table.user_ids == [user1.id, user2.id]
+    assert list(table.part_offsets) == [0, 2, 3]
+    assert list(table.weight_offsets) == [0, 0, 1]
+    assert list(tricount.expenses) == [first, second]
+    assert tricount.expenses[-1] == second
+    assert table.references(user2.id)
+    assert not table.references("nonexistent")
+
+    assert tricount.remove_expense(first.id)
+    assert not tricount.remove_expense(first.id)
+    assert list(tricount.expenses) == [second]
+    assert list(table.part_offsets) == [0, 1]
+    assert list(table.weight_offsets) == [0, 1]
+    assert not table.references(user1.id)
+
+
+def test_expense_table_rejects_bad_weights_without_partial_row():
+    tricount = Tricount(name="Tricount", currency=Currency.EUR)
+    user = tricount.add_user("User", "user@test.com")
+
+    with pytest.raises(TypeError):
+        tricount.add_expense(
+            description="Expense",
+            amount=10.0,
+            payer_id=user.id,
+            participants_ids=[user.id],
+            weights={user.id: "heavy"},
+        )
+    assert len(tricount.expenses) == 0
+    assert list(tricount.expense_table.part_offsets) == [0]
+
+
+def test_expense_timeline_maintained_incrementally():
+    tricount = Tricount(name="Tricount", currency=Currency.EUR)
+    user1 = tricount.add_user("User1", "user1@test.com")
+    user2 = tricount.add_user("User2", "user2@test.com")
+    ids = [user1.id, user2.id]
+    table = tricount.expense_table
+
+    tricount.add_expense("Undated", 5.0, user1.id, ids)
+    timeline = table.time_index()
+    expenses = [
+        tricount.add_expense(
+            f"Day {day}", 10.0 * day, user1.id, ids, date=date(2026, 3, day)
+        )
+        for day in (20, 2, 20, 9, 2)
+    ]
+    tricount.remove_expense(expenses[2].id)
+    tricount.remove_expense(expenses[3].id)
+    tricount.add_expense("Late", 1.0, user2.id, ids, date=date(2026, 4, 1))
+
+    rebuilt = ExpenseTimeline.from_table(table)
+    assert timeline.days == rebuilt.days
+    assert timeline.rows == rebuilt.rows
+    assert timeline.bucket_days == rebuilt.bucket_days
+    assert timeline.counts == rebuilt.counts == [2, 1, 1]
+    assert timeline.totals == pytest.approx(rebuilt.totals)
+
+    march = timeline.rows_between(
+        date(2026, 3, 1).toordinal(), date(2026, 3, 31).toordinal()
+    )
+    assert [table.descriptions[row] for row in march] == [
+        "Day 2",
+        "Day 2",
+        "Day 20",
+    ]
+    assert tricount.expenses[1].date == date(2026, 3, 20)
@@ -0,0 +1,85 @@
+import pstats
+
+import pytest
+
+from backend.extensions import profiler
+
+
+@pytest.fixture
+def profiling(tmp_path):
+    profiler.enabled = True
+    profiler.directory = tmp_path
+    profiler.token = "secret"
+    yield tmp_path
+    profiler.enabled = False
+    profiler.token = None
+
+
+def test_profiling_disabled_by_default(client, auth_headers, tmp_path):
+    profiler.directory = tmp_path
+    response = client.get(
+        "/api/tricounts", headers={**auth_headers, "X-Profile": "1"}
+    )
+
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_profiling_writes_stats(client, auth_headers, profiling):
+    response = client.get(
+        "/api/tricounts",
+        headers={
+            **auth_headers,
+            "X-Profile": "1",
+            "X-Profile-Token": "secret",
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.get_json() == []
+    profile_id = response.headers["X-Profile-Id"]
+    stats = pstats.Stats(str(profiling / f"{profile_id}.pstats"))
+    assert any(name == "list_tricounts" for _, _, name in stats.stats)
+    assert (profiling / f"{profile_id}.folded").exists()
+
+
+def test_profiling_summary(client, auth_headers, profiling):
+    response = client.get(
+        "/api/tricounts?profile=summary",
+        headers={**auth_headers, "X-Profile-Token": "secret"},
+    )
+
+    data = response.get_json()
+    assert data["endpoint"] == "tricounts.list_tricounts"
+    assert data["status"] == 200
+    assert data["top"]
+    assert {"function", "calls", "cumulative_time"} <= set(data["top"][0])
+
+
+def test_profiling_token(client, auth_headers, profiling):
+    response = client.get(
+        "/api/tricounts", headers={**auth_headers, "X-Profile": "1"}
+    )
+    assert "X-Profile-Id" not in response.headers
+
+    response = client.get(
+        "/api/tricounts",
+        headers={
+            **auth_headers,
+            "X-Profile": "1",
+            "X-Profile-Token": "secret",
+        },
+    )
+    assert "X-Profile-Id" in response.headers
+
+
+def test_profiling_requires_token():
+    from flask import Flask
+
+    from backend.utils.profiling import RequestProfiler
+
+    app = Flask(__name__)
+    app.config["PROFILING_ENABLED"] = True
+    with pytest.raises(RuntimeError):
+        RequestProfiler().init_app(app)
@@ -1,7 +1,15 @@
+from datetime import date
+
+import pytest
+
 from backend.models.currency import Currency
+from backend.models.recurring_expense import RecurringExpense
 from backend.models.tricount import Tricount
 from backend.services.balance import compute_balances
+from backend.services.recurring import run_recurring
 from backend.services.settlement import compute_settlements
+from backend.services.simulation import simulate_expenses
+from backend.services.stats import compute_tricount_stats
 
 
 def test_compute_balances_simple():
@@ -110,3 +118,299 @@ def test_compute_settlements_balanced():
 
     settlements = compute_settlements(balances)
     assert len(settlements) == 0
+
+
+def test_expense_stats_maintained_incrementally():
+    tricount = Tricount(name="Tricount", currency=Currency.EUR)
+    user1 = tricount.add_user("User1", "user1@test.com")
+    user2 = tricount.add_user("User2", "user2@test.com")
+    user3 = tricount.add_user("User3", "user3@test.com")
+    ids = [user1.id, user2.id, user3.id]
+    table = tricount.expense_table
+
+    tricount.add_expense("First", 30.0, user1.id, ids)
+    stats = compute_tricount_stats(tricount)
+    assert [s["paid"] for s in stats] == [30.0, 0.0, 0.0]
+
+    expenses = [
+        tricount.add_expense(
+            f"Expense {i}", 10.0 * i, ids[i % 3], ids, {user3.id: 1.0}
+        )
+        for i in range(1, 9)
+    ]
+    tricount.add_expense("Nobody", 99.0, user2.id, [])
+    tricount.remove_expense(expenses[-1].id)
+    tricount.remove_expense(expenses[0].id)
+
+    stats = compute_tricount_stats(tricount)
+    table.stats = None
+    assert compute_tricount_stats(tricount) == stats
+
+    balances = compute_balances(tricount)
+    for user_stats in stats:
+        assert user_stats["balance"] == round(balances[user_stats["id"]], 2)
+    assert stats[2]["consumed"] == 10.0 + 20 + 30 + 40 + 50 + 60 + 70
+    assert [e["amount"] for e in stats[2]["top_expenses"]] == [
+        70.0,
+        60.0,
+        50.0,
+        40.0,
+        30.0,
+    ]
+    assert stats[2]["expenses_count"] == 7
+
+
+def test_tricount_stats_after_removing_last_expense():
+    tricount = Tricount(name="Tricount", currency=Currency.EUR)
+    user1 = tricount.add_user("User1", "user1@test.com")
+    user2 = tricount.add_user("User2", "user2@test.com")
+    expense = tricount.add_expense("Only", 10.0, user1.id, [user1.id])
+
+    # Stats built after the table indexed users that no row references
+    tricount.remove_expense(expense.id)
+    stats = compute_tricount_stats(tricount)
+    assert [(s["paid"], s["expenses_count"]) for s in stats] == [
+        (0.0, 0),
+        (0.0, 0),
+    ]
+
+    # A user indexed by a rejected expense, after the stats are built
+    with pytest.raises(TypeError):
+        tricount.add_expense(
+            "Bad", 5.0, user2.id, [user2.id], {user2.id: "heavy"}
+        )
+    assert compute_tricount_stats(tricount)[1]["paid"] == 0.0
+
+
+def test_simulate_expenses_matches_adding_them():
+    tricount = Tricount(name="Tricount", currency=Currency.EUR)
+    ids = [tricount.add_user(f"User{i}", "u@test.com").id for i in range(3)]
+    for i in range(20):
+        tricount.add_expense(f"Expense {i}", 7.0 * i, ids[i % 3], ids)
+    rows = len(tricount.expense_table)
+
+    scenarios = [
+        [
+            {
+                "amount": 90.0,
+                "payer_id": ids[0],
+                "participants_ids": ids,
+                "weights": {},
+            }
+        ],
+        [
+            {
+                "amount": 60.0,
+                "payer_id": ids[2],
+                "participants_ids": ids[:2],
+                "weights": {ids[0]: 1.0, ids[1]: 2.0},
+            },
+            {
+                "amount": 10.0,
+                "payer_id": ids[1],
+                "participants_ids": [ids[0], "stranger"],
+                "weights": {},
+            },
+        ],
+    ]
+    result = simulate_expenses(tricount, scenarios)
+    assert len(tricount.expense_table) == rows
+    assert result["balances"] == pytest.approx(compute_balances(tricount))
+
+    for expenses, simulated in zip(scenarios, result["scenarios"]):
+        expected = Tricount(name="Copy", currency=Currency.EUR)
+        expected.users = tricount.users
+        expected.expenses = list(tricount.expenses)
+        for expense in expenses:
+            expected.add_expense(description="What if", **expense)
+        balances = compute_balances(expected)
+        assert simulated["balances"] == pytest.approx(balances)
+        assert [s["amount"] for s in simulated["settlements"]] == [
+            amount for _, _, amount in compute_settlements(balances)
+        ]
+    assert set(result["scenarios"][1]["changes"]) == set(ids)
+
+
+def test_recurring_month_keeps_start_day():
+    recurring = RecurringExpense(start_date=date(2026, 1, 31))
+    days = []
+    for _ in range(4):
+        days.append(recurring.next_date)
+        recurring.advance()
+    assert days == [
+        date(2026, 1, 31),
+        date(2026, 2, 28),
+        date(2026, 3, 31),
+        date(2026, 4, 30),
+    ]
+
+
+def test_run_recurring_saves_once(app, monkeypatch):
+    from backend.utils import tricount_storage
+    from backend.utils.tricount_store import TricountStore
+
+    store = TricountStore()
+    ids = []
+    for name in ("Coloc", "Vacances", "Loyer"):
+        tricount = Tricount(name=name, currency=Currency.EUR)
+        user1 = tricount.add_user("User1", "user1@test.com")
+        user2 = tricount.add_user("User2", "user2@test.com")
+        if name != "Vacances":
+            tricount.add_recurring(
+                RecurringExpense(
+                    description="Loyer",
+                    amount=800.0,
+                    payer_id=user1.id,
+                    participants_ids=(user1.id, user2.id),
+                    start_date=date(2026, 1, 5),
+                    end_date=date(2026, 12, 31),
+                )
+            )
+        store.add(tricount)
+        ids.append(tricount.id)
+    assert store.header(ids[0]).next_due == date(2026, 1, 5).toordinal()
+
+    saves = []
+    save = tricount_storage.save_encoded_tricounts
+    monkeypatch.setattr(
+        tricount_storage,
+        "save_encoded_tricounts",
+        lambda segments: saves.append(1) or save(segments),
+    )
+    assert run_recurring(store, date(2026, 3, 10)) == (2, 6)
+    assert len(saves) == 1
+    assert run_recurring(store, date(2026, 3, 10)) == (0, 0)
+    assert len(saves) == 1
+
+    store.load()
+    with store.read(ids[0]) as tricount:
+        assert [e.date for e in tricount.expenses] == [
+            date(2026, 1, 5),
+            date(2026, 2, 5),
+            date(2026, 3, 5),
+        ]
+        assert compute_balances(tricount)[tricount.users[1].id] == -1200.0
+    assert store.header(ids[2]).next_due == date(2026, 4, 5).toordinal()
+    assert store.header(ids[1]).next_due == 0
+
+
+def test_run_recurring_catches_up_in_bounded_steps(app):
+    from backend.services.recurring import MAX_OCCURRENCES
+    from backend.utils.tricount_store import TricountStore
+
+    store = TricountStore()
+    tricount = Tricount(name="Coloc", currency=Currency.EUR)
+    user = tricount.add_user("User", "user@test.com")
+    start = date(2024, 1, 1)
+    tricount.add_recurring(
+        RecurringExpense(
+            description="Café",
+            amount=2.0,
+            payer_id=user.id,
+            participants_ids=(user.id,),
+            period="day",
+            start_date=start,
+        )
+    )
+    store.add(tricount)
+    today = date.fromordinal(start.toordinal() + MAX_OCCURRENCES + 9)
+
+    assert run_recurring(store, today) == (1, MAX_OCCURRENCES)
+    assert store.header(tricount.id).next_due <= today.toordinal()
+    assert run_recurring(store, today) == (1, 10)
+    assert run_recurring(store, today) == (0, 0)
+    assert store.header(tricount.id).expenses_count == MAX_OCCURRENCES + 10
+
+
+def test_recurring_scheduler_runs_in_background(app):
+    from backend.utils.recurring_scheduler import RecurringScheduler
+    from backend.utils.tricount_store import TricountStore
+
+    store = TricountStore()
+    tricount = Tricount(name="Coloc", currency=Currency.EUR)
+    user = tricount.add_user("User1", "user1@test.com")
+    tricount.add_recurring(
+        RecurringExpense(
+            description="Internet",
+            amount=30.0,
+            payer_id=user.id,
+            participants_ids=(user.id,),
+            period="day",
+            start_date=date.today(),
+        )
+    )
+    store.add(tricount)
+
+    # Only the worker holding the scheduler lock runs the passes
+    leader = RecurringScheduler(store, interval=3600)
+    assert leader._lead()
+    scheduler = RecurringScheduler(store, interval=3600)
+    scheduler.start()
+    scheduler.stop()
+    assert store.header(tricount.id).expenses_count == 0
+
+    leader.stop()
+    scheduler.start()
+    scheduler.stop()
+    with store.read(tricount.id) as tricount:
+        assert [e.date for e in tricount.expenses] == [date.today()]
+
+
+def test_archive_settled(app):
+    from backend.services.archive import archive_settled
+    from backend.utils.tricount_store import TricountStore
+
+    store = TricountStore()
+    ids = []
+    for amounts in ((30.0, 30.0), (30.0, 10.0), ()):
+        tricount = Tricount(name="Tricount", currency=Currency.EUR)
+        user1 = tricount.add_user("User1", "user1@test.com")
+        user2 = tricount.add_user("User2", "user2@test.com")
+        for payer, amount in zip((user1, user2), amounts):
+            tricount.add_expense(
+                description="Expense",
+                amount=amount,
+                payer_id=payer.id,
+                participants_ids=[user1.id, user2.id],
+                date=date(2025, 3, 1),
+            )
+        store.add(tricount)
+        ids.append(tricount.id)
+
+    assert archive_settled(store, idle_days=30, today=date(2025, 3, 2)) == 0
+    assert archive_settled(store, idle_days=30, today=date(2025, 6, 1)) == 1
+    assert [h.archived for h in store.headers()] == [True, False, False]
+
+
+def test_import_expense_rows():
+    from backend.services.importer import (
+        import_expense_rows,
+        parse_expense_rows,
+    )
+
+    tricount = Tricount(name="Tricount", currency=Currency.EUR)
+    alice = tricount.add_user("Alice", "owner@test.com")
+    rows, errors = parse_expense_rows(
+        [
+            ("Description", "Montant", "Payeur", "Participants", "Poids"),
+            ("Courses", "12,50", "Alice", "Alice, Bob", "1, 1"),
+            ("Hôtel", 90, "Bob", "Alice, Bob", "1, 2"),
+            ("", 5, "Bob", "Bob", ""),
+            ("Taxi", "dix", "Bob", "Bob", ""),
+            (None, None, None, None, None),
+            ("Vélo", 8, "Carol", "Bob, Carol", "1"),
+            ("Train", "nan", "Bob", "Bob", ""),
+            ("Bus", 3, "Bob", "Bob", "inf"),
+        ]
+    )
+    assert [error["row"] for error in errors] == [4, 5, 7, 8, 9]
+
+    report = import_expense_rows(tricount, rows, errors, "owner@test.com")
+    assert report["added"] == 2
+    assert report["users_created"] == ["Bob"]
+    bob = tricount.users[1]
+    assert [u.id for u in tricount.users] == [alice.id, bob.id]
+    first, second = tricount.expenses
+    assert (first.amount, first.weights) == (12.5, {})
+    assert second.payer_id == bob.id
+    assert second.weights == {alice.id: 1.0, bob.id: 2.0}
@@ -0,0 +1,737 @@
+import datetime
+import io
+import threading
+import time
+
+import pytest
+
+from backend.models.currency import Currency
+from backend.models.recurring_expense import RecurringExpense
+from backend.models.tricount import Tricount
+from backend.utils.tricount_storage import load_tricounts
+from backend.utils.tricount_store import TricountStore
+
+
+def _make_store(count: int) -> tuple[TricountStore, list[str]]:
+    store = TricountStore()
+    ids = []
+    for i in range(count):
+        tricount = Tricount(name=f"Tricount{i}", currency=Currency.EUR)
+        tricount.add_user("User1", "user1@test.com")
+        tricount.add_user("User2", "user2@test.com")
+        store.add(tricount)
+        ids.append(tricount.id)
+    return store, ids
+
+
+def test_store_concurrent_writes_no_lost_updates(app):
+    store, ids = _make_store(4)
+    threads_count = 8
+    per_thread = 25
+
+    def worker(n):
+        for i in range(per_thread):
+            tricount_id = ids[(n + i) % len(ids)]
+            with store.write(tricount_id) as tricount:
+                user1, user2 = tricount.users
+                tricount.add_expense(
+                    description=f"Expense {n}-{i}",
+                    amount=10.0,
+                    payer_id=user1.id,
+                    participants_ids=[user1.id, user2.id],
+                )
+                # Reassigning the list is what used to race with appends
+                tricount.expenses = list(tricount.expenses)
+                store.commit(tricount)
+
+    threads = [
+        threading.Thread(target=worker, args=(n,))
+        for n in range(threads_count)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    expected = threads_count * per_thread
+    assert sum(h.expenses_count for h in store.headers()) == expected
+
+    reloaded = load_tricounts()
+    assert [t.id for t in reloaded] == ids
+    assert sum(len(t.expenses) for t in reloaded) == expected
+
+
+def test_store_remove_waits_for_writers(app):
+    store, ids = _make_store(2)
+
+    with store.write(ids[0]) as tricount:
+        remover = threading.Thread(target=store.remove, args=(ids[0],))
+        remover.start()
+        remover.join(timeout=0.1)
+        assert remover.is_alive()
+        assert tricount is not None
+
+    remover.join()
+    with store.read(ids[0]) as tricount:
+        assert tricount is None
+    assert [t.id for t in load_tricounts()] == [ids[1]]
+
+
+def test_routes_concurrent_expenses(client, auth_headers):
+    tricount_id = client.post(
+        "/api/tricounts", json={"name": "Tricount"}, headers=auth_headers
+    ).get_json()["id"]
+    user_id = client.post(
+        f"/api/tricounts/{tricount_id}/users",
+        json={"name": "User"},
+        headers=auth_headers,
+    ).get_json()["id"]
+
+    def worker():
+        for _ in range(10):
+            response = client.post(
+                f"/api/tricounts/{tricount_id}/expenses",
+                json={
+                    "description": "Expense",
+                    "amount": 1.0,
+                    "payer_id": user_id,
+                    "participants_ids": [user_id],
+                },
+                headers=auth_headers,
+            )
+            assert response.status_code == 201
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    data = client.get(
+        f"/api/tricounts/{tricount_id}", headers=auth_headers
+    ).get_json()
+    assert len(data["expenses"]) == 60
+    assert len(load_tricounts()[0].expenses) == 60
+
+
+def _add_expense(store: TricountStore, tricount_id: str, amount: float):
+    with store.write(tricount_id) as tricount:
+        user = tricount.users[0]
+        tricount.add_expense(
+            description="Expense",
+            amount=amount,
+            payer_id=user.id,
+            participants_ids=[user.id],
+        )
+        store.commit(tricount)
+
+
+def test_multiprocess_stores_see_each_other_writes(app):
+    first, ids = _make_store(2)
+    first.multiprocess = True
+    second = TricountStore(multiprocess=True)
+    second.load()
+
+    _add_expense(first, ids[0], 10.0)
+    with second.read(ids[0]) as tricount:
+        assert len(tricount.expenses) == 1
+
+    # The untouched tricount is not rebuilt by the refresh
+    with second.read(ids[1]) as untouched:
+        pass
+    _add_expense(second, ids[0], 20.0)
+    with second.read(ids[1]) as tricount:
+        assert tricount is untouched
+
+    _add_expense(first, ids[0], 30.0)
+    with first.read(ids[0]) as tricount:
+        assert [e.amount for e in tricount.expenses] == [10.0, 20.0, 30.0]
+
+    second.remove(ids[1])
+    assert [h.id for h in first.headers()] == [ids[0]]
+
+
+def test_multiprocess_threads_share_saves(app, monkeypatch):
+    from backend.utils import tricount_storage
+
+    store, ids = _make_store(4)
+    store.multiprocess = True
+    other = TricountStore(multiprocess=True)
+    other.load()
+
+    saves = []
+    save_encoded = tricount_storage.save_encoded_tricounts
+
+    def slow_save(segments):
+        saves.append(1)
+        # Long enough for the other threads to queue behind the file lock
+        time.sleep(0.05)
+        return save_encoded(segments)
+
+    monkeypatch.setattr(tricount_storage, "save_encoded_tricounts", slow_save)
+    threads = [
+        threading.Thread(target=_add_expense, args=(store, tricount_id, 1.0))
+        for tricount_id in ids * 3
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every write returned after its change was saved, in fewer saves
+    assert 1 <= len(saves) < len(threads)
+    assert [h.expenses_count for h in other.headers()] == [3, 3, 3, 3]
+    _add_expense(other, ids[0], 1.0)
+    with store.read(ids[0]) as tricount:
+        assert len(tricount.expenses) == 4
+
+
+def _multiprocess_worker(data_file, tricount_id, count):
+    from backend.utils import tricount_storage
+
+    tricount_storage.DATA_FILE = data_file
+    store = TricountStore(multiprocess=True)
+    store.load()
+    for _ in range(count):
+        _add_expense(store, tricount_id, 1.0)
+
+
+def test_multiprocess_workers_no_lost_updates(app):
+    import multiprocessing
+
+    from backend.utils import tricount_storage
+
+    _, ids = _make_store(1)
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(
+            target=_multiprocess_worker,
+            args=(tricount_storage.DATA_FILE, ids[0], 15),
+        )
+        for _ in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    assert len(load_tricounts()[0].expenses) == 60
+
+
+def test_group_commit_coalesces_writes(app, monkeypatch):
+    from backend.utils import tricount_storage
+
+    store, ids = _make_store(1)
+    store.flush_interval = 60.0
+    store.flush_max_changes = 1000
+    store.durable = False
+    store.start()
+
+    writes = []
+    save_encoded = tricount_storage.save_encoded_tricounts
+    monkeypatch.setattr(
+        tricount_storage,
+        "save_encoded_tricounts",
+        lambda segments: writes.append(1) or save_encoded(segments),
+    )
+
+    for _ in range(20):
+        _add_expense(store, ids[0], 1.0)
+    assert writes == []
+    assert len(load_tricounts()[0].expenses) == 0
+
+    store.flush()
+    assert len(writes) == 1
+    assert len(load_tricounts()[0].expenses) == 20
+
+    _add_expense(store, ids[0], 1.0)
+    store.close()
+    assert len(load_tricounts()[0].expenses) == 21
+
+
+def test_group_commit_durable_waits_for_flush(app):
+    store, ids = _make_store(1)
+    store.flush_interval = 0.02
+    store.start()
+
+    threads = [
+        threading.Thread(target=_add_expense, args=(store, ids[0], 1.0))
+        for _ in range(10)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Every durable commit has returned, so all of them are on disk
+    assert len(load_tricounts()[0].expenses) == 10
+    store.close()
+
+
+def test_group_commit_surfaces_save_errors(app, monkeypatch):
+    from backend.utils import tricount_storage
+
+    store, ids = _make_store(1)
+    store.flush_interval = 0.01
+    store.start()
+
+    save_encoded = tricount_storage.save_encoded_tricounts
+    failures = [OSError("disk full")]
+
+    def save_once_failing(segments):
+        if failures:
+            raise failures.pop()
+        return save_encoded(segments)
+
+    monkeypatch.setattr(
+        tricount_storage, "save_encoded_tricounts", save_once_failing
+    )
+    errors = []
+
+    def add():
+        try:
+            _add_expense(store, ids[0], 1.0)
+        except RuntimeError as error:
+            errors.append(error)
+
+    thread = threading.Thread(target=add)
+    thread.start()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert isinstance(errors[0].__cause__, OSError)
+
+    # The writer survived and saves the failed change with the next one
+    _add_expense(store, ids[0], 1.0)
+    assert len(load_tricounts()[0].expenses) == 2
+    store.close()
+
+
+def test_store_evicts_least_recently_used(app):
+    store, ids = _make_store(4)
+    store.save()
+    store.cache_size = 2
+    store.load()
+    assert store.cache_stats()["resident"] == 0
+
+    for tricount_id in ids:
+        _add_expense(store, tricount_id, 1.0)
+    assert store.cache_stats()["resident"] == 2
+
+    with store.read(ids[-1]) as recent:
+        pass
+    with store.read(ids[-1]) as tricount:
+        assert tricount is recent
+
+    # Evicted tricounts are read back from the file with their changes
+    with store.read(ids[0]) as tricount:
+        assert len(tricount.expenses) == 1
+    assert store.cache_stats()["resident"] == 2
+    assert [h.expenses_count for h in store.headers()] == [1, 1, 1, 1]
+
+
+def test_store_reloads_unsaved_evicted_tricount(app):
+    store, ids = _make_store(3)
+    store.cache_size = 1
+    store.flush_interval = 60.0
+    store.durable = False
+    store.start()
+
+    with store.write(ids[0]) as tricount:
+        tricount.name = "Été à Montréal"
+        store.commit(tricount)
+    with store.read(ids[1]):
+        pass
+    with store.read(ids[0]) as tricount:
+        assert tricount.name == "Été à Montréal"
+
+    store.close()
+    store.load()
+    with store.read(ids[0]) as tricount:
+        assert tricount.name == "Été à Montréal"
+    with store.read(ids[2]) as tricount:
+        assert tricount.name == "Tricount2"
+
+
+def test_store_cache_bytes_budget(app):
+    store, ids = _make_store(3)
+    store.save()
+    size = store.cache_stats()["resident_bytes"] // 3
+    store.cache_bytes = size * 2
+    store.load()
+
+    for tricount_id in ids:
+        with store.read(tricount_id):
+            pass
+    stats = store.cache_stats()
+    assert stats["resident"] == 2
+    assert stats["resident_bytes"] <= store.cache_bytes
+
+
+def test_list_tricounts_from_headers(client, auth_headers):
+    from backend.extensions import tricount_store
+
+    for name in ("A", "B"):
+        client.post(
+            "/api/tricounts", json={"name": name}, headers=auth_headers
+        )
+    tricount_store.load()
+
+    data = client.get("/api/tricounts", headers=auth_headers).get_json()
+    assert [t["name"] for t in data] == ["A", "B"]
+    assert tricount_store.cache_stats()["resident"] == 0
+
+
+def test_headers_keep_member_balances(app, monkeypatch):
+    import json
+
+    from backend.utils import tricount_storage
+
+    store, ids = _make_store(2)
+    with store.write(ids[0]) as tricount:
+        user1, user2 = tricount.users
+        again = tricount.add_user("User1 bis", "user1@test.com")
+        tricount.add_expense("Dinner", 60.0, user1.id, [user1.id, user2.id])
+        tricount.add_expense(
+            "Taxi",
+            30.0,
+            user2.id,
+            [user1.id, again.id],
+            {user1.id: 1.0, again.id: 2.0},
+        )
+        store.commit(tricount)
+    # User1's two participants: +60 - 30 - 10 and -20
+    expected = {"user1@test.com": 0.0, "user2@test.com": 0.0}
+    header = store.header(ids[0])
+    assert header.total == 90.0
+    assert header.balances == pytest.approx(expected)
+    with store.write(ids[0]) as tricount:
+        tricount.remove_expense(tricount.expenses[1].id)
+        store.commit(tricount)
+    expected = {"user1@test.com": 30.0, "user2@test.com": -30.0}
+    assert store.header(ids[0]).balances == pytest.approx(expected)
+    assert store.header(ids[1]).balances == {
+        "user1@test.com": 0.0,
+        "user2@test.com": 0.0,
+    }
+
+    # Read back from the index, from the snapshot, and from a scan
+    store.save()
+    fresh = TricountStore()
+    fresh.load()
+    assert fresh.header(ids[0]).balances == pytest.approx(expected)
+    store.snapshot = True
+    store.write_snapshot()
+    warm = TricountStore(snapshot=True)
+    monkeypatch.setattr(tricount_storage, "load_index", None)
+    warm.load()
+    assert warm.header(ids[0]).balances == pytest.approx(expected)
+    assert warm.header(ids[0]).total == 60.0
+    monkeypatch.undo()
+    warm.close()
+
+    # An index written before the summaries existed is rebuilt
+    index = tricount_storage.index_file()
+    lines = index.read_text(encoding="utf-8").splitlines()
+    entries = [json.loads(line) for line in lines[1:]]
+    for entry in entries:
+        del entry["total"], entry["balances"]
+    index.write_text(
+        "\n".join([lines[0], *map(json.dumps, entries)]) + "\n",
+        encoding="utf-8",
+    )
+    cold = TricountStore()
+    cold.load()
+    assert cold.header(ids[0]).balances == pytest.approx(expected)
+    assert cold.header(ids[0]).stats["user2@test.com"] == {
+        "paid": 0.0,
+        "consumed": 30.0,
+        "balance": -30.0,
+        "expenses_count": 1,
+    }
+    assert warm.header(ids[0]).stats == cold.header(ids[0]).stats
+
+
+def test_commit_after_restart_and_failed_commit(app, monkeypatch):
+    from backend.utils import tricount_store as store_module
+
+    store, ids = _make_store(1)
+    _add_expense(store, ids[0], 10.0)
+    store.load()
+
+    # Removing the only expense of a tricount read back from disk
+    with store.write(ids[0]) as tricount:
+        tricount.remove_expense(tricount.expenses[0].id)
+        store.commit(tricount)
+    assert store.header(ids[0]).expenses_count == 0
+    assert store.header(ids[0]).balances == {
+        "user1@test.com": 0.0,
+        "user2@test.com": 0.0,
+    }
+
+    # A commit that fails leaves no half-applied change in the cache
+    def fail(tricount):
+        raise RuntimeError("header")
+
+    _add_expense(store, ids[0], 5.0)
+    monkeypatch.setattr(store_module, "header_from_tricount", fail)
+    with pytest.raises(RuntimeError):
+        with store.write(ids[0]) as tricount:
+            tricount.name = "Renamed"
+            store.commit(tricount)
+    monkeypatch.undo()
+    with store.read(ids[0]) as tricount:
+        assert tricount.name == "Tricount0"
+        assert len(tricount.expenses) == 1
+    assert store.header(ids[0]).expenses_count == 1
+
+
+def test_store_load_trusts_fresh_index_only(app, monkeypatch):
+    from backend.utils import tricount_storage
+
+    store, ids = _make_store(2)
+    store.save()
+
+    def fail():
+        raise AssertionError("the data file should not be scanned")
+
+    monkeypatch.setattr(tricount_storage, "scan_tricounts", fail)
+    store.load()
+    assert [h.id for h in store.headers()] == ids
+    monkeypatch.undo()
+
+    # Rewritten behind the index's back: scan the file again
+    _, span = list(tricount_storage.scan_tricounts())[1]
+    tricount_storage.save_encoded_tricounts([span])
+    store.load()
+    assert [h.id for h in store.headers()] == ids[1:]
+    with store.read(ids[1]) as tricount:
+        assert tricount.name == "Tricount1"
+
+
+def test_snapshot_record_round_trip():
+    from backend.utils.tricount_snapshot import (
+        tricount_from_record,
+        tricount_to_record,
+    )
+    from backend.utils.utils import tricount_to_dict
+
+    tricount = Tricount(name="Séjour", currency=Currency.EUR)
+    user1 = tricount.add_user("Zoé", "zoe@test.com")
+    user2 = tricount.add_user("Léo", None)
+    tricount.add_expense("Café", 4.5, user1.id, [user1.id, user2.id])
+    tricount.add_expense(
+        "Hôtel",
+        90.0,
+        user2.id,
+        [user1.id, user2.id],
+        {user1.id: 2.0},
+        date=datetime.date(2026, 3, 14),
+    )
+    tricount.add_recurring(
+        RecurringExpense(
+            description="Loyer",
+            amount=700.0,
+            payer_id=user1.id,
+            participants_ids=(user1.id, user2.id),
+            start_date=datetime.date(2026, 1, 31),
+            end_date=datetime.date(2026, 6, 30),
+        )
+    )
+
+    loaded = tricount_from_record(tricount_to_record(tricount))
+    assert tricount_to_dict(loaded) == tricount_to_dict(tricount)
+    assert loaded.expenses[0].payer_id is loaded.users[0].id
+
+
+def test_store_starts_from_fresh_snapshot(app, monkeypatch):
+    from backend.utils import tricount_storage
+
+    store, ids = _make_store(3)
+    _add_expense(store, ids[1], 5.0)
+    store.snapshot = True
+    store.write_snapshot()
+
+    warm = TricountStore(snapshot=True)
+    monkeypatch.setattr(tricount_storage, "load_index", None)
+    monkeypatch.setattr(tricount_storage, "read_tricount_segment", None)
+    warm.load()
+    assert [h.id for h in warm.headers()] == ids
+    with warm.read(ids[1]) as tricount:
+        assert [e.amount for e in tricount.expenses] == [5.0]
+    monkeypatch.undo()
+
+    # Changed after the snapshot: the JSON store is used instead
+    _add_expense(store, ids[2], 7.0)
+    cold = TricountStore(snapshot=True)
+    cold.load()
+    assert cold._snapshot is None
+    with cold.read(ids[2]) as tricount:
+        assert [e.amount for e in tricount.expenses] == [7.0]
+
+    # Only the tricount that changed is stale in the rewritten snapshot
+    store.write_snapshot()
+    warm.load()
+    assert warm._snapshot is not None
+    with warm.read(ids[2]) as tricount:
+        assert [e.amount for e in tricount.expenses] == [7.0]
+    warm.close()
+
+
+def test_checksum_matches_data_file(app):
+    from backend.utils import tricount_storage
+
+    store, _ = _make_store(2)
+    index = tricount_storage.load_index(require_fresh=True)
+    assert index.checksum == tricount_storage.data_checksum()
+
+
+def test_scan_reads_file_in_chunks(app):
+    from backend.utils import tricount_storage
+
+    store, ids = _make_store(3)
+    with store.write(ids[1]) as tricount:
+        tricount.name = "Noël à Zürich " * 50
+        store.commit(tricount)
+    store.save()
+
+    scanned = list(tricount_storage.scan_tricounts(chunk_size=7))
+    assert scanned == list(tricount_storage.scan_tricounts())
+    assert [data["id"] for data, _ in scanned] == ids
+    for data, span in scanned:
+        assert tricount_storage.read_tricount_segment(span) == data
+
+    raw = tricount_storage.DATA_FILE.read_bytes()
+    tricount_storage.DATA_FILE.write_bytes(raw[:-10])
+    with pytest.raises(ValueError):
+        list(tricount_storage.scan_tricounts(chunk_size=7))
+    assert load_tricounts() == []
+
+
+def test_deflate_format_round_trip(app, monkeypatch):
+    from backend.models.auth_user import AuthUser
+    from backend.utils import auth_storage, tricount_storage
+
+    store, ids = _make_store(3)
+    _add_expense(store, ids[0], 12.5)
+    json_size = tricount_storage.DATA_FILE.stat().st_size
+
+    # Unchanged tricounts are converted while being copied
+    monkeypatch.setattr(tricount_storage, "FORMAT", "deflate")
+    with store.write(ids[1]) as tricount:
+        tricount.name = "Séjour à Lisbonne"
+        store.commit(tricount)
+    assert tricount_storage.DATA_FILE.read_bytes().startswith(
+        tricount_storage.FRAMED_MAGIC
+    )
+    assert tricount_storage.DATA_FILE.stat().st_size < json_size
+    index = tricount_storage.load_index(require_fresh=True)
+    assert index.checksum == tricount_storage.data_checksum()
+
+    store.load()
+    with store.read(ids[0]) as tricount:
+        assert [e.amount for e in tricount.expenses] == [12.5]
+    assert [t.name for t in load_tricounts()] == [
+        "Tricount0",
+        "Séjour à Lisbonne",
+        "Tricount2",
+    ]
+
+    monkeypatch.setattr(tricount_storage, "FORMAT", "compact")
+    store.save()
+    assert tricount_storage.DATA_FILE.read_bytes().startswith(b"[")
+    assert [t.id for t in load_tricounts()] == ids
+
+    monkeypatch.setattr(auth_storage, "FORMAT", "deflate")
+    user = AuthUser(email="zoé@test.com", password_hash="x", name="Zoé")
+    auth_storage.save_users([user])
+    assert auth_storage.DATA_FILE.read_bytes()[:2] == auth_storage.GZIP_MAGIC
+    assert auth_storage.load_users() == [user]
+
+
+def test_archive_moves_tricount_out_of_data_file(app):
+    from backend.utils import tricount_storage
+
+    store, ids = _make_store(3)
+    _add_expense(store, ids[1], 8.0)
+    assert store.archive(ids[1])
+    assert not store.archive(ids[1])
+    assert store.header(ids[1]).archived
+    assert [t.id for t in load_tricounts()] == [ids[0], ids[2]]
+    assert tricount_storage.archive_file(ids[1]).exists()
+    assert store.cache_stats()["archived"] == 1
+
+    # From the index, the snapshot, and a rescan of the data file
+    for rebuild in ("index", "snapshot", "scan"):
+        if rebuild == "snapshot":
+            store.snapshot = True
+            store.write_snapshot()
+        elif rebuild == "scan":
+            tricount_storage.index_file().unlink()
+        reloaded = TricountStore(snapshot=rebuild == "snapshot")
+        reloaded.load()
+        assert sorted(h.id for h in reloaded.headers()) == sorted(ids)
+        assert reloaded.header(ids[1]).archived
+        with reloaded.read(ids[1]) as tricount:
+            assert [e.amount for e in tricount.expenses] == [8.0]
+        reloaded.close()
+    store.snapshot = False
+
+    # Changing it brings it back into the data file
+    _add_expense(store, ids[1], 2.0)
+    assert not store.header(ids[1]).archived
+    assert not tricount_storage.archive_file(ids[1]).exists()
+    assert [len(t.expenses) for t in load_tricounts()] == [0, 2, 0]
+
+    store.archive(ids[2])
+    store.remove(ids[2])
+    assert not tricount_storage.archive_file(ids[2]).exists()
+
+
+def test_backup_is_point_in_time(app, tmp_path, monkeypatch):
+    import tarfile
+
+    from backend.models.auth_user import AuthUser
+    from backend.utils import backup, tricount_storage
+    from backend.utils.auth_storage import save_users
+
+    store, ids = _make_store(3)
+    _add_expense(store, ids[0], 4.0)
+    store.archive(ids[2])
+    save_users([AuthUser(email="a@test.com", password_hash="x", name="A")])
+
+    # Writes made once the files are pinned are not in the backup
+    index_counts = backup._index_counts
+
+    def write_then_count(path):
+        _add_expense(store, ids[0], 6.0)
+        _add_expense(store, ids[2], 1.0)
+        return index_counts(path)
+
+    monkeypatch.setattr(backup, "_index_counts", write_then_count)
+    output = tmp_path / "backup.tar.gz"
+    manifest = backup.create_backup(store, output)
+    assert (manifest["tricounts"], manifest["archived"]) == (3, 1)
+    assert manifest["users"] == 1
+    assert backup.verify_backup(output) == []
+    assert not store.header(ids[2]).archived
+
+    restored = tmp_path / "restored"
+    with tarfile.open(output) as tar:
+        tar.extractall(restored, filter="data")
+    for data, _ in tricount_storage.scan_tricounts(
+        path=restored / "tricounts.json"
+    ):
+        if data["id"] == ids[0]:
+            assert [e["amount"] for e in data["expenses"]] == [4.0]
+    assert (restored / "tricounts.archive" / f"{ids[2]}.json.gz").exists()
+
+    # A modified member is reported
+    corrupt = tmp_path / "corrupt.tar.gz"
+    with tarfile.open(output) as source, tarfile.open(corrupt, "w:gz") as tar:
+        for info in source:
+            data = source.extractfile(info).read()
+            if info.name == "users.json":
+                data = data.replace(b"a@test.com", b"b@test.com")
+            tar.addfile(info, io.BytesIO(data))
+    assert backup.verify_backup(corrupt) == ["users.json: missing or modified"]
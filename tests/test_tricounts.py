@@ -1,3 +1,9 @@
+import time
+from datetime import date, timedelta
+
+import pytest
+
+
 def test_create_tricount(client, auth_headers):
     response = client.post(
         "/api/tricounts", json={"name": "Tricount"}, headers=auth_headers
@@ -185,6 +191,24 @@ def test_add_expense_missing_fields(client, auth_headers):
     )
     assert response.status_code == 400
 
+    # Amounts and weights float() reads but that are not finite
+    for fields in (
+        {"amount": "nan"},
+        {"amount": "inf"},
+        {"amount": 10.0, "weights": {"User1": "-inf"}},
+    ):
+        response = client.post(
+            f"/api/tricounts/{tricount_id}/expenses",
+            json={
+                "description": "Dinner",
+                "payer_id": "User1",
+                "participants_ids": ["User1"],
+                **fields,
+            },
+            headers=auth_headers,
+        )
+        assert response.status_code == 400
+
 
 def test_unauthorized_access_to_tricount(client):
     # Create user 1 and tricount
@@ -227,3 +251,704 @@ def test_unauthorized_access_to_tricount(client):
     # User 2 tries to access User 1's tricount
     response = client.get(f"/api/tricounts/{tricount_id}", headers=headers2)
     assert response.status_code == 404
+
+
+def test_tricount_stats(client, auth_headers):
+    from backend.extensions import tricount_store
+
+    tricount_id = client.post(
+        "/api/tricounts", json={"name": "Tricount"}, headers=auth_headers
+    ).get_json()["id"]
+    me = client.post(
+        f"/api/tricounts/{tricount_id}/users",
+        json={"name": "Me"},
+        headers=auth_headers,
+    ).get_json()["id"]
+    other = client.post(
+        f"/api/tricounts/{tricount_id}/users",
+        json={"name": "Other", "email": "other@test.com"},
+        headers=auth_headers,
+    ).get_json()["id"]
+    for amount, payer in ((100.0, me), (40.0, other)):
+        client.post(
+            f"/api/tricounts/{tricount_id}/expenses",
+            json={
+                "description": f"Paid {amount}",
+                "amount": amount,
+                "payer_id": payer,
+                "participants_ids": [me, other],
+            },
+            headers=auth_headers,
+        )
+
+    response = client.get(
+        f"/api/tricounts/{tricount_id}/stats", headers=auth_headers
+    )
+    assert response.status_code == 200
+    users = response.get_json()["users"]
+    assert [(u["name"], u["paid"], u["consumed"]) for u in users] == [
+        ("Me", 100.0, 70.0),
+        ("Other", 40.0, 70.0),
+    ]
+    assert [e["amount"] for e in users[0]["top_expenses"]] == [100.0, 40.0]
+
+    # Served from the headers, without loading the tricount
+    tricount_store.load()
+    data = client.get("/api/tricounts/stats", headers=auth_headers).get_json()
+    assert tricount_store.cache_stats()["resident"] == 0
+    assert [(t["id"], t["balance"]) for t in data["tricounts"]] == [
+        (tricount_id, 30.0)
+    ]
+    assert "top_expenses" not in data["tricounts"][0]
+    assert data["totals"] == {
+        "EUR": {
+            "paid": 100.0,
+            "consumed": 70.0,
+            "balance": 30.0,
+            "expenses_count": 2,
+        }
+    }
+
+
+def test_tricount_timeline(client, auth_headers):
+    tricount_id = client.post(
+        "/api/tricounts", json={"name": "Tricount"}, headers=auth_headers
+    ).get_json()["id"]
+    user_id = client.post(
+        f"/api/tricounts/{tricount_id}/users",
+        json={"name": "Me"},
+        headers=auth_headers,
+    ).get_json()["id"]
+    for day, amount in (
+        ("2026-03-02", 10.0),
+        ("2026-03-04", 5.0),
+        ("2026-03-30", 20.0),
+        ("2026-04-01", 7.0),
+    ):
+        response = client.post(
+            f"/api/tricounts/{tricount_id}/expenses",
+            json={
+                "description": f"On {day}",
+                "amount": amount,
+                "payer_id": user_id,
+                "participants_ids": [user_id],
+                "date": day,
+            },
+            headers=auth_headers,
+        )
+        assert response.get_json()["expenses"][-1]["date"] == day
+
+    response = client.get(
+        f"/api/tricounts/{tricount_id}/timeline"
+        "?from=2026-03-01&to=2026-03-31&period=week",
+        headers=auth_headers,
+    )
+    data = response.get_json()
+    assert [e["date"] for e in data["expenses"]] == [
+        "2026-03-02",
+        "2026-03-04",
+        "2026-03-30",
+    ]
+    assert [(b["start"], b["total"]) for b in data["buckets"]] == [
+        ("2026-03-02", 15.0),
+        ("2026-03-30", 20.0),
+    ]
+
+    data = client.get(
+        f"/api/tricounts/{tricount_id}/timeline", headers=auth_headers
+    ).get_json()
+    assert [(b["start"], b["count"]) for b in data["buckets"]] == [
+        ("2026-03-01", 3),
+        ("2026-04-01", 1),
+    ]
+    assert data["buckets"][0]["users"] == {user_id: 35.0}
+
+    for query in ("?period=year", "?from=mars"):
+        response = client.get(
+            f"/api/tricounts/{tricount_id}/timeline{query}",
+            headers=auth_headers,
+        )
+        assert response.status_code == 400
+
+    response = client.post(
+        f"/api/tricounts/{tricount_id}/expenses",
+        json={
+            "description": "Bad date",
+            "amount": 1.0,
+            "payer_id": user_id,
+            "participants_ids": [user_id],
+            "date": "31/03/2026",
+        },
+        headers=auth_headers,
+    )
+    assert response.status_code == 400
+
+
+def test_recurring_expenses(client, runner, auth_headers):
+    tricount_id = client.post(
+        "/api/tricounts", json={"name": "Coloc"}, headers=auth_headers
+    ).get_json()["id"]
+    user_ids = [
+        client.post(
+            f"/api/tricounts/{tricount_id}/users",
+            json={"name": name},
+            headers=auth_headers,
+        ).get_json()["id"]
+        for name in ("User1", "User2")
+    ]
+    base = f"/api/tricounts/{tricount_id}"
+    start = date.today() - timedelta(weeks=2)
+
+    response = client.post(
+        f"{base}/recurring",
+        json={
+            "description": "Courses",
+            "amount": 50.0,
+            "payer_id": user_ids[0],
+            "participants_ids": user_ids,
+            "period": "week",
+            "start_date": start.isoformat(),
+        },
+        headers=auth_headers,
+    )
+    assert response.status_code == 201
+    recurring = response.get_json()
+    assert recurring["next_date"] == (start + timedelta(weeks=3)).isoformat()
+
+    # Occurrences already due were entered with the template
+    data = client.get(base, headers=auth_headers).get_json()
+    assert [e["date"] for e in data["expenses"]] == [
+        (start + timedelta(weeks=i)).isoformat() for i in range(3)
+    ]
+
+    response = client.delete(
+        f"{base}/users/{user_ids[1]}", headers=auth_headers
+    )
+    assert response.status_code == 400
+
+    next_date = date.fromisoformat(recurring["next_date"])
+    result = runner.invoke(
+        args=["recurring", "run", "--date", next_date.isoformat()]
+    )
+    assert result.exit_code == 0
+    assert result.output.startswith("1 dépense(s) ajoutée(s)")
+    data = client.get(base, headers=auth_headers).get_json()
+    assert len(data["expenses"]) == 4
+
+    listed = client.get(f"{base}/recurring", headers=auth_headers).get_json()
+    assert [r["id"] for r in listed] == [recurring["id"]]
+    response = client.delete(
+        f"{base}/recurring/{recurring['id']}", headers=auth_headers
+    )
+    assert response.status_code == 204
+    response = client.delete(
+        f"{base}/recurring/{recurring['id']}", headers=auth_headers
+    )
+    assert response.status_code == 404
+
+    response = client.post(
+        f"{base}/recurring",
+        json={
+            "description": "Loyer",
+            "amount": 500.0,
+            "payer_id": user_ids[0],
+            "participants_ids": user_ids,
+            "period": "year",
+        },
+        headers=auth_headers,
+    )
+    assert response.status_code == 400
+
+    # A catch-up over centuries would hold the write lock for ages
+    response = client.post(
+        f"{base}/recurring",
+        json={
+            "description": "Loyer",
+            "amount": 500.0,
+            "payer_id": user_ids[0],
+            "participants_ids": user_ids,
+            "period": "day",
+            "start_date": "0001-01-01",
+        },
+        headers=auth_headers,
+    )
+    assert response.status_code == 400
+
+
+def test_archive_tricount(client, runner, auth_headers):
+    tricount_id = client.post(
+        "/api/tricounts", json={"name": "Vacances"}, headers=auth_headers
+    ).get_json()["id"]
+    base = f"/api/tricounts/{tricount_id}"
+
+    response = client.post(f"{base}/archive", headers=auth_headers)
+    assert response.status_code == 200
+    listed = client.get("/api/tricounts", headers=auth_headers).get_json()
+    assert [t["archived"] for t in listed] == [True]
+    response = client.post(f"{base}/archive", headers=auth_headers)
+    assert response.status_code == 409
+
+    # Still readable, and restored by the next change
+    assert client.get(base, headers=auth_headers).status_code == 200
+    client.post(f"{base}/users", json={"name": "User1"}, headers=auth_headers)
+    listed = client.get("/api/tricounts", headers=auth_headers).get_json()
+    assert [t["archived"] for t in listed] == [False]
+
+    result = runner.invoke(args=["tricounts", "archive", tricount_id])
+    assert result.exit_code == 0
+    assert result.output.startswith("1 3Compte(s) archivé(s)")
+
+
+def test_import_expenses(client, runner, auth_headers, tmp_path):
+    from io import BytesIO
+
+    source_id = client.post(
+        "/api/tricounts", json={"name": "Source"}, headers=auth_headers
+    ).get_json()["id"]
+    user_ids = [
+        client.post(
+            f"/api/tricounts/{source_id}/users",
+            json={"name": name},
+            headers=auth_headers,
+        ).get_json()["id"]
+        for name in ("Alice", "Bob")
+    ]
+    for amount, weights in ((30.0, {}), (45.0, {user_ids[1]: 2})):
+        client.post(
+            f"/api/tricounts/{source_id}/expenses",
+            json={
+                "description": "Dîner",
+                "amount": amount,
+                "payer_id": user_ids[0],
+                "participants_ids": user_ids,
+                "weights": weights,
+                "date": "2025-07-14",
+            },
+            headers=auth_headers,
+        )
+    exported = client.get(
+        f"/api/tricounts/{source_id}/export/excel", headers=auth_headers
+    ).data
+
+    target_id = client.post(
+        "/api/tricounts", json={"name": "Cible"}, headers=auth_headers
+    ).get_json()["id"]
+    base = f"/api/tricounts/{target_id}"
+    response = client.post(
+        f"{base}/import",
+        data={"file": (BytesIO(exported), "export.xlsx")},
+        headers=auth_headers,
+    )
+    assert response.status_code == 201
+    assert response.get_json()["users_created"] == ["Alice", "Bob"]
+
+    source = client.get(
+        f"/api/tricounts/{source_id}", headers=auth_headers
+    ).get_json()
+    target = client.get(base, headers=auth_headers).get_json()
+    names = {u["id"]: u["name"] for u in source["users"]}
+    target_names = {u["id"]: u["name"] for u in target["users"]}
+    assert {names[k]: v for k, v in source["balances"].items()} == {
+        target_names[k]: v for k, v in target["balances"].items()
+    }
+    assert [e["date"] for e in target["expenses"]] == ["2025-07-14"] * 2
+
+    csv = "Description;Montant;Payeur;Participants\nTaxi;12,5;Alice;Alice\n"
+    csv += "Bus;;Alice;Alice\n"
+    response = client.post(
+        f"{base}/import",
+        data={"file": (BytesIO(csv.encode()), "import.csv")},
+        headers=auth_headers,
+    )
+    assert response.get_json()["errors"] == [
+        {"row": 3, "error": "Le montant doit être un nombre"}
+    ]
+    response = client.post(
+        f"{base}/import",
+        data={"file": (BytesIO(b"not a workbook"), "import.xlsx")},
+        headers=auth_headers,
+    )
+    assert response.status_code == 400
+
+    path = tmp_path / "import.csv"
+    path.write_text(csv, encoding="utf-8")
+    result = runner.invoke(
+        args=[
+            "tricounts",
+            "import",
+            str(path),
+            "--name",
+            "Importé",
+            "--owner",
+            "user@test.com",
+        ]
+    )
+    assert result.exit_code == 0
+    assert "1 dépense(s) importée(s)" in result.output
+    listed = client.get("/api/tricounts", headers=auth_headers).get_json()
+    assert [t["name"] for t in listed][-1] == "Importé"
+
+
+def test_idempotency_key_replays_response(client, auth_headers, monkeypatch):
+    from backend.extensions import tricount_store
+
+    tricount_id = client.post(
+        "/api/tricounts", json={"name": "Week-end"}, headers=auth_headers
+    ).get_json()["id"]
+    headers = {**auth_headers, "Idempotency-Key": "user-1"}
+    url = f"/api/tricounts/{tricount_id}/users"
+
+    first = client.post(url, json={"name": "User1"}, headers=headers)
+    assert first.status_code == 201
+
+    saves = []
+    monkeypatch.setattr(tricount_store, "save", lambda: saves.append(1))
+    retry = client.post(url, json={"name": "User1"}, headers=headers)
+    assert retry.status_code == 201
+    assert retry.get_json() == first.get_json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert saves == []
+
+    response = client.post(url, json={"name": "User2"}, headers=headers)
+    assert response.status_code == 422
+
+    # Keys are scoped to the route, and errors are not replayed
+    response = client.delete(
+        f"/api/tricounts/{tricount_id}/users/unknown", headers=headers
+    )
+    assert "Idempotent-Replayed" not in response.headers
+    users = client.get(url, headers=auth_headers).get_json()
+    assert [u["name"] for u in users] == ["User1"]
+
+
+def test_idempotency_cache_is_bounded(monkeypatch):
+    from flask import Flask, jsonify
+
+    from backend.utils import idempotency
+
+    now = [0.0]
+    cache = idempotency.IdempotencyCache(
+        ttl=60, max_entries=2, clock=lambda: now[0]
+    )
+    monkeypatch.setattr(idempotency, "get_jwt_identity", lambda: "a@b.c")
+    app = Flask(__name__)
+    calls = []
+
+    @cache.idempotent
+    def view():
+        calls.append(1)
+        return jsonify(len(calls)), 201
+
+    def post(key):
+        with app.test_request_context(
+            method="POST", headers={"Idempotency-Key": key}
+        ):
+            return view()
+
+    for key in ("a", "b", "a", "c"):
+        post(key)
+    assert len(calls) == 3
+    # "a" was evicted by "c" and runs again
+    post("a")
+    assert len(calls) == 4
+    assert cache.stats()["entries"] == 2
+
+    now[0] = 61
+    post("c")
+    assert len(calls) == 5
+
+
+def test_idempotency_shared_between_workers(app, monkeypatch):
+    from flask import jsonify
+    from werkzeug.exceptions import UnprocessableEntity
+
+    from backend.utils import idempotency
+
+    # Shared entries expire from their file's modification time
+    now = [time.time()]
+    workers = [
+        idempotency.IdempotencyCache(
+            ttl=600, max_entries=2, shared=True, clock=lambda: now[0]
+        )
+        for _ in range(2)
+    ]
+    monkeypatch.setattr(idempotency, "get_jwt_identity", lambda: "a@b.c")
+    monkeypatch.setattr(idempotency, "SWEEP_EVERY", 1)
+    calls = []
+
+    def view():
+        calls.append(1)
+        return jsonify(len(calls)), 201
+
+    views = [worker.idempotent(view) for worker in workers]
+
+    def post(worker, key, body="{}"):
+        with app.test_request_context(
+            method="POST", headers={"Idempotency-Key": key}, data=body
+        ):
+            return views[worker]()
+
+    first = post(0, "a")
+    retry = post(1, "a")
+    assert len(calls) == 1
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.get_json() == first.get_json() == 1
+    with pytest.raises(UnprocessableEntity):
+        post(1, "a", body="other")
+
+    # A key being handled by one worker is in flight for the others
+    with app.test_request_context(
+        method="POST", headers={"Idempotency-Key": "b"}, data="{}"
+    ):
+        scope = ("a@b.c", "POST", "/", "b")
+        assert workers[0]._begin(scope, b"fp") is None
+        assert post(1, "b").status_code == 409
+        workers[0]._finish(scope, b"fp", None)
+    post(1, "b")
+    post(0, "c")
+    assert workers[1].stats()["entries"] == 2
+
+    # The claim of a worker killed mid-request is taken over after its
+    # lease, long before the TTL
+    with app.test_request_context(
+        method="POST", headers={"Idempotency-Key": "d"}, data="{}"
+    ):
+        scope = ("a@b.c", "POST", "/", "d")
+        assert workers[0]._begin(scope, b"fp") is None
+    assert post(1, "d").status_code == 409
+    now[0] += workers[1].lease + 1
+    assert post(1, "d").status_code == 201
+
+    # Files older than the TTL no longer replay
+    now[0] += 10_000
+    post(1, "c")
+    assert len(calls) == 5
+
+
+def test_seed_commands(client, runner, tmp_path):
+    from backend.extensions import tricount_store
+    from backend.utils import auth_storage, tricount_storage
+
+    result = runner.invoke(
+        args=["seed", "users", "--count", "3", "--rounds", "4"]
+    )
+    assert result.output.startswith("3 utilisateur(s) créé(s)")
+    response = client.post(
+        "/api/auth/login",
+        json={"email": "user2@seed.test", "password": "pass2"},
+    )
+    assert response.status_code == 200
+    token = response.get_json()["access_token"]
+
+    result = runner.invoke(
+        args=["seed", "tricounts", "--groups", "5", "--members", "3"]
+    )
+    assert result.exit_code == 0
+    assert len(tricount_store) == 5
+    # Members are seeded users, so they can log in and see their groups
+    listed = client.get(
+        "/api/tricounts", headers={"Authorization": f"Bearer {token}"}
+    ).get_json()
+    assert listed and all(t["expenses_count"] > 0 for t in listed)
+
+    # Numbering goes on, and loading skips what is already there
+    runner.invoke(args=["seed", "users", "--count", "1", "--rounds", "4"])
+    assert auth_storage.load_users()[-1].email == "user3@seed.test"
+    dump = tmp_path / "dump"
+    dump.mkdir()
+    for name in ("users.json", "tricounts.json"):
+        source = auth_storage.DATA_FILE.parent / name
+        (dump / name).write_bytes(source.read_bytes())
+    tricount_storage.save_tricounts([])
+    tricount_store.load()
+    result = runner.invoke(args=["seed", "load", str(dump)])
+    assert result.output.startswith("0 utilisateur(s) et 5 3Compte(s)")
+    assert len(tricount_store) == 5
+
+
+def test_backup_routes(client, app, tmp_path):
+    app.config.update(BACKUP_TOKEN="secret", BACKUP_DIR=str(tmp_path))
+    try:
+        assert client.post("/api/backups").status_code == 404
+        response = client.post(
+            "/api/backups", headers={"X-Backup-Token": "secret"}
+        )
+        assert response.status_code == 201
+        name = response.get_json()["file"]
+        assert (tmp_path / name).is_file()
+
+        response = client.get(
+            f"/api/backups/{name}/verify",
+            headers={"X-Backup-Token": "secret"},
+        )
+        assert response.get_json() == {
+            "file": name,
+            "ok": True,
+            "problems": [],
+        }
+    finally:
+        app.config.update(BACKUP_TOKEN=None, BACKUP_DIR="data/backups")
+
+
+def test_simulate_expenses(client, auth_headers):
+    tricount_id = client.post(
+        "/api/tricounts", json={"name": "Tricount"}, headers=auth_headers
+    ).get_json()["id"]
+    me, other = (
+        client.post(
+            f"/api/tricounts/{tricount_id}/users",
+            json={"name": name},
+            headers=auth_headers,
+        ).get_json()["id"]
+        for name in ("Me", "Other")
+    )
+    client.post(
+        f"/api/tricounts/{tricount_id}/expenses",
+        json={
+            "description": "Dinner",
+            "amount": 40.0,
+            "payer_id": me,
+            "participants_ids": [me, other],
+        },
+        headers=auth_headers,
+    )
+
+    purchase = {
+        "description": "Sofa",
+        "amount": 300.0,
+        "payer_id": other,
+        "participants_ids": [me, other],
+    }
+    response = client.post(
+        f"/api/tricounts/{tricount_id}/simulate",
+        json={
+            "scenarios": [
+                {"expenses": [purchase]},
+                {"expenses": [{**purchase, "weights": {me: 2, other: 1}}]},
+            ]
+        },
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["balances"] == {me: 20.0, other: -20.0}
+    assert data["settlements"] == [{"from": other, "to": me, "amount": 20.0}]
+    first, second = data["scenarios"]
+    assert first["changes"] == {me: -150.0, other: 150.0}
+    assert first["settlements"] == [{"from": me, "to": other, "amount": 130.0}]
+    assert second["balances"] == {me: -180.0, other: 180.0}
+
+    # Nothing was added
+    tricount = client.get(
+        f"/api/tricounts/{tricount_id}", headers=auth_headers
+    ).get_json()
+    assert len(tricount["expenses"]) == 1
+
+    # A single scenario can be sent as its expenses
+    response = client.post(
+        f"/api/tricounts/{tricount_id}/simulate",
+        json={"expenses": [purchase]},
+        headers=auth_headers,
+    )
+    assert response.get_json()["scenarios"][0]["changes"][me] == -150.0
+    for payload in ({}, {"scenarios": [{"expenses": [{"amount": 1}]}]}):
+        response = client.post(
+            f"/api/tricounts/{tricount_id}/simulate",
+            json=payload,
+            headers=auth_headers,
+        )
+        assert response.status_code == 400
+
+
+def test_get_tricounts_batch(client, auth_headers):
+    from backend.extensions import tricount_store
+    from backend.models.currency import Currency
+    from backend.models.tricount import Tricount
+
+    ids = [
+        client.post(
+            "/api/tricounts", json={"name": name}, headers=auth_headers
+        ).get_json()["id"]
+        for name in ("First", "Second")
+    ]
+    user_id = client.post(
+        f"/api/tricounts/{ids[1]}/users",
+        json={"name": "Me"},
+        headers=auth_headers,
+    ).get_json()["id"]
+    client.post(
+        f"/api/tricounts/{ids[1]}/expenses",
+        json={
+            "description": "Dinner",
+            "amount": 30.0,
+            "payer_id": user_id,
+            "participants_ids": [user_id],
+        },
+        headers=auth_headers,
+    )
+    other = Tricount(
+        name="Other", owner_email="other@test.com", currency=Currency.EUR
+    )
+    tricount_store.add(other)
+
+    response = client.get(
+        f"/api/tricounts/batch?ids={ids[1]},{other.id},unknown,{ids[1]}"
+        f"&ids={ids[0]}",
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["missing"] == [other.id, "unknown"]
+    assert [t["id"] for t in data["tricounts"]] == [ids[1], ids[0]]
+    detail = client.get(
+        f"/api/tricounts/{ids[1]}", headers=auth_headers
+    ).get_json()
+    assert data["tricounts"][0] == detail
+
+    response = client.get(
+        f"/api/tricounts/batch?ids={ids[1]}&fields=name,balances",
+        headers=auth_headers,
+    )
+    assert response.get_json()["tricounts"] == [
+        {"id": ids[1], "name": "Second", "balances": {user_id: 0.0}}
+    ]
+
+    for query in ("", f"ids={ids[0]}&fields=secret"):
+        response = client.get(
+            f"/api/tricounts/batch?{query}", headers=auth_headers
+        )
+        assert response.status_code == 400
+
+
+def test_list_tricounts_with_own_balance(client, auth_headers):
+    tricount_id = client.post(
+        "/api/tricounts", json={"name": "Tricount"}, headers=auth_headers
+    ).get_json()["id"]
+    me, other = (
+        client.post(
+            f"/api/tricounts/{tricount_id}/users",
+            json={"name": name, "email": email},
+            headers=auth_headers,
+        ).get_json()["id"]
+        for name, email in (("Me", None), ("Other", "other@test.com"))
+    )
+    expense = client.post(
+        f"/api/tricounts/{tricount_id}/expenses",
+        json={
+            "description": "Hotel",
+            "amount": 84.0,
+            "payer_id": other,
+            "participants_ids": [me, other],
+        },
+        headers=auth_headers,
+    ).get_json()["expenses"][0]["id"]
+
+    listed = client.get("/api/tricounts", headers=auth_headers).get_json()
+    assert (listed[0]["total"], listed[0]["balance"]) == (84.0, -42.0)
+
+    client.delete(
+        f"/api/tricounts/{tricount_id}/expenses/{expense}",
+        headers=auth_headers,
+    )
+    listed = client.get("/api/tricounts", headers=auth_headers).get_json()
+    assert (listed[0]["total"], listed[0]["balance"]) == (0.0, 0.0)